@@ -4,16 +4,22 @@ Trust Track - School Safety Demo Application
 A FastAPI application providing school safety routing with a modern frontend.
 """
 
+import asyncio
+import hmac
 import os
 import sys
+import time
+from collections import OrderedDict
 from pathlib import Path
 from datetime import date
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Union
 
+import numpy as np
 import uvicorn
-from fastapi import FastAPI, Query, HTTPException, Request
+from fastapi import FastAPI, Query, Body, HTTPException, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, FileResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
@@ -22,8 +28,24 @@ project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
 from trusttrack.api import app as api_app
-from trusttrack.utils import build_graph_bbox, find_data, parse_wkt_point_lonlat_to_latlon, parse_paren_latlon
+from trusttrack.utils import build_graph_bbox, nearest_node, geocode_in_act, slugify, WALK_SPEED
 from trusttrack.routing import compute_walk_routes, compute_bus_options, apply_bus_safety_and_pick_safest, compute_pr_options, make_geojson
+from trusttrack.bundle import BundleStore, DataBundle, POLL_SECONDS
+from trusttrack.tiles import TileStore
+from trusttrack.live import LiveHub, LIVE_SOURCE, make_source
+from trusttrack.isochrone import safe_walk_minutes_to, isochrone_polygons, ISOCHRONE_BANDS_MIN
+from trusttrack.catchment import CATCHMENT_DIR, LAYERS, catchment_stamp, load_catchment, point_grid
+from trusttrack.matrix import WalkMatrixGraph, OBJECTIVES, to_npz, to_csv, to_arrow, pa
+from trusttrack.polyline import compact_route_payload, DEFAULT_ZOOM
+from trusttrack.serialization import RouteJSONResponse, route_response, dumps
+from trusttrack.metrics import (
+    span, trace, current_trace, record_cache, cache_hit_rate, coalesced_share, StageError,
+    REGISTRY, PROMETHEUS_CONTENT_TYPE, HTTP_SECONDS
+)
+from trusttrack.singleflight import SingleFlight
+from trusttrack.profiling import ProfileStore, FORMATS as PROFILE_FORMATS
+from trusttrack.reports import ReportStore, CATEGORIES as REPORT_CATEGORIES
+from trusttrack.polyline import decode_polyline
 
 # Create the main FastAPI app
 app = FastAPI(
@@ -38,9 +60,21 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
-    allow_credentials=True
+    allow_credentials=True,
+    expose_headers=["X-Payload-Bytes", "X-Serialize-Ms", "X-Profile-Id"]
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Give each request a trace for its spans and record its latency by route template."""
+    with trace():
+        t0 = time.perf_counter()
+        response = await call_next(request)
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(time.perf_counter() - t0, route=getattr(route, "path", "unmatched"),
+                             status=response.status_code)
+    return response
+
 # Mount static files (frontend)
 frontend_path = project_root / "frontend"
 if frontend_path.exists():
@@ -54,42 +88,164 @@ class RouteRequest(BaseModel):
     date_str: Optional[str] = None
     time_str: Optional[str] = None
 
+class MatrixRequest(BaseModel):
+    sources: List[Tuple[float, float]]
+    targets: List[Tuple[float, float]]
+    objective: str = "safe"
+    format: str = "json"
+
+class LatLon(BaseModel):
+    lat: float
+    lon: float
+
+class ReportIn(LatLon):
+    category: str = "other"
+    description: Optional[str] = None
+    stop: Optional[str] = None     # stop key from /api/reports/near, when the reporter picked one
+    school: Optional[str] = None
+
+class NearRouteRequest(BaseModel):
+    coords: Optional[List[Tuple[float, float]]] = None
+    polyline: Optional[str] = None  # precision-6, as in format=compact route payloads
+    radius_m: float = 40.0
+
+class Destination(LatLon):
+    name: Optional[str] = None
+
+class WalkLeg(BaseModel):
+    minutes: float
+    safety: float
+    coords: Optional[List[List[float]]] = None  # [lat, lon]; omitted in the compact format
+
+class WalkRoutes(BaseModel):
+    fastest: WalkLeg
+    safest: WalkLeg
+    same: bool
+    risk_minutes_safe: float
+
+class BusOption(BaseModel):
+    start_label: str
+    start_lat: float
+    start_lon: float
+    w_fast_min: float
+    w_safe_min: float
+    w_safe_score: float
+    bus_min: float
+    total_minutes_fast: float
+    risk_minutes_safe: float
+    crowding_factor: Optional[float] = None
+    bus_safety_used: Optional[float] = None
+
+class BusOptions(BaseModel):
+    fastest: Optional[BusOption] = None
+    safest: Optional[BusOption] = None
+
+class ParkAndRideOption(BaseModel):
+    site: str
+    lat: float
+    lon: float
+    walk_fast_min: float
+    walk_safe_min: float
+    walk_mean_safety: float
+    km_to_school: float
+    source: Optional[str] = None
+    permit: Optional[str] = None
+    capacity: Optional[int] = None
+    drive_min: Optional[float] = None
+    car_total_fast_min: Optional[float] = None
+    car_risk_minutes_safe: Optional[float] = None
+
 class RouteResponse(BaseModel):
-    origin: Dict[str, Any]
-    destination: Dict[str, Any]
-    walk: Dict[str, Any]
-    bus: Dict[str, Any]
-    park_and_ride: List[Dict[str, Any]]
-    links: Dict[str, Any]
+    origin: LatLon
+    destination: Destination
+    walk: WalkRoutes
+    bus: BusOptions
+    park_and_ride: List[ParkAndRideOption]
+    links: Dict[str, Dict[str, str]]
     geojson: Dict[str, Any]
+    geometry_format: Optional[Dict[str, Any]] = None
 
-# Load data files
-DATA_FILES = {
-    "school_bus": "ACT_School_Bus_Services.csv",
-    "park_ride": "Park_And_Ride_Locations.csv",
-    "journeys": "Daily_Public_Transport_Passenger_Journeys_by_Service_Type_20250830.csv",
-}
+# Data snapshot: the active bundle (python -m trusttrack.bundle) or, without one, the data/ CSVs.
+# Each request takes one snapshot and uses it throughout, so a reload never mixes versions.
+data_store = BundleStore()
+try:
+    _data = data_store.load()
+    print(f"Data files loaded successfully (version {_data.version}, {_data.source})")
+    if _data.drive_table is not None:
+        print(f"Drive graph loaded: {len(_data.drive_table.nodes)} nodes, {len(_data.drive_table.sites)} P&R sites")
+except Exception as e:
+    print(f"Error loading data files: {e}")
 
-# Load CSVs once at startup
+# Tiled territory walk graph (python -m trusttrack.tiles build); without it graphs are downloaded per request
 try:
-    import pandas as pd
-    
-    bus_df = pd.read_csv(find_data(DATA_FILES["school_bus"]))
-    assert "Location" in bus_df.columns, "School Bus CSV must have 'Location' (WKT POINT)"
-    bus_df["lat"], bus_df["lon"] = zip(*bus_df["Location"].map(parse_wkt_point_lonlat_to_latlon))
-    bus_df = bus_df.dropna(subset=["lat","lon"]).copy()
+    tile_store = TileStore.open()
+    if tile_store is not None:
+        print(f"Walk tiles: {len(tile_store.manifest['tiles'])} tiles, budget {tile_store.budget >> 20} MiB")
+except Exception as e:
+    print(f"Error opening walk tiles: {e}")
+    tile_store = None
 
-    pr_df = pd.read_csv(find_data(DATA_FILES["park_ride"]))
-    assert "Point" in pr_df.columns, "Park & Ride CSV must have 'Point' like '(-35.2, 149.1)'"
-    pr_df["lat"], pr_df["lon"] = zip(*pr_df["Point"].map(parse_paren_latlon))
-    pr_df = pr_df.dropna(subset=["lat","lon"]).copy()
+def walk_graph(origin_ll: Tuple[float, float], dest_ll: Tuple[float, float], buffer_km: float):
+    """Weighted walk graph around two points, from resident tiles when available."""
+    if tile_store is not None:
+        return tile_store.graph_bbox(origin_ll, dest_ll, buffer_km)
+    return build_graph_bbox(origin_ll, dest_ll, buffer_km=buffer_km)
 
-    dj_df = pd.read_csv(find_data(DATA_FILES["journeys"]))
-    
-    print("Data files loaded successfully")
-except Exception as e:
-    print(f"Error loading data files: {e}")
-    bus_df = pr_df = dj_df = None
+def current_data():
+    """The live snapshot, or 500 when no data could be loaded."""
+    data = data_store.current()
+    if data is None:
+        raise HTTPException(500, "Data files not loaded. Please check server configuration.")
+    return data
+
+@app.on_event("startup")
+async def watch_bundles():
+    if POLL_SECONDS > 0:
+        asyncio.get_running_loop().create_task(data_store.watch(POLL_SECONDS))
+
+# Live bus positions: one ingestion task per process feeding every WebSocket subscriber
+live_hub = LiveHub()
+
+@app.on_event("startup")
+async def start_live_positions():
+    data = data_store.current()
+    try:
+        source = make_source(LIVE_SOURCE, data.bus_df) if data is not None else None
+    except Exception as e:
+        print(f"Error starting live positions: {e}")
+        return
+    if source is not None:
+        asyncio.get_running_loop().create_task(live_hub.run(source))
+        print(f"Live bus positions from {source.name}")
+
+# Unsafe-stop reports: group-committed log plus per-stop/per-edge counts for queries
+report_store = ReportStore()
+
+@app.on_event("startup")
+async def start_reports():
+    data = data_store.current()
+    try:
+        replayed = await report_store.start(data.bus_df if data is not None else None, tile_store)
+    except Exception as e:
+        print(f"Error starting hazard reports: {e}")
+        return
+    print(f"Hazard reports: {report_store.aggregate.reports} on record, {replayed} replayed from the log")
+
+@app.on_event("shutdown")
+async def stop_reports():
+    await report_store.stop()
+
+ADMIN_TOKEN = os.environ.get("TRUSTTRACK_ADMIN_TOKEN")
+
+def require_admin(request: Request) -> None:
+    """Admin endpoints need X-Admin-Token to match TRUSTTRACK_ADMIN_TOKEN; without one set they are off."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(403, "Admin endpoints are disabled (set TRUSTTRACK_ADMIN_TOKEN)")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN):
+        raise HTTPException(403, "Bad admin token")
+
+# Admin-requested route profiles (?profile=1 or X-Profile: 1), kept as a ring on disk
+profile_store = ProfileStore()
 
 # Available schools (from the data)
 AVAILABLE_SCHOOLS = [
@@ -105,6 +261,17 @@ AVAILABLE_SCHOOLS = [
     "Red Hill Primary School"
 ]
 
+SCHOOL_IDS = {slugify(s): s for s in AVAILABLE_SCHOOLS}
+
+def resolve_school(school_id: str) -> str:
+    """School name for a slug ('ainslie-school') or a position in AVAILABLE_SCHOOLS."""
+    if school_id.isdigit() and int(school_id) < len(AVAILABLE_SCHOOLS):
+        return AVAILABLE_SCHOOLS[int(school_id)]
+    name = SCHOOL_IDS.get(slugify(school_id))
+    if name is None:
+        raise HTTPException(404, f"Unknown school '{school_id}'")
+    return name
+
 @app.get("/", response_class=HTMLResponse)
 async def home():
     """Serve the main frontend application."""
@@ -133,16 +300,24 @@ async def home():
 @app.get("/api/schools")
 async def get_schools():
     """Get list of available schools."""
-    return {"schools": AVAILABLE_SCHOOLS}
+    return {"schools": AVAILABLE_SCHOOLS, "ids": [slugify(s) for s in AVAILABLE_SCHOOLS]}
 
-@app.get("/api/route")
+# Payloads are documented by RouteResponse but serialized straight from the NumPy-bearing
+# dicts with orjson; validating them through the model would cost more than encoding.
+@app.get("/api/route", response_class=RouteJSONResponse, response_model=None,
+         responses={200: {"model": RouteResponse}})
 async def api_route(
+    request: Request,
     origin: str = Query(..., description="lat,lon coordinates"),
     school: Optional[str] = Query(None, description="School name"),
     dest: Optional[str] = Query(None, description="lat,lon destination (optional)"),
     date_str: Optional[str] = Query(None, description="YYYY-MM-DD date"),
-    time_str: Optional[str] = Query(None, description="HH:MM time")
-) -> Dict[str, Any]:
+    time_str: Optional[str] = Query(None, description="HH:MM time"),
+    format: Optional[str] = Query(None, description="'compact' for simplified, encoded polylines"),
+    zoom: int = Query(DEFAULT_ZOOM, ge=0, le=22, description="Map zoom used to pick the simplification tolerance"),
+    debug: Optional[str] = Query(None, description="'timings' to include per-stage timings in the response"),
+    profile: bool = Query(False, description="Run under the sampling profiler (admin only)")
+) -> RouteJSONResponse:
     """
     Plan a route from origin to school or destination.
     
@@ -152,20 +327,33 @@ async def api_route(
         dest: Destination coordinates (lat,lon) - optional
         date_str: Date for the journey (YYYY-MM-DD)
         time_str: Departure time (HH:MM)
+        format: 'compact' to simplify and encode route geometry (precision-6 polylines)
+        zoom: Map zoom the compact geometry is simplified for
+        debug: 'timings' adds stage timings, search sizes and cache results
+        profile: sample the pipeline and return X-Profile-Id; also X-Profile: 1 (admin only)
     
     Returns:
         Route information including walking, bus, and park & ride options
     """
     
-    # Validate data is loaded
-    if bus_df is None or pr_df is None or dj_df is None:
-        raise HTTPException(500, "Data files not loaded. Please check server configuration.")
+    tr = current_trace()
+    if format not in (None, "full", "compact"):
+        raise HTTPException(400, "format must be 'full' or 'compact'")
+    
+    profile = profile or request.headers.get("x-profile") == "1"
+    if profile:
+        require_admin(request)
+    data = current_data()
     
     # Parse origin coordinates
     try:
         olat, olon = [float(x.strip()) for x in origin.split(",")]
     except Exception:
         raise HTTPException(400, "origin must be 'lat,lon' format")
+    try:
+        target_date = date.fromisoformat(date_str) if date_str else date.today()
+    except ValueError:
+        raise HTTPException(400, "date must be YYYY-MM-DD")
     
     # Determine destination
     if dest:
@@ -176,10 +364,10 @@ async def api_route(
         school_name = None
     elif school:
         try:
-            import osmnx as ox
-            dlat, dlon = ox.geocoder.geocode(f"{school}, Australian Capital Territory, Australia")
-        except Exception as e:
-            raise HTTPException(400, f"Geocoding failed for school '{school}': {e}")
+            with span("geocode"):
+                dlat, dlon = geocode_school(school, data)
+        except StageError as e:
+            raise HTTPException(400, f"Geocoding failed for school '{school}': {e.cause}")
         school_name = school
     else:
         raise HTTPException(400, "Provide either 'dest' coordinates or 'school' name")
@@ -187,76 +375,423 @@ async def api_route(
     origin_ll = (olat, olon)
     dest_ll = (dlat, dlon)
     
+    profile_id = None
     try:
-        # Build graph for this origin-destination pair
-        G = build_graph_bbox(origin_ll, dest_ll, buffer_km=6.0)
-        
-        # Compute walking routes
+        if profile:
+            # Not coalesced: the profile has to be of this request's own pipeline run
+            label = f"route {origin} -> {school_name or dest}"
+            shared_payload, profile_id = await run_in_threadpool(
+                profile_store.run, label, plan_route, data, origin_ll, dest_ll, school_name, target_date,
+                meta=lambda: {"trace": tr.as_dict() if tr is not None else None})
+            shared = False
+        else:
+            key = route_key(origin_ll, dest_ll, school_name, target_date, data.version)
+            shared_payload, shared = await route_flight.do(key, plan_route, data, origin_ll, dest_ll, school_name,
+                                                           target_date)
+        payload = rebase_origin(shared_payload, origin_ll) if shared else dict(shared_payload)
+        if format == "compact":
+            with span("compact"):
+                payload = compact_route_payload(payload, zoom)
+    except StageError as e:
+        raise HTTPException(500, f"Route computation failed in {e.stage}: {e.cause}")
+    
+    if debug == "timings" and tr is not None:
+        payload["debug"] = tr.as_dict()
+    with span("serialize"):
+        response = route_response(payload)
+    if profile_id is not None:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+# School geocodes never change while the process runs
+_geocode_cache: Dict[str, Tuple[float, float]] = {}
+
+def geocode_school(school: str, data: Optional[DataBundle] = None) -> Tuple[float, float]:
+    """School location from the snapshot's gazetteer, else geocoded within the ACT and memoised."""
+    ll = data.school_ll(school) if data is not None else None
+    if ll is not None:
+        record_cache("geocode", True)
+        return ll
+    key = school.strip().lower()
+    hit = key in _geocode_cache
+    record_cache("geocode", hit)
+    if not hit:
+        _geocode_cache[key] = geocode_in_act(school)
+    return _geocode_cache[key]
+
+def gmaps_dir(origin_ll, dest_ll, mode="walking"):
+    return (
+        "https://www.google.com/maps/dir/?api=1"
+        f"&origin={origin_ll[0]},{origin_ll[1]}"
+        f"&destination={dest_ll[0]},{dest_ll[1]}"
+        f"&travelmode={mode}"
+    )
+
+# Identical route queries arriving together (the 8am burst) share one pipeline run. Origins
+# within ~10 m snap to the same walk-graph node, so they coalesce too.
+COALESCE_GRID_DEG = 1e-4
+route_flight = SingleFlight("route")
+
+def route_key(origin_ll, dest_ll, school_name, target_date, version=None) -> Tuple:
+    snap = lambda ll: (round(ll[0] / COALESCE_GRID_DEG), round(ll[1] / COALESCE_GRID_DEG))
+    return (snap(origin_ll), snap(dest_ll), (school_name or "").strip().lower(), target_date, version)
+
+def rebase_origin(payload: Dict[str, Any], origin_ll: Tuple[float, float]) -> Dict[str, Any]:
+    """Shallow copy of a shared payload carrying this caller's own origin."""
+    out = dict(payload)
+    dest_ll = (payload["destination"]["lat"], payload["destination"]["lon"])
+    out["origin"] = {"lat": origin_ll[0], "lon": origin_ll[1]}
+    out["links"] = {"google": {"walking": gmaps_dir(origin_ll, dest_ll, "walking"),
+                               "transit": gmaps_dir(origin_ll, dest_ll, "transit")}}
+    features = [dict(f, geometry={"type": "Point", "coordinates": [origin_ll[1], origin_ll[0]]})
+                if f["properties"].get("role") == "origin" else f
+                for f in payload["geojson"]["features"]]
+    out["geojson"] = dict(payload["geojson"], features=features)
+    return out
+
+def plan_route(data: DataBundle, origin_ll: Tuple[float, float], dest_ll: Tuple[float, float],
+               school_name: Optional[str], target_date: date) -> Dict[str, Any]:
+    """Run the routing pipeline on one data snapshot, timing each stage; failures surface as StageError."""
+    # Build graph for this origin-destination pair
+    with span("build_graph_bbox"):
+        G = walk_graph(origin_ll, dest_ll, 6.0)
+    G.graph["landmarks"] = data.landmarks
+    
+    # Compute walking routes
+    with span("compute_walk_routes"):
         walk = compute_walk_routes(G, origin_ll, dest_ll)
-        
-        # Compute bus options
-        bus = compute_bus_options(G, origin_ll, dest_ll, bus_df, school_name)
-        
-        # Apply safety factors and pick safest bus option
-        target_date = date.fromisoformat(date_str) if date_str else date.today()
-        safest = apply_bus_safety_and_pick_safest(bus["options_df"], dj_df, target_date)
-        
-        # Compute park & ride options
-        pr_top = compute_pr_options(G, dest_ll, pr_df)
-        
-        # Generate Google Maps links
-        def gmaps_dir(origin_ll, dest_ll, mode="walking"):
-            return (
-                "https://www.google.com/maps/dir/?api=1"
-                f"&origin={origin_ll[0]},{origin_ll[1]}"
-                f"&destination={dest_ll[0]},{dest_ll[1]}"
-                f"&travelmode={mode}"
-            )
-        
-        walk_link = gmaps_dir(origin_ll, dest_ll, "walking")
-        transit_link = gmaps_dir(origin_ll, dest_ll, "transit")
-        
-        # Generate GeoJSON for map display
+    
+    # Compute bus options
+    with span("compute_bus_options"):
+        bus = compute_bus_options(G, origin_ll, dest_ll, data.bus_df, school_name)
+    
+    # Apply safety factors and pick safest bus option
+    with span("apply_bus_safety"):
+        safest = apply_bus_safety_and_pick_safest(bus["options_df"], data.dj_df, target_date)
+    
+    # Compute park & ride options
+    with span("compute_pr_options"):
+        pr_top = compute_pr_options(G, dest_ll, data.parking)
+    if data.drive_table is not None:
+        with span("drive_lookup"):
+            pr_top = data.drive_table.score_sites(origin_ll, pr_top)
+    
+    # Generate GeoJSON for map display
+    with span("make_geojson"):
         geo = make_geojson(origin_ll, dest_ll, walk, bus["fastest"], safest, pr_top)
-        
-        return {
-            "origin": {"lat": olat, "lon": olon},
-            "destination": {"lat": dlat, "lon": dlon, "name": school_name},
-            "walk": walk,
-            "bus": {
-                "fastest": bus["fastest"],
-                "safest": safest
-            },
-            "park_and_ride": pr_top,
-            "links": {
-                "google": {
-                    "walking": walk_link,
-                    "transit": transit_link
-                }
-            },
-            "geojson": geo,
-        }
-        
-    except Exception as e:
-        raise HTTPException(500, f"Route computation failed: {str(e)}")
+    
+    return {
+        "origin": {"lat": origin_ll[0], "lon": origin_ll[1]},
+        "destination": {"lat": dest_ll[0], "lon": dest_ll[1], "name": school_name},
+        "walk": walk,
+        "bus": {
+            "fastest": bus["fastest"],
+            "safest": safest
+        },
+        "park_and_ride": pr_top,
+        "links": {
+            "google": {
+                "walking": gmaps_dir(origin_ll, dest_ll, "walking"),
+                "transit": gmaps_dir(origin_ll, dest_ll, "transit")
+            }
+        },
+        "geojson": geo,
+    }
+
+# Isochrones depend only on the school, bands, shape and the data/safety model, so they are kept
+# (LRU) per data version; concurrent first requests for the same key share one computation.
+ISOCHRONE_CACHE_SIZE = 64
+_isochrone_cache: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+isochrone_flight = SingleFlight("isochrone")
+
+@app.get("/api/school/{school_id}/isochrone", response_class=RouteJSONResponse, response_model=None)
+async def school_isochrone(
+    school_id: str,
+    bands: str = Query(",".join(str(b) for b in ISOCHRONE_BANDS_MIN), description="Comma-separated minutes"),
+    shape: str = Query("hull", description="'hull' (concave hull of reached nodes) or 'edges' (buffered street set)")
+) -> RouteJSONResponse:
+    """Areas within each safe-walk time band of a school, from one reverse search over w_safe."""
+    name = resolve_school(school_id)
+    try:
+        band_list = sorted({float(b) for b in bands.split(",") if b.strip()})
+    except ValueError:
+        raise HTTPException(400, "bands must be comma-separated minutes")
+    if not band_list or len(band_list) > 6 or band_list[0] <= 0 or band_list[-1] > 60:
+        raise HTTPException(400, "Give 1-6 bands between 0 and 60 minutes")
+    if shape not in ("hull", "edges"):
+        raise HTTPException(400, "shape must be 'hull' or 'edges'")
+
+    data = current_data()
+    key = (name, tuple(band_list), shape, data.version)
+    payload = _isochrone_cache.get(key)
+    record_cache("isochrone", payload is not None)
+    if payload is None:
+        try:
+            payload, _ = await isochrone_flight.do(key, plan_isochrone, data, name, band_list, shape)
+        except StageError as e:
+            raise HTTPException(500, f"Isochrone computation failed in {e.stage}: {e.cause}")
+        _isochrone_cache[key] = payload
+        while len(_isochrone_cache) > ISOCHRONE_CACHE_SIZE:
+            _isochrone_cache.popitem(last=False)
+    _isochrone_cache.move_to_end(key)
+    return route_response(payload)
+
+def plan_isochrone(data: DataBundle, name: str, bands: List[float], shape: str) -> Dict[str, Any]:
+    with span("geocode"):
+        school_ll = geocode_school(name, data)
+    # graph just large enough for the longest band, so this costs about one route query
+    with span("build_graph_bbox"):
+        G = walk_graph(school_ll, school_ll, bands[-1] * 60 * WALK_SPEED / 1000 + 0.3)
+    with span("isochrone_search"):
+        target = nearest_node(G, school_ll[0], school_ll[1])
+        minutes = safe_walk_minutes_to(G, target, bands[-1])
+    with span("isochrone_polygons"):
+        geo = isochrone_polygons(G, target, minutes, bands, shape)
+    return {
+        "school": {"id": slugify(name), "name": name, "lat": school_ll[0], "lon": school_ll[1]},
+        "bands_min": bands,
+        "shape": shape,
+        "objective": "w_safe",
+        "data_version": data.version,
+        "geojson": geo,
+    }
+
+# Catchment rasters are built offline (python -m trusttrack.catchment) and memory-mapped here;
+# slug -> (stamp, meta, raster), reloaded when a rebuild rewrites the school's metadata
+_catchments: Dict[str, Any] = {}
+
+@app.get("/api/school/{school_id}/catchment", response_class=RouteJSONResponse, response_model=None)
+async def school_catchment(
+    school_id: str,
+    layer: str = Query("risk_min", description="fast_min, safe_min or risk_min")
+) -> RouteJSONResponse:
+    """Per-cell walk time/risk to a school as a point grid, for the heatmap."""
+    slug = slugify(resolve_school(school_id))
+    if layer not in LAYERS:
+        raise HTTPException(400, f"layer must be one of {', '.join(LAYERS)}")
+    stamp = catchment_stamp(CATCHMENT_DIR, slug)
+    hit = slug in _catchments and _catchments[slug][0] == stamp
+    record_cache("catchment", hit)
+    if not hit:
+        loaded = load_catchment(CATCHMENT_DIR, slug) if stamp is not None else None
+        if loaded is None:
+            _catchments.pop(slug, None)
+            raise HTTPException(404, f"No catchment raster for '{slug}'; run python -m trusttrack.catchment")
+        _catchments[slug] = (stamp, *loaded)
+    _, meta, raster = _catchments[slug]
+    return route_response({"school": {k: meta[k] for k in ("id", "school", "lat", "lon")},
+                           "model_version": meta["model_version"], **point_grid(meta, raster, layer)})
+
+MATRIX_MAX_CELLS = 1_000_000
+MATRIX_FORMATS = {"json": None, "npz": "application/octet-stream", "csv": "text/csv",
+                  "arrow": "application/vnd.apache.arrow.stream"}
+
+@app.post("/api/matrix")
+async def walk_matrix(req: MatrixRequest):
+    """
+    Walk minutes and risk-minutes from every source to every target ([lat, lon] pairs), along the
+    fastest or safest route. json returns nested arrays (null = unreachable); npz, csv (long
+    format) and arrow (IPC stream) return the same matrices as buffers.
+    """
+    if req.objective not in OBJECTIVES:
+        raise HTTPException(400, f"objective must be one of {', '.join(OBJECTIVES)}")
+    if req.format not in MATRIX_FORMATS or (req.format == "arrow" and pa is None):
+        raise HTTPException(400, "format must be json, npz, csv" + (", arrow" if pa is not None else ""))
+    if not req.sources or not req.targets:
+        raise HTTPException(400, "sources and targets must be non-empty")
+    if len(req.sources) * len(req.targets) > MATRIX_MAX_CELLS:
+        raise HTTPException(400, f"At most {MATRIX_MAX_CELLS} source x target cells per request")
+    try:
+        result = await run_in_threadpool(plan_matrix, req.sources, req.targets, req.objective)
+    except StageError as e:
+        raise HTTPException(500, f"Matrix computation failed in {e.stage}: {e.cause}")
+
+    if req.format == "json":
+        return route_response({"objective": req.objective, "shape": list(result["minutes"].shape), **result})
+    encode = {"npz": to_npz, "csv": to_csv, "arrow": to_arrow}[req.format]
+    with span("serialize"):
+        return Response(encode(result), media_type=MATRIX_FORMATS[req.format])
+
+def plan_matrix(sources, targets, objective: str) -> Dict[str, Any]:
+    pts = sources + targets
+    south_west = (min(p[0] for p in pts), min(p[1] for p in pts))
+    north_east = (max(p[0] for p in pts), max(p[1] for p in pts))
+    with span("build_graph_bbox"):
+        G = walk_graph(south_west, north_east, 1.0)
+    with span("walk_matrix"):
+        return WalkMatrixGraph(G).matrix(sources, targets, objective)
+
+@app.websocket("/ws/buses")
+async def live_buses(websocket: WebSocket, school: Optional[str] = None, route: Optional[str] = None):
+    """
+    Stream live bus positions as JSON arrays, starting with the current snapshot. Filter by school
+    (slug or name) and/or route number. Slow clients get only the newest position per bus.
+    """
+    await websocket.accept()
+    sub = live_hub.subscribe(slugify(school) if school else None, route)
+    if sub is None:
+        await websocket.close(code=1013, reason="Too many live subscribers, retry later")
+        return
+
+    async def until_disconnect():
+        # An idle client only shows up as gone on a read; the pump alone would hold its slot.
+        try:
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        except Exception:
+            pass
+
+    pump = asyncio.ensure_future(live_hub.pump(sub, websocket.send_text))
+    reader = asyncio.ensure_future(until_disconnect())
+    try:
+        await asyncio.wait((pump, reader), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        reader.cancel()
+        pump.cancel()
+        live_hub.unsubscribe(sub)
+    if pump.done() and not pump.cancelled() and pump.result() == "slow":
+        await websocket.close(code=1008, reason="Client too slow")
+
+@app.get("/api/buses/live")
+async def buses_live(school: Optional[str] = Query(None, description="School slug or name"),
+                     route: Optional[str] = Query(None, description="Route number")):
+    """Latest position of every bus heard from recently, for clients that poll instead of subscribing."""
+    snapshot = live_hub.snapshot(slugify(school) if school else None, route)
+    return Response("[" + ",".join(snapshot.values()) + "]", media_type="application/json")
+
+@app.get("/api/buses/{vehicle_id}/track", response_class=RouteJSONResponse, response_model=None)
+async def bus_track(vehicle_id: str):
+    """The bus's recent positions, oldest first."""
+    track = live_hub.ring.track(vehicle_id)
+    if not len(track):
+        raise HTTPException(404, f"No positions for bus '{vehicle_id}'")
+    return route_response({"id": vehicle_id, "source": live_hub.source, "ts": track["ts"], "coords": np.column_stack([track["lat"], track["lon"]]),
+                           "bearing": track["bearing"].astype(float).round(1),
+                           "speed_kmh": track["speed_kmh"].astype(float).round(1)})
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of stage latencies, search sizes and cache hit counts."""
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
 
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint."""
+    data = data_store.current()
     return {
         "status": "healthy",
-        "data_loaded": all([bus_df is not None, pr_df is not None, dj_df is not None]),
+        "data_loaded": data is not None,
+        "data_version": data.version if data is not None else None,
+        "data": data.describe() if data is not None else None,
+        "data_reload_error": data_store.last_error,
+        "drive_graph_loaded": data is not None and data.drive_table is not None,
+        "landmarks_loaded": data is not None and data.landmarks is not None,
+        "walk_tiles": tile_store.stats() if tile_store is not None else None,
+        "live": live_hub.stats(),
+        "reports": report_store.stats(),
         "available_schools": len(AVAILABLE_SCHOOLS)
     }
 
+@app.post("/api/admin/reload")
+async def reload_data(request: Request, force: bool = Query(False, description="Reload even if the version is unchanged")):
+    """Load the active bundle now (instead of at the next poll) and swap it in; admin only."""
+    require_admin(request)
+    previous = data_store.current()
+    try:
+        data = await data_store.reload(force)
+    except Exception as e:
+        raise HTTPException(500, f"Reload failed, still serving {previous.version if previous else 'nothing'}: {e}")
+    return {"previous": previous.version if previous else None, "version": data.version,
+            "reloaded": data is not previous, "data": data.describe()}
+
+REPORTS_MAX_BATCH = 500
+NEAR_MAX_RADIUS_M = 2000.0
+NEAR_ROUTE_MAX_POINTS = 20000
+
+@app.post("/api/reports", status_code=201)
+async def submit_reports(reports: Union[List[ReportIn], ReportIn] = Body(...)):
+    """
+    Record one unsafe-stop report, or a list of up to REPORTS_MAX_BATCH (a phone syncing reports
+    queued offline). Answers once the reports are durable on disk; they show up in the near
+    queries within about a second.
+    """
+    batch = reports if isinstance(reports, list) else [reports]
+    if not batch or len(batch) > REPORTS_MAX_BATCH:
+        raise HTTPException(400, f"Send between 1 and {REPORTS_MAX_BATCH} reports")
+    for r in batch:
+        if r.category not in REPORT_CATEGORIES:
+            raise HTTPException(400, f"category must be one of {', '.join(REPORT_CATEGORIES)}")
+        if not (-90 <= r.lat <= 90 and -180 <= r.lon <= 180):
+            raise HTTPException(400, "lat/lon out of range")
+    try:
+        ids = await report_store.submit([r.model_dump() for r in batch])
+    except (RuntimeError, OSError) as e:
+        raise HTTPException(503, f"Reports are not being accepted right now: {e}")
+    return {"accepted": len(ids), "ids": ids}
+
+@app.get("/api/reports/near")
+async def reports_near(lat: float = Query(...), lon: float = Query(...),
+                       radius_m: float = Query(100.0, gt=0, le=NEAR_MAX_RADIUS_M)):
+    """Report counts for stops and street segments within radius_m of a point."""
+    return await run_in_threadpool(report_store.near, [(lat, lon)], radius_m)
+
+@app.post("/api/reports/near-route")
+async def reports_near_route(req: NearRouteRequest):
+    """
+    Report counts for stops and street segments within radius_m of a route, given as [lat, lon]
+    coords or a precision-6 polyline (the compact route payload's encoding).
+    """
+    if req.polyline is not None:
+        try:
+            coords = decode_polyline(req.polyline)
+        except (IndexError, ValueError):
+            raise HTTPException(400, "polyline is not a valid precision-6 encoded polyline")
+    else:
+        coords = req.coords or []
+    if not coords or len(coords) > NEAR_ROUTE_MAX_POINTS:
+        raise HTTPException(400, f"Give a route of 1 to {NEAR_ROUTE_MAX_POINTS} points as coords or polyline")
+    if not 0 < req.radius_m <= NEAR_MAX_RADIUS_M:
+        raise HTTPException(400, f"radius_m must be in (0, {NEAR_MAX_RADIUS_M:g}]")
+    try:
+        return await run_in_threadpool(report_store.near, coords, req.radius_m)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+@app.get("/api/debug/profiles")
+async def list_profiles(request: Request):
+    """Profiles still in the ring, newest first; admin only."""
+    require_admin(request)
+    return {"profiles": profile_store.list(), "keep": profile_store.keep}
+
+@app.get("/api/debug/profiles/{profile_id}")
+async def get_profile(request: Request, profile_id: str,
+                      format: str = Query("speedscope", description="'speedscope' JSON or 'collapsed' stacks")):
+    """One profile, for speedscope.app or flamegraph.pl; admin only."""
+    require_admin(request)
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(400, f"format must be one of {', '.join(PROFILE_FORMATS)}")
+    out = await run_in_threadpool(profile_store.render, profile_id, format)
+    if out is None:
+        raise HTTPException(404, f"No profile '{profile_id}' (only the last {profile_store.keep} are kept)")
+    if format == "collapsed":
+        return PlainTextResponse(out)
+    return Response(content=dumps(out), media_type="application/json",
+                    headers={"Content-Disposition": f'attachment; filename="{profile_id}.speedscope.json"'})
+
 @app.get("/api/stats")
 async def get_stats():
     """Get application statistics."""
+    data = data_store.current()
     return {
         "total_schools": len(AVAILABLE_SCHOOLS),
-        "bus_stops": len(bus_df) if bus_df is not None else 0,
-        "park_ride_locations": len(pr_df) if pr_df is not None else 0,
-        "journey_data_points": len(dj_df) if dj_df is not None else 0
+        "bus_stops": len(data.bus_df) if data is not None else 0,
+        "park_ride_locations": len(data.pr_df) if data is not None else 0,
+        "parking_sites": len(data.parking) if data is not None else 0,
+        "journey_data_points": len(data.dj_df) if data is not None else 0,
+        "cache_hit_rate": {"geocode": cache_hit_rate("geocode"), "isochrone": cache_hit_rate("isochrone"),
+                           "tile": cache_hit_rate("tile")},
+        "coalesced_share": {"route": coalesced_share("route")},
+        "routes_in_flight": len(route_flight)
     }
 
 # Include the original API routes
@@ -0,0 +1,5 @@
+"""
+Trust Track benchmarks.
+Offline micro-benchmarks for the routing and response paths; run from application/ with
+`python -m benchmarks.<name>`.
+"""
@@ -0,0 +1,125 @@
+"""
+Bus-segment geometry benchmark.
+Per-request geometry time of the notebook's bus path against BusRouteGeometry. The notebook
+path builds two Transformers per call and loops over routes in Python, projecting and snapping
+one at a time, then interpolates samples one by one. BusRouteGeometry parses once and uses
+shapely 2 array calls. Walk legs are left out: only the geometry is timed. The check compares
+the snapped points and segment coordinates of both paths.
+
+    python -m benchmarks.bus_geometry --routes 300 --vertices 200 --queries 50
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+from pyproj import Transformer
+from shapely import wkt
+from shapely.geometry import Point
+from shapely.ops import transform
+
+from trusttrack.busgeom import BUS_POLYLINE_SAMPLES, SNAP_THRESHOLDS_M, BusRouteGeometry
+
+CENTRE = (-35.28, 149.13)
+
+
+def synthetic_routes(n: int, vertices: int, seed: int) -> pd.DataFrame:
+    """n street-like bus routes criss-crossing ~20 km of Canberra, as Bus_Routes.csv WKT rows."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        a = np.array(CENTRE) + rng.uniform(-0.09, 0.09, 2)
+        b = np.array(CENTRE) + rng.uniform(-0.09, 0.09, 2)
+        t = np.linspace(0.0, 1.0, vertices)[:, None]
+        jitter = rng.normal(0, 6e-4, (vertices, 2)).cumsum(axis=0) * np.sin(np.pi * t) / np.sqrt(vertices)
+        ll = a + (b - a) * t + jitter
+        wkt_line = "LINESTRING (" + ", ".join(f"{lon:.6f} {lat:.6f}" for lat, lon in ll) + ")"
+        rows.append({"route_id": f"R{i}", "short_name": str(i), "the_geom": wkt_line})
+    return pd.DataFrame(rows)
+
+
+def notebook_geometry(routes_df, origin, dest, thresholds=SNAP_THRESHOLDS_M, samples=BUS_POLYLINE_SAMPLES):
+    """The notebook's evaluate_bus_candidates + draw_bus_segment_polyline geometry, walk legs omitted."""
+    to_m = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True).transform
+    to_ll = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True).transform
+    origin_m = transform(to_m, Point((origin[1], origin[0])))
+    dest_m = transform(to_m, Point((dest[1], dest[0])))
+    for thr in thresholds:
+        rows = []
+        for i, row in routes_df.iterrows():
+            geom_m = transform(to_m, wkt.loads(str(row["the_geom"])))
+            if geom_m.distance(origin_m) > thr or geom_m.distance(dest_m) > thr:
+                continue
+            s_o = geom_m.project(origin_m); s_d = geom_m.project(dest_m)
+            p_o = transform(to_ll, geom_m.interpolate(s_o)); p_d = transform(to_ll, geom_m.interpolate(s_d))
+            rows.append((i, abs(s_d - s_o), p_o.y, p_o.x, p_d.y, p_d.x))
+        if rows:
+            break
+    if not rows:
+        return rows, None
+    best = min(rows, key=lambda r: r[1])
+    # draw_bus_segment_polyline: fresh transformers, reparse, one interpolate per sample
+    to_m = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True).transform
+    to_ll = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True).transform
+    geom_m = transform(to_m, wkt.loads(str(routes_df.loc[best[0], "the_geom"])))
+    s_o = geom_m.project(transform(to_m, Point((origin[1], origin[0]))))
+    s_d = geom_m.project(transform(to_m, Point((dest[1], dest[0]))))
+    a, b = min(s_o, s_d), max(s_o, s_d)
+    pts = [transform(to_ll, geom_m.interpolate(t)) for t in np.linspace(a, b, samples)]
+    return rows, np.array([(p.y, p.x) for p in pts])
+
+
+def vector_geometry(routes: BusRouteGeometry, origin, dest, samples=BUS_POLYLINE_SAMPLES):
+    cands, _ = routes.candidates(origin, dest)
+    if cands.empty:
+        return cands, None
+    best = int(cands["bus_m"].idxmin())
+    return cands, routes.segment_coords(best, origin, dest, samples)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--routes", type=int, default=300)
+    ap.add_argument("--vertices", type=int, default=200)
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    routes_df = synthetic_routes(args.routes, args.vertices, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = [(tuple(np.array(CENTRE) + rng.uniform(-0.05, 0.05, 2)), tuple(np.array(CENTRE) + rng.uniform(-0.05, 0.05, 2)))
+               for _ in range(args.queries)]
+
+    t0 = time.perf_counter()
+    routes = BusRouteGeometry(routes_df)
+    prep_ms = (time.perf_counter() - t0) * 1000
+
+    old_ms, new_ms, worst_pt, worst_seg, n_cands = [], [], 0.0, 0.0, 0
+    for o, d in queries:
+        t0 = time.perf_counter()
+        rows, seg_old = notebook_geometry(routes_df, o, d)
+        old_ms.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        cands, seg_new = vector_geometry(routes, o, d)
+        new_ms.append((time.perf_counter() - t0) * 1000)
+
+        assert [r[0] for r in rows] == list(cands.index), "candidate sets differ"
+        n_cands += len(rows)
+        if rows:
+            old_pts = np.array([r[2:] for r in rows])
+            worst_pt = max(worst_pt, float(np.abs(old_pts - cands[["o_lat", "o_lon", "d_lat", "d_lon"]].to_numpy()).max()))
+            worst_seg = max(worst_seg, float(np.abs(seg_old - seg_new).max()))
+
+    p = lambda xs, q: statistics.quantiles(xs, n=100)[q - 1] if len(xs) > 1 else xs[0]
+    print(f"{args.routes} routes x {args.vertices} vertices, {args.queries} queries, "
+          f"{n_cands / args.queries:.1f} candidates/query, {BUS_POLYLINE_SAMPLES} samples")
+    print(f"{'path':<12}{'p50 ms':>10}{'p95 ms':>10}")
+    print(f"{'notebook':<12}{p(old_ms, 50):>10.2f}{p(old_ms, 95):>10.2f}")
+    print(f"{'vectorised':<12}{p(new_ms, 50):>10.2f}{p(new_ms, 95):>10.2f}   (+{prep_ms:.0f} ms one-off parse)")
+    print(f"max diff: snapped points {worst_pt:.1e} deg, segment {worst_seg:.1e} deg")
+
+
+if __name__ == "__main__":
+    main()
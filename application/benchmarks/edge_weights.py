@@ -0,0 +1,71 @@
+"""
+Edge-weight build benchmark.
+Time to weight a whole walk graph. The per-edge loop is the old add_edge_weights: edge_safety
+and four formulas evaluated in Python for every edge. The columnar build is add_edge_weights:
+tags are pulled into arrays once, road-class risk is looked up by category code and the
+formulas run in NumPy. It is run in-process and with --workers forked extraction chunks.
+Every weight attribute is checked against the loop's value.
+
+    python -m benchmarks.edge_weights --graph organic --edges 1000000 --workers 4
+"""
+
+import argparse
+import os
+import time
+
+from trusttrack.utils import WALK_SPEED, add_edge_weights, edge_safety
+
+from .graphs import make_graph
+
+ATTRS = ("safety", "risk", "time", "w_fast", "w_safe")
+
+
+def per_edge_loop(G):
+    """add_edge_weights as it was: Python per edge."""
+    for u, v, k, data in G.edges(keys=True, data=True):
+        data["safety"] = edge_safety(data)
+        data["risk"]   = 1 - data["safety"]/100
+        data["time"]   = data["length"]/WALK_SPEED/60
+        data["w_fast"] = data["time"]
+        data["w_safe"] = data["risk"]*data["time"]
+    return G
+
+
+def snapshot(G):
+    return [tuple(d[a] for a in ATTRS) for _, _, d in G.edges(data=True)]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--graph", choices=("grid", "organic", "canberra"), default="organic")
+    ap.add_argument("--edges", type=int, default=1_000_000)
+    ap.add_argument("--workers", type=int, default=os.cpu_count())
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    G = make_graph(args.graph, args.edges, args.seed)
+    runs = {"per-edge loop": per_edge_loop, "columnar": lambda H: add_edge_weights(H, 0)}
+    if args.workers > 1:
+        runs[f"columnar x{args.workers}"] = lambda H: add_edge_weights(H, args.workers)
+
+    best, reference = {}, None
+    for name, fn in runs.items():
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            fn(G)
+            times.append(time.perf_counter() - t0)
+        best[name] = min(times)
+        values = snapshot(G)
+        if reference is None:
+            reference = values
+        diff = sum(a != b for a, b in zip(values, reference))
+        print(f"{name:<16}{best[name]:8.2f} s  ({G.number_of_edges() / best[name] / 1e6:5.2f} M edges/s)"
+              f"  edges differing from the loop: {diff}")
+    print(f"graph {G.graph.get('name')}: {G.number_of_edges()} edges, {os.cpu_count()} cores; "
+          f"columnar speed-up {best['per-edge loop'] / best['columnar']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
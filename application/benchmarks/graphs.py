@@ -0,0 +1,170 @@
+"""
+Benchmark graphs.
+Synthetic grid and organic street graphs carrying the same edge tags edge_safety reads
+(highway, sidewalk, cycleway, length), plus an offline Canberra fixture built from the
+Overpass response recorded in notebooks/cache. All are weighted with add_edge_weights.
+"""
+
+import json
+import math
+from pathlib import Path
+from typing import Iterable, Tuple
+
+import networkx as nx
+import numpy as np
+
+from trusttrack.utils import add_edge_weights, haversine_km
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+OVERPASS_FIXTURE = REPO_ROOT / "notebooks" / "cache" / "650755dfdf7aa75042aa8f85e58383d117c1624b.json"
+
+CENTER = (-35.281, 149.128)  # Canberra Centre
+BLOCK_M = 80.0               # synthetic block edge length
+
+SIDEWALKS = np.array(["both", "no", "", "left", "right", "separate", "yes"])
+SIDEWALK_P = np.array([0.35, 0.20, 0.20, 0.08, 0.07, 0.05, 0.05])
+
+
+def _deg_per_m(lat: float) -> Tuple[float, float]:
+    return 1.0 / 111320.0, 1.0 / (111320.0 * math.cos(math.radians(lat)))
+
+
+def _new_graph(name: str) -> nx.MultiDiGraph:
+    return nx.MultiDiGraph(crs="EPSG:4326", name=name)
+
+
+def _road_class(i: int, rng: np.random.Generator):
+    """Arterials every 12 lines, collectors every 4, residential otherwise, with some paths/lists."""
+    if i % 12 == 0:
+        return "primary" if i % 24 == 0 else "secondary"
+    if i % 4 == 0:
+        return "tertiary"
+    r = rng.random()
+    if r < 0.08:
+        return "footway"
+    if r < 0.12:
+        return ["residential", "service"]  # OSMnx keeps merged-way tags as lists
+    if r < 0.18:
+        return "service"
+    return "residential"
+
+
+def _add_street(G: nx.MultiDiGraph, u: int, v: int, highway, rng: np.random.Generator) -> None:
+    ud, vd = G.nodes[u], G.nodes[v]
+    length = haversine_km(ud["y"], ud["x"], vd["y"], vd["x"]) * 1000.0
+    data = {
+        "highway": highway,
+        "sidewalk": str(rng.choice(SIDEWALKS, p=SIDEWALK_P)),
+        "length": length,
+    }
+    if highway in ("secondary", "tertiary") and rng.random() < 0.3:
+        data["cycleway"] = "lane"
+    G.add_edge(u, v, **data)
+    G.add_edge(v, u, **dict(data))
+
+
+def _side_for_edges(n_edges: int) -> int:
+    # a side x side grid has 2*side*(side-1) streets, each stored in both directions
+    return max(3, int(math.ceil(math.sqrt(n_edges / 4.0))) + 1)
+
+
+def grid_graph(n_edges: int = 10_000, seed: int = 0) -> nx.MultiDiGraph:
+    """Manhattan grid centred on Canberra with about n_edges directed edges."""
+    rng = np.random.default_rng(seed)
+    side = _side_for_edges(n_edges)
+    dlat, dlon = _deg_per_m(CENTER[0])
+    lat0 = CENTER[0] - side / 2 * BLOCK_M * dlat
+    lon0 = CENTER[1] - side / 2 * BLOCK_M * dlon
+    G = _new_graph(f"grid-{n_edges}")
+    for r in range(side):
+        for c in range(side):
+            G.add_node(r * side + c, y=lat0 + r * BLOCK_M * dlat, x=lon0 + c * BLOCK_M * dlon)
+    for r in range(side):
+        for c in range(side):
+            n = r * side + c
+            if c + 1 < side:
+                _add_street(G, n, n + 1, _road_class(r, rng), rng)
+            if r + 1 < side:
+                _add_street(G, n, n + side, _road_class(c, rng), rng)
+    return add_edge_weights(G)
+
+
+def organic_graph(n_edges: int = 10_000, seed: int = 0) -> nx.MultiDiGraph:
+    """
+    Suburban-style network: a jittered grid with a third of the streets removed, cul-de-sacs,
+    and diagonal connectors; restricted to its largest strongly connected component.
+    """
+    rng = np.random.default_rng(seed)
+    side = _side_for_edges(n_edges * 1.25)
+    dlat, dlon = _deg_per_m(CENTER[0])
+    lat0 = CENTER[0] - side / 2 * BLOCK_M * dlat
+    lon0 = CENTER[1] - side / 2 * BLOCK_M * dlon
+    jitter = rng.normal(0.0, 0.25 * BLOCK_M, size=(side * side, 2))
+    G = _new_graph(f"organic-{n_edges}")
+    for r in range(side):
+        for c in range(side):
+            n = r * side + c
+            G.add_node(n, y=lat0 + (r * BLOCK_M + jitter[n, 0]) * dlat, x=lon0 + (c * BLOCK_M + jitter[n, 1]) * dlon)
+    for r in range(side):
+        for c in range(side):
+            n = r * side + c
+            arterial_r, arterial_c = r % 12 == 0, c % 12 == 0
+            if c + 1 < side and (arterial_r or rng.random() > 0.33):
+                _add_street(G, n, n + 1, _road_class(r, rng), rng)
+            if r + 1 < side and (arterial_c or rng.random() > 0.33):
+                _add_street(G, n, n + side, _road_class(c, rng), rng)
+            if r + 1 < side and c + 1 < side and rng.random() < 0.06:
+                _add_street(G, n, n + side + 1, "path", rng)
+    keep = max(nx.strongly_connected_components(G), key=len)
+    G = G.subgraph(keep).copy()
+    G.graph["name"] = f"organic-{n_edges}"
+    return add_edge_weights(G)
+
+
+def _walkable(tags: dict) -> bool:
+    hw = tags.get("highway")
+    return hw is not None and hw not in ("motorway", "motorway_link", "trunk_link", "construction", "proposed") \
+        and tags.get("foot") != "no" and tags.get("access") != "private"
+
+
+def overpass_graph(elements: Iterable[dict], name: str = "overpass") -> nx.MultiDiGraph:
+    """Unsimplified walk graph from raw Overpass JSON elements (ways as two-way streets)."""
+    elements = list(elements)
+    coords = {e["id"]: (e["lat"], e["lon"]) for e in elements if e["type"] == "node"}
+    G = _new_graph(name)
+    for e in elements:
+        if e["type"] != "way" or not _walkable(e.get("tags", {})):
+            continue
+        tags = e["tags"]
+        nodes = [n for n in e["nodes"] if n in coords]
+        for u, v in zip(nodes[:-1], nodes[1:]):
+            for n in (u, v):
+                if n not in G:
+                    G.add_node(n, y=coords[n][0], x=coords[n][1])
+            length = haversine_km(*coords[u], *coords[v]) * 1000.0
+            data = {"osmid": e["id"], "highway": tags["highway"], "length": length}
+            for k in ("sidewalk", "cycleway", "name"):
+                if k in tags:
+                    data[k] = tags[k]
+            G.add_edge(u, v, **data)
+            G.add_edge(v, u, **dict(data))
+    keep = max(nx.strongly_connected_components(G), key=len)
+    G = G.subgraph(keep).copy()
+    G.graph["name"] = name
+    return add_edge_weights(G)
+
+
+def canberra_fixture(path: Path = OVERPASS_FIXTURE) -> nx.MultiDiGraph:
+    """South Canberra walk subgraph from the recorded Overpass response; no network access."""
+    with open(path, encoding="utf-8") as f:
+        return overpass_graph(json.load(f)["elements"], name="canberra-fixture")
+
+
+def make_graph(kind: str, n_edges: int = 10_000, seed: int = 0) -> nx.MultiDiGraph:
+    if kind == "grid":
+        return grid_graph(n_edges, seed)
+    if kind == "organic":
+        return organic_graph(n_edges, seed)
+    if kind == "canberra":
+        return canberra_fixture()
+    raise ValueError(f"unknown graph kind '{kind}' (grid, organic, canberra)")
@@ -0,0 +1,82 @@
+"""
+Live position fan-out benchmark.
+Runs the school-bus simulator flat out through a LiveHub that has thousands of subscribers in
+one process. Subscribers are spread over no filter, per-school and per-route filters, and a
+share of them are slow: each send sleeps. Reports the cost of ingesting one tick, how much
+was delivered and coalesced, and the largest backlog any subscriber held. That backlog is
+bounded by the number of buses, however slow the client.
+
+    python -m benchmarks.live_fanout --subscribers 5000 --slow 0.1 --seconds 10
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+
+from trusttrack.bundle import DATA_FILES, load_bus_stops
+from trusttrack.live import LiveHub, SimulatedSource
+from trusttrack.metrics import LIVE_COALESCED
+from trusttrack.utils import find_data
+
+
+async def run(args) -> None:
+    source = SimulatedSource(load_bus_stops(find_data(DATA_FILES["school_bus"])), speed=args.speed,
+                             start_minute=7 * 60 + 30)
+    rng = np.random.default_rng(args.seed)
+    schools = sorted({s for r in source.runs for s in r["schools"]})
+    routes = sorted({r["route"] for r in source.runs})
+    hub = LiveHub(max_subscribers=args.subscribers)
+    delivered, backlog = [0], [0]
+
+    def sender(slow: bool):
+        async def send(batch: str):
+            delivered[0] += batch.count('"id"')
+            if slow:
+                await asyncio.sleep(args.slow_send_s)
+        return send
+
+    pumps = []
+    for i in range(args.subscribers):
+        kind = rng.choice(["all", "school", "route"], p=[0.1, 0.6, 0.3])
+        sub = hub.subscribe(school=rng.choice(schools) if kind == "school" else None,
+                            route=rng.choice(routes) if kind == "route" else None)
+        pumps.append(asyncio.ensure_future(hub.pump(sub, sender(rng.random() < args.slow))))
+    subs = [s for group in hub._subs.values() for s in group]
+
+    tick_ms, updates, t_end = [], 0, time.monotonic() + args.seconds
+    t0 = time.monotonic()
+    while time.monotonic() < t_end:
+        batch = source.positions(source.minute_at(time.monotonic() - t0), time.time())
+        t1 = time.perf_counter()
+        updates += hub.publish(batch)
+        tick_ms.append((time.perf_counter() - t1) * 1000)
+        backlog[0] = max(backlog[0], max(len(s.pending) for s in subs))
+        await asyncio.sleep(args.tick_s)
+    for p in pumps:
+        p.cancel()
+
+    q = statistics.quantiles(tick_ms, n=100)
+    print(f"{len(source.runs)} runs at {args.speed:g}x, {args.subscribers} subscribers "
+          f"({args.slow:.0%} slow, {args.slow_send_s * 1000:.0f} ms per send), {args.seconds:g} s")
+    print(f"{len(tick_ms)} ticks, {updates} positions ingested; publish p50 {q[49]:.2f} ms, p99 {q[98]:.2f} ms per tick")
+    print(f"{delivered[0]} positions delivered, {LIVE_COALESCED.value():.0f} coalesced for slow subscribers; "
+          f"largest backlog {backlog[0]} positions (fleet {len(source.runs)})")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--subscribers", type=int, default=5000)
+    ap.add_argument("--slow", type=float, default=0.1, help="Share of subscribers with slow sends")
+    ap.add_argument("--slow-send-s", type=float, default=1.0)
+    ap.add_argument("--speed", type=float, default=60.0, help="Simulated minutes per real minute")
+    ap.add_argument("--tick-s", type=float, default=0.1)
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+End-to-end HTTP load test.
+Starts the OSM stand-in (benchmarks/osm_standin.py) and the app under uvicorn, pointed at it,
+in a scratch working directory. Every cache starts cold unless --keep-cache is given. It then
+drives /api/route, /api/schools and /api/health with open-loop arrivals: requests go out at
+their scheduled times whether or not earlier ones have returned, and latency is measured from
+the scheduled time. The arrival rate follows a school-morning shape compressed into --duration
+seconds:
+  morning  quiet at 07:30, rising to a peak around 08:25, tailing off by 09:00
+  bell     morning plus a short spike just before the 08:50 bell
+  flat     --peak-rps throughout
+Each school's traffic comes from a fixed pool of households 0.3-3 km away, so repeat and
+simultaneous queries happen as they do on a real morning. The report gives latency
+percentiles, throughput and errors per endpoint and per phase, plus upstream OSM calls and the
+app's coalescing. --json saves the report and --compare prints the change against a saved one.
+
+    python -m benchmarks.loadtest --duration 120 --peak-rps 4 --json before.json
+    python -m benchmarks.loadtest --duration 120 --peak-rps 4 --compare before.json
+    python -m benchmarks.loadtest --url http://10.0.0.5:8000 --nominatim http://10.0.0.5:8901/nominatim
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from trusttrack.utils import PLACE_NAME
+
+from .graphs import REPO_ROOT, _deg_per_m
+from .workload import DEFAULT_DATE
+
+APP_DIR = REPO_ROOT / "application"
+ENDPOINTS = ("route", "schools", "health")
+WINDOW = ("07:30", "09:00")  # what --duration stands for
+
+ARRIVALS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "flat": lambda x: np.ones_like(x),
+    "morning": lambda x: 0.12 + 0.88 * np.exp(-((x - 0.61) / 0.14) ** 2),
+    "bell": lambda x: np.minimum(1.0, 0.12 + 0.7 * np.exp(-((x - 0.61) / 0.14) ** 2)
+                                 + 0.9 * np.exp(-((x - 0.86) / 0.025) ** 2)),
+}
+
+
+def arrival_times(pattern: str, duration_s: float, peak_rps: float, rng: np.random.Generator) -> np.ndarray:
+    """Non-homogeneous Poisson arrivals by thinning a peak_rps process against the pattern."""
+    n = rng.poisson(peak_rps * duration_s)
+    t = np.sort(rng.uniform(0, duration_s, n))
+    return t[rng.random(n) < ARRIVALS[pattern](t / duration_s)]
+
+
+def clock_at(x: float) -> str:
+    h0, m0 = map(int, WINDOW[0].split(":"))
+    h1, m1 = map(int, WINDOW[1].split(":"))
+    m = h0 * 60 + m0 + x * ((h1 * 60 + m1) - (h0 * 60 + m0))
+    return f"{int(m // 60):02d}:{int(m % 60):02d}"
+
+
+def households(school_ll, n: int, rng: np.random.Generator) -> np.ndarray:
+    """n homes 0.3-3 km from a school, denser close in."""
+    km = 0.3 + 2.7 * rng.random(n) ** 1.5
+    bearing = rng.uniform(0, 2 * math.pi, n)
+    dlat, dlon = _deg_per_m(school_ll[0])
+    return np.column_stack([school_ll[0] + km * 1000 * np.cos(bearing) * dlat,
+                            school_ll[1] + km * 1000 * np.sin(bearing) * dlon]).round(6)
+
+
+def plan_requests(args, schools: List[str], school_ll: Dict[str, tuple]) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(args.seed)
+    t = arrival_times(args.pattern, args.duration, args.peak_rps, rng)
+    homes = {s: households(school_ll[s], args.households, rng) for s in schools if s in school_ll}
+    names = sorted(homes)
+    mix = np.array([args.mix[e] for e in ENDPOINTS], dtype=float)
+    kinds = rng.choice(ENDPOINTS, size=len(t), p=mix / mix.sum())
+    plan = []
+    for at, kind in zip(t, kinds):
+        if kind == "route" and names:
+            s = names[int(rng.integers(len(names)))]
+            lat, lon = homes[s][int(rng.integers(len(homes[s])))]
+            params = {"origin": f"{lat},{lon}", "school": s, "date_str": DEFAULT_DATE,
+                      "time_str": clock_at(at / args.duration)}
+            if args.format:
+                params["format"] = args.format
+            plan.append({"at": float(at), "endpoint": "route", "path": "/api/route", "params": params})
+        else:
+            kind = "schools" if kind == "route" else str(kind)
+            plan.append({"at": float(at), "endpoint": kind, "path": f"/api/{kind}", "params": {}})
+    return plan
+
+
+async def drive(client: httpx.AsyncClient, plan: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    t0 = time.perf_counter()
+
+    async def one(req):
+        status, size = None, 0
+        try:
+            r = await client.get(req["path"], params=req["params"])
+            status, size = r.status_code, len(r.content)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        results.append({"endpoint": req["endpoint"], "at": req["at"], "status": status, "bytes": size,
+                        "ms": (time.perf_counter() - t0 - req["at"]) * 1000.0})
+
+    tasks = []
+    for req in plan:
+        delay = req["at"] - (time.perf_counter() - t0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(req)))
+    await asyncio.gather(*tasks)
+    return results
+
+
+def summarize(rows: List[Dict[str, Any]], seconds: float) -> Dict[str, Any]:
+    ok = [r for r in rows if r["status"] == 200]
+    ms = np.array([r["ms"] for r in ok]) if ok else np.zeros(1)
+    errors: Dict[str, int] = {}
+    for r in rows:
+        if r["status"] != 200:
+            errors[str(r["status"])] = errors.get(str(r["status"]), 0) + 1
+    return {"requests": len(rows), "ok": len(ok), "error_rate": 1 - len(ok) / len(rows) if rows else 0.0,
+            "errors": errors,
+            "throughput_rps": len(ok) / max(seconds, 1e-9),
+            "p50_ms": float(np.percentile(ms, 50)), "p90_ms": float(np.percentile(ms, 90)),
+            "p99_ms": float(np.percentile(ms, 99)), "max_ms": float(ms.max()),
+            "mean_kib": float(np.mean([r["bytes"] for r in ok]) / 1024) if ok else 0.0}
+
+
+def report(args, rows: List[Dict[str, Any]], wall_s: float, extra: Dict[str, Any]) -> Dict[str, Any]:
+    out = {"endpoints": {e: summarize([r for r in rows if r["endpoint"] == e], wall_s) for e in ENDPOINTS},
+           "all": summarize(rows, wall_s), "phases": []}
+    edges = np.linspace(0, args.duration, args.phases + 1)
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        part = [r for r in rows if lo <= r["at"] < hi]
+        out["phases"].append({"from": clock_at(lo / args.duration), "to": clock_at(hi / args.duration),
+                              "offered_rps": len(part) / (hi - lo), **summarize(part, hi - lo)})
+    out.update(extra)
+    return out
+
+
+def git_rev() -> str:
+    try:
+        rev = subprocess.run(["git", "-C", str(REPO_ROOT), "describe", "--always", "--dirty"],
+                             capture_output=True, text=True, timeout=30).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        rev = ""
+    return rev or "unknown"
+
+
+def print_report(r: Dict[str, Any]) -> None:
+    print(f"build {r['build']}, pattern {r['config']['pattern']} at {r['config']['peak_rps']:g} req/s peak "
+          f"over {r['config']['duration']:g} s, {r['wall_s']:.1f} s wall")
+    head = f"{'':<10}{'reqs':>6}{'ok':>6}{'err %':>7}{'req/s':>7}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    print(head)
+    for name, s in list(r["endpoints"].items()) + [("all", r["all"])]:
+        if not s["requests"]:
+            continue
+        print(f"{name:<10}{s['requests']:>6}{s['ok']:>6}{s['error_rate'] * 100:>7.1f}{s['throughput_rps']:>7.2f}"
+              f"{s['p50_ms']:>9.0f}{s['p90_ms']:>9.0f}{s['p99_ms']:>9.0f}{s['max_ms']:>9.0f}")
+    print(f"{'phase':<12}{'offered/s':>10}{'ok':>6}{'err %':>7}{'p50 ms':>9}{'p99 ms':>9}")
+    for p in r["phases"]:
+        print(f"{p['from']}-{p['to']:<6}{p['offered_rps']:>10.2f}{p['ok']:>6}{p['error_rate'] * 100:>7.1f}"
+              f"{p['p50_ms']:>9.0f}{p['p99_ms']:>9.0f}")
+    errors = r["all"]["errors"]
+    if errors:
+        print("errors: " + ", ".join(f"{k} x{v}" for k, v in sorted(errors.items())))
+    if r.get("upstream"):
+        print(f"upstream OSM requests: {r['upstream']}")
+    if r.get("app_stats"):
+        print(f"app: coalesced {r['app_stats'].get('coalesced_share')}, cache hit rate {r['app_stats'].get('cache_hit_rate')}")
+
+
+def print_compare(r: Dict[str, Any], base: Dict[str, Any]) -> None:
+    print(f"\nvs {base['build']} ({base['config']['pattern']} at {base['config']['peak_rps']:g} req/s, "
+          f"seed {base['config']['seed']})")
+    if {k: v for k, v in base["config"].items() if k != "url"} != {k: v for k, v in r["config"].items() if k != "url"}:
+        print("  warning: the runs used different settings; the numbers are not like for like")
+    print(f"{'':<12}{'p50 ms':^31}{'p99 ms':^31}{'req/s':^24}{'err %':^24}")
+    for name in list(ENDPOINTS) + ["all"]:
+        a = base["all"] if name == "all" else base["endpoints"].get(name)
+        b = r["all"] if name == "all" else r["endpoints"][name]
+        if not a or not b["requests"]:
+            continue
+        cell = lambda k, f=1.0: f"{a[k] * f:10.2f} -> {b[k] * f:<10.2f}"
+        pct = lambda k: f"{(b[k] - a[k]) / a[k] * 100:+6.0f}%" if a[k] else "      "
+        print(f"{name:<12}{cell('p50_ms')}{pct('p50_ms')}{cell('p99_ms')}{pct('p99_ms')}"
+              f"{cell('throughput_rps')}{cell('error_rate', 100)}")
+
+
+def wait_until_up(url: str, timeout_s: float, proc: Optional[subprocess.Popen] = None) -> None:
+    t_end = time.monotonic() + timeout_s
+    while time.monotonic() < t_end:
+        if proc is not None and proc.poll() is not None:
+            sys.exit(f"{url} exited with {proc.returncode} before it came up")
+        try:
+            if httpx.get(url, timeout=5).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    sys.exit(f"{url} did not come up within {timeout_s:g} s")
+
+
+def start_servers(args, workdir: Path) -> List[subprocess.Popen]:
+    """The stand-in and the app, logging into workdir; the app runs there so its caches are local to it."""
+    if not args.keep_cache:
+        shutil.rmtree(workdir, ignore_errors=True)
+    workdir.mkdir(parents=True, exist_ok=True)
+    procs = []
+    standin = [sys.executable, "-m", "benchmarks.osm_standin", "--port", str(args.standin_port),
+               "--latency-ms", str(args.upstream_latency_ms)]
+    procs.append(subprocess.Popen(standin, cwd=APP_DIR, stdout=open(workdir / "standin.log", "w"),
+                                  stderr=subprocess.STDOUT))
+    wait_until_up(f"{args.standin}/standin/stats", 60, procs[0])
+    env = dict(os.environ, TRUSTTRACK_OVERPASS_URL=f"{args.standin}/api",
+               TRUSTTRACK_NOMINATIM_URL=args.nominatim, TRUSTTRACK_LIVE_SOURCE="off",
+               TRUSTTRACK_BUNDLE_POLL_S="0")
+    app = [sys.executable, "-m", "uvicorn", "app:app", "--app-dir", str(APP_DIR), "--port", str(args.app_port),
+           "--workers", str(args.workers), "--log-level", "warning"]
+    procs.append(subprocess.Popen(app, cwd=workdir, env=env, stdout=open(workdir / "app.log", "w"),
+                                  stderr=subprocess.STDOUT))
+    wait_until_up(f"{args.url}/api/health", args.startup_timeout, procs[1])
+    if not httpx.get(f"{args.url}/api/health", timeout=30).json().get("drive_graph_loaded"):
+        for p in procs:
+            p.terminate()
+        sys.exit(f"the app came up without its drive-time table, so park-and-ride would not be measured; "
+                 f"see {workdir / 'app.log'}")
+    return procs
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="an app that is already running (default: start one against the stand-in)")
+    ap.add_argument("--nominatim", help="Nominatim the app uses, to place schools (default: the stand-in's)")
+    ap.add_argument("--pattern", choices=sorted(ARRIVALS), default="morning")
+    ap.add_argument("--duration", type=float, default=120.0, help=f"seconds standing for {WINDOW[0]}-{WINDOW[1]}")
+    ap.add_argument("--peak-rps", type=float, default=4.0)
+    ap.add_argument("--mix", default="route=0.8,schools=0.1,health=0.1")
+    ap.add_argument("--households", type=int, default=40, help="homes per school that route queries come from")
+    ap.add_argument("--format", choices=("full", "compact"), default="compact")
+    ap.add_argument("--concurrency", type=int, default=256, help="client connection cap")
+    ap.add_argument("--timeout", type=float, default=60.0, help="per-request timeout, seconds")
+    ap.add_argument("--phases", type=int, default=6)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers for the started app")
+    ap.add_argument("--app-port", type=int, default=8900)
+    ap.add_argument("--standin-port", type=int, default=8901)
+    ap.add_argument("--upstream-latency-ms", type=float, default=0.0, help="stand-in reply delay")
+    ap.add_argument("--workdir", default="./.loadtest")
+    ap.add_argument("--keep-cache", action="store_true", help="reuse the app's caches from the last run")
+    ap.add_argument("--startup-timeout", type=float, default=600.0)
+    ap.add_argument("--json", help="write the report here")
+    ap.add_argument("--compare", help="a previous --json report to compare against")
+    args = ap.parse_args()
+    try:
+        args.mix = {e: 0.0 for e in ENDPOINTS} | {k: float(v) for k, v in (p.split("=") for p in args.mix.split(","))}
+    except ValueError:
+        ap.error("--mix takes endpoint=weight pairs, e.g. route=0.8,schools=0.1,health=0.1")
+    if set(args.mix) - set(ENDPOINTS):
+        ap.error(f"--mix endpoints are {', '.join(ENDPOINTS)}")
+
+    args.standin = f"http://127.0.0.1:{args.standin_port}"
+    args.nominatim = args.nominatim or f"{args.standin}/nominatim"
+    procs = []
+    if args.url is None:
+        args.url = f"http://127.0.0.1:{args.app_port}"
+        procs = start_servers(args, Path(args.workdir))
+    try:
+        schools = httpx.get(f"{args.url}/api/schools", timeout=30).json()["schools"]
+        school_ll = {}
+        for s in schools:  # the query the app's geocoder sends
+            hits = httpx.get(f"{args.nominatim.rstrip('/')}/search", timeout=30,
+                             params={"q": f"{s}, {PLACE_NAME}", "format": "json", "limit": 1}).json()
+            if hits:
+                school_ll[s] = (float(hits[0]["lat"]), float(hits[0]["lon"]))
+        plan = plan_requests(args, schools, school_ll)
+        upstream0 = httpx.get(f"{args.standin}/standin/stats", timeout=10).json()["requests"] if procs else None
+
+        print(f"{len(plan)} requests over {args.duration:g} s ({args.pattern}, peak {args.peak_rps:g}/s) "
+              f"against {args.url}", flush=True)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        t0 = time.perf_counter()
+
+        async def go():
+            async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+                return await drive(client, plan)
+        rows = asyncio.run(go())
+        wall_s = time.perf_counter() - t0
+
+        extra: Dict[str, Any] = {"build": git_rev(), "wall_s": wall_s,
+                                 "config": {k: getattr(args, k) for k in ("pattern", "duration", "peak_rps", "mix",
+                                            "households", "format", "seed", "workers", "upstream_latency_ms", "url")},
+                                 "env": {"python": platform.python_version(), "machine": platform.machine(),
+                                         "cpus": os.cpu_count()}}
+        if upstream0 is not None:
+            upstream1 = httpx.get(f"{args.standin}/standin/stats", timeout=10).json()["requests"]
+            extra["upstream"] = {k: v - upstream0.get(k, 0) for k, v in upstream1.items() if v - upstream0.get(k, 0)}
+        try:
+            extra["app_stats"] = httpx.get(f"{args.url}/api/stats", timeout=10).json()
+        except (httpx.HTTPError, ValueError):
+            pass
+    finally:
+        for p in reversed(procs):
+            p.terminate()
+            p.wait(timeout=30)
+
+    r = report(args, rows, wall_s, extra)
+    print_report(r)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(r, f, indent=1)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_compare(r, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Many-to-many walk matrix benchmark.
+Times WalkMatrixGraph.matrix for sources x targets against the per-pair walk_leg path it
+replaces (a sample of pairs, extrapolated), and checks the sampled cells agree.
+
+    python -m benchmarks.matrix --graph organic --edges 100000 --sources 1000 --targets 500
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from trusttrack.matrix import WalkMatrixGraph
+from trusttrack.routing import walk_leg
+from trusttrack.utils import validate_graph
+
+from .graphs import make_graph
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--graph", choices=("grid", "organic", "canberra"), default="organic")
+    ap.add_argument("--edges", type=int, default=100_000)
+    ap.add_argument("--sources", type=int, default=1000)
+    ap.add_argument("--targets", type=int, default=500)
+    ap.add_argument("--objective", choices=("fast", "safe"), default="safe")
+    ap.add_argument("--sample-pairs", type=int, default=30)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    G = make_graph(args.graph, args.edges, args.seed)
+    rng = np.random.default_rng(args.seed)
+    nodes = list(G.nodes)
+    pts = lambda k: [(G.nodes[nodes[i]]["y"], G.nodes[nodes[i]]["x"]) for i in rng.choice(len(nodes), k)]
+    sources, targets = pts(args.sources), pts(args.targets)
+    print(f"graph {G.graph.get('name')}: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
+
+    t0 = time.perf_counter()
+    M = WalkMatrixGraph(G)
+    M._edges("w_fast" if args.objective == "fast" else "w_safe")
+    prep_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    res = M.matrix(sources, targets, args.objective)
+    matrix_s = time.perf_counter() - t0
+
+    time_key = validate_graph(G)
+    pairs = [(int(rng.integers(args.sources)), int(rng.integers(args.targets))) for _ in range(args.sample_pairs)]
+    t0 = time.perf_counter()
+    worst = 0.0
+    for i, j in pairs:
+        minutes, _ = walk_leg(G, sources[i], targets[j], args.objective, time_key)
+        worst = max(worst, abs(minutes - res["minutes"][i, j]))
+    per_pair_s = (time.perf_counter() - t0) / len(pairs)
+
+    cells = args.sources * args.targets
+    print(f"matrix {args.sources} x {args.targets} ({args.objective}): {matrix_s:.2f} s "
+          f"+ {prep_s:.2f} s CSR build, {np.isnan(res['minutes']).mean():.1%} unreachable")
+    print(f"walk_leg per pair: {per_pair_s * 1000:.1f} ms -> {per_pair_s * cells / 60:.0f} min for all cells "
+          f"(x{per_pair_s * cells / matrix_s:.0f}); max sampled minutes diff {worst:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Overpass/Nominatim cache benchmark.
+Disk use and load time of the raw OSMnx cache files in notebooks/cache (read_text + json.loads,
+as OSMnx does) against the same responses in the compressed ResponseCache.
+
+    python -m benchmarks.osm_cache --repeat 20
+"""
+
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from trusttrack.cache import LEGACY_PREFIX, ResponseCache
+
+from .graphs import REPO_ROOT
+
+RAW_CACHE = REPO_ROOT / "notebooks" / "cache"
+
+
+def timed(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return statistics.median(times)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--folder", default=str(RAW_CACHE), help="raw OSMnx cache folder")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    files = sorted(Path(args.folder).glob("*.json"))
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResponseCache(tmp, budget_bytes=1 << 40)
+        cache.import_osmnx_files(args.folder)
+        print(f"{'response':<14}{'raw KiB':>10}{'gz KiB':>10}{'raw load ms':>13}{'cache load ms':>15}")
+        for path in files:
+            key = LEGACY_PREFIX + path.stem
+            raw_ms = timed(lambda: json.loads(path.read_text(encoding="utf-8")), args.repeat)
+            new_ms = timed(lambda: cache._read(key), args.repeat)
+            e = cache._index[key]
+            print(f"{path.stem[:12]:<14}{path.stat().st_size / 1024:>10.1f}{e['bytes'] / 1024:>10.1f}"
+                  f"{raw_ms:>13.2f}{new_ms:>15.2f}")
+        s = cache.stats()
+        raw_total = sum(p.stat().st_size for p in files)
+        print(f"total: {raw_total / 1024:.0f} KiB raw -> {s['disk_bytes'] / 1024:.0f} KiB "
+              f"(x{raw_total / max(1, s['disk_bytes']):.1f} smaller)")
+
+
+if __name__ == "__main__":
+    main()
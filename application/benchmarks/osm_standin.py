@@ -0,0 +1,299 @@
+"""
+Local Overpass/Nominatim stand-in.
+Serves the Overpass and Nominatim endpoints OSMnx calls, from responses recorded in
+notebooks/cache, so the app can be load-tested without touching the public OSM servers.
+Point the app at it with TRUSTTRACK_OVERPASS_URL=http://127.0.0.1:8901/api and
+TRUSTTRACK_NOMINATIM_URL=http://127.0.0.1:8901/nominatim.
+
+Overpass network queries are cut out of a recorded response when its coverage contains the
+query polygon: ways with a node inside the polygon, plus all their nodes, filtered by the
+query's tag clauses. A polygon outside every recording gets a synthetic street lattice on a
+fixed global grid, so overlapping queries share node ids. Drive queries get every fourth line.
+Nominatim searches match a recorded result by name. Any other name resolves to a point in
+Canberra derived from a hash of the name, so it is the same on every run. Add --latency-ms
+to mimic the upstream round trip.
+
+    python -m benchmarks.osm_standin --port 8901 --latency-ms 300
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+from .graphs import REPO_ROOT, SIDEWALK_P, SIDEWALKS, _deg_per_m
+
+RECORDED = REPO_ROOT / "notebooks" / "cache"
+SYNTH_BLOCK_M = 120.0
+SYNTH_DRIVE_EVERY = 4             # drive queries keep lines 0, 4, 8, ... (tertiary and up)
+SYNTH_NODE_BASE = 9_000_000_000   # far above real OSM ids
+SYNTH_WAY_BASE = 2_000_000_000
+SYNTH_MAXSPEED = {"primary": "80", "secondary": "60", "tertiary": "60", "residential": "50", "service": "20"}
+GEOCODE_BOX = ((-35.40, -35.17), (149.02, 149.20))  # Canberra's suburbs, for unrecorded names
+
+DLAT, DLON = (SYNTH_BLOCK_M * d for d in _deg_per_m(-35.3))
+STATUS = ("Connected as: 0\nCurrent time: {now}\nAnnounced endpoint: none\nRate limit: 0\n"
+          "6 slots available now.\nCurrently running queries (pid, space limit, time limit, start time):\n")
+CLAUSE = re.compile(r'\["([^"]+)"(?:(!?~)"([^"]*)")?\]')
+POLY = re.compile(r"poly:'([^']*)'")
+
+
+def _unit(*ints: np.ndarray) -> np.ndarray:
+    """Deterministic pseudo-random [0, 1) per lattice element (no RNG state to keep in step)."""
+    h = np.zeros(np.broadcast(*ints).shape, dtype=np.uint64)
+    for k, x in enumerate(ints):
+        h ^= (np.asarray(x).astype(np.int64).astype(np.uint64) + np.uint64(k + 1)) * np.uint64(0x9E3779B97F4A7C15)
+        h ^= h >> np.uint64(29)
+    return (h % np.uint64(1 << 20)).astype(float) / float(1 << 20)
+
+
+def parse_filter(query: str) -> List[Tuple[str, Optional[str], Optional[re.Pattern]]]:
+    """The way clauses of an OSMnx query: ("highway", None, None), ("foot", "!~", re.compile("no"))..."""
+    head = query.split("(poly:", 1)[0]
+    return [(k, op or None, re.compile(v) if op else None) for k, op, v in CLAUSE.findall(head)]
+
+
+def tags_match(tags: Dict[str, str], clauses) -> bool:
+    for key, op, pattern in clauses:
+        value = tags.get(key)
+        if op is None:
+            if value is None:
+                return False
+        elif op == "~":
+            if value is None or not pattern.search(value):
+                return False
+        elif value is not None and pattern.search(value):
+            return False
+    return True
+
+
+def query_polygon(query: str) -> Optional[Polygon]:
+    m = POLY.search(query)
+    if m is None:
+        return None
+    xy = np.array(m.group(1).split(), dtype=float).reshape(-1, 2)
+    return Polygon(xy[:, ::-1])  # Overpass lists "lat lon"
+
+
+class Recording:
+    """One recorded Overpass response, with node coordinates and way membership as arrays."""
+
+    def __init__(self, name: str, doc: Dict[str, Any]):
+        self.name = name
+        self.nodes = [e for e in doc["elements"] if e["type"] == "node"]
+        self.ways = [e for e in doc["elements"] if e["type"] == "way"]
+        self.lat = np.array([n["lat"] for n in self.nodes])
+        self.lon = np.array([n["lon"] for n in self.nodes])
+        pos = {n["id"]: i for i, n in enumerate(self.nodes)}
+        members = [[pos[n] for n in w["nodes"] if n in pos] for w in self.ways]
+        self.ways = [w for w, m in zip(self.ways, members) if m]
+        members = [m for m in members if m]
+        self.member = np.concatenate(members) if members else np.zeros(0, dtype=int)
+        self.offsets = np.cumsum([0] + [len(m) for m in members[:-1]])
+        self.bounds = (self.lon.min(), self.lat.min(), self.lon.max(), self.lat.max()) if self.nodes else None
+
+    def covers(self, poly: Polygon) -> bool:
+        if self.bounds is None:
+            return False
+        x0, y0, x1, y1 = poly.bounds
+        return self.bounds[0] <= x0 and self.bounds[1] <= y0 and x1 <= self.bounds[2] and y1 <= self.bounds[3]
+
+    def cut(self, poly: Polygon, clauses) -> List[Dict[str, Any]]:
+        """Ways with a node inside poly that pass the clauses, then all of those ways' nodes."""
+        inside = shapely.contains_xy(poly, self.lon, self.lat)
+        hit = np.add.reduceat(inside[self.member], self.offsets) > 0 if len(self.member) else []
+        ways = [w for w, h in zip(self.ways, hit) if h and tags_match(w.get("tags", {}), clauses)]
+        keep = {n for w in ways for n in w["nodes"]}
+        return [n for n in self.nodes if n["id"] in keep] + ways
+
+
+def lattice(poly: Polygon, clauses, drive: bool) -> List[Dict[str, Any]]:
+    """Synthetic streets for poly on the global SYNTH_BLOCK_M grid; classes and tags hash off the indices."""
+    x0, y0, x1, y1 = poly.bounds
+    rows = np.arange(int(np.floor(y0 / DLAT)), int(np.ceil(y1 / DLAT)) + 1)
+    cols = np.arange(int(np.floor(x0 / DLON)), int(np.ceil(x1 / DLON)) + 1)
+    if drive:
+        rows, cols = rows[rows % SYNTH_DRIVE_EVERY == 0], cols[cols % SYNTH_DRIVE_EVERY == 0]
+    R, C = np.meshgrid(rows, cols, indexing="ij")
+    lat, lon = R * DLAT, C * DLON
+    inside = shapely.contains_xy(poly, lon, lat)
+    ids = SYNTH_NODE_BASE + (R % 100_000) * 10_000_000 + C
+
+    ways, used = [], np.zeros_like(inside)
+    for axis, line_of in ((1, R), (0, C)):  # east-west streets run along a row, north-south along a column
+        a = [slice(None), slice(None)]
+        b = [slice(None), slice(None)]
+        a[axis], b[axis] = slice(None, -1), slice(1, None)
+        a, b = tuple(a), tuple(b)
+        seg = inside[a] | inside[b]
+        line = line_of[a][seg]
+        u, v = ids[a][seg], ids[b][seg]
+        r = _unit(u, v)
+        hw = np.where(line % 24 == 0, "primary", np.where(line % 12 == 0, "secondary",
+                      np.where(line % 4 == 0, "tertiary", np.where(r < 0.08, "footway",
+                               np.where(r < 0.18, "service", "residential")))))
+        side = SIDEWALKS[np.minimum(np.searchsorted(np.cumsum(SIDEWALK_P), _unit(u, v, line)), len(SIDEWALKS) - 1)]
+        lane = (r > 0.7) & np.isin(hw, ("secondary", "tertiary"))
+        for k in range(len(u)):
+            tags = {"highway": str(hw[k]), "name": f"Lattice {'Street' if axis else 'Avenue'} {int(line[k])}"}
+            if side[k]:
+                tags["sidewalk"] = str(side[k])
+            if lane[k]:
+                tags["cycleway"] = "lane"
+            if str(hw[k]) in SYNTH_MAXSPEED:  # without any, add_edge_speeds has nothing to impute from
+                tags["maxspeed"] = SYNTH_MAXSPEED[str(hw[k])]
+            if tags_match(tags, clauses):
+                ways.append({"type": "way", "id": SYNTH_WAY_BASE + int(u[k] - SYNTH_NODE_BASE) * 2 + axis,
+                             "nodes": [int(u[k]), int(v[k])], "tags": tags})
+        used[a] |= seg
+        used[b] |= seg
+    keep = {n for w in ways for n in w["nodes"]}
+    nodes = [{"type": "node", "id": int(i), "lat": round(float(y), 7), "lon": round(float(x), 7)}
+             for i, y, x in zip(ids[used], lat[used], lon[used]) if int(i) in keep]
+    return nodes + ways
+
+
+class StandIn:
+    """Recorded Overpass documents and Nominatim results, plus per-endpoint request counts."""
+
+    def __init__(self, folders: List[Path], latency_ms: float = 0.0):
+        self.latency_s = latency_ms / 1000.0
+        self.recordings: List[Recording] = []
+        self.places: Dict[str, List[Dict[str, Any]]] = {}
+        for folder in folders:
+            for path in sorted(Path(folder).glob("*.json")):
+                doc = json.loads(path.read_text(encoding="utf-8"))
+                if isinstance(doc, dict) and "elements" in doc:
+                    self.recordings.append(Recording(path.stem, doc))
+                elif isinstance(doc, list):
+                    for hit in doc:
+                        self.places.setdefault(hit.get("name", "").strip().lower(), []).append(hit)
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def overpass(self, query: str) -> Dict[str, Any]:
+        poly = query_polygon(query)
+        clauses = parse_filter(query)
+        elements: List[Dict[str, Any]] = []
+        if poly is not None and any(k == "highway" for k, _, _ in clauses):
+            rec = next((r for r in self.recordings if r.covers(poly)), None)
+            if rec is not None:
+                self._count("overpass_replayed")
+                elements = rec.cut(poly, clauses)
+            else:
+                self._count("overpass_synthetic")
+                elements = lattice(poly, clauses, drive="footway" in query)
+        else:
+            self._count("overpass_other")  # feature queries (parking extract): nothing recorded
+        return {"version": 0.6, "generator": "trusttrack osm stand-in",
+                "osm3s": {"timestamp_osm_base": "", "copyright": "The data included in this document is from "
+                          "www.openstreetmap.org. The data is made available under ODbL."},
+                "elements": elements}
+
+    def search(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        q = params.get("q", "")
+        name = q.split(",")[0].strip().lower()
+        if name in self.places:
+            self._count("nominatim_replayed")
+            return self.places[name][:int(params.get("limit", 50))]
+        self._count("nominatim_synthetic")
+        u = int(hashlib.sha1(name.encode("utf-8")).hexdigest()[:8], 16)
+        (lat0, lat1), (lon0, lon1) = GEOCODE_BOX
+        lat = lat0 + (u & 0xFFFF) / 0xFFFF * (lat1 - lat0)
+        lon = lon0 + (u >> 16) / 0xFFFF * (lon1 - lon0)
+        hit = {"place_id": u, "osm_type": "node", "osm_id": u, "lat": f"{lat:.7f}", "lon": f"{lon:.7f}",
+               "class": "amenity", "type": "school", "place_rank": 30, "importance": 0.0001,
+               "name": q.split(",")[0].strip(), "display_name": q,
+               "boundingbox": [f"{lat - 1e-3:.7f}", f"{lat + 1e-3:.7f}", f"{lon - 1e-3:.7f}", f"{lon + 1e-3:.7f}"]}
+        if params.get("polygon_geojson") == "1":
+            hit["geojson"] = {"type": "Point", "coordinates": [lon, lat]}
+        return [hit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"recordings": len(self.recordings), "places": len(self.places), "requests": dict(self.counts)}
+
+
+def make_handler(standin: StandIn):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, body: bytes, content_type: str = "application/json", status: int = 200) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _params(self) -> Dict[str, str]:
+            parts = urlsplit(self.path)
+            query = parts.query
+            if self.command == "POST":
+                query = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+            return {k: v[-1] for k, v in parse_qs(query, keep_blank_values=True).items()}
+
+        def _dispatch(self) -> None:
+            path = urlsplit(self.path).path.rstrip("/")
+            params = self._params()
+            if path.endswith("/status"):
+                return self._send(STATUS.format(now=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())).encode(),
+                                  "text/plain")
+            if path == "/standin/stats":
+                return self._send(json.dumps(standin.stats()).encode())
+            time.sleep(standin.latency_s)
+            if path.endswith("/interpreter"):
+                return self._send(json.dumps(standin.overpass(params.get("data", ""))).encode())
+            if path.endswith("/search"):
+                return self._send(json.dumps(standin.search(params)).encode())
+            self._send(b'{"error": "not served by the stand-in"}', status=404)
+
+        do_GET = do_POST = _dispatch
+
+    return Handler
+
+
+def serve(port: int, folders: List[Path], latency_ms: float = 0.0, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    standin = StandIn(folders, latency_ms)
+    server = ThreadingHTTPServer((host, port), make_handler(standin))
+    server.daemon_threads = True
+    server.standin = standin
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8901)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--recorded", nargs="*", default=[str(RECORDED)], help="folders of raw OSMnx cache files")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="added to every Overpass/Nominatim reply")
+    args = ap.parse_args()
+
+    server = serve(args.port, [Path(f) for f in args.recorded], args.latency_ms, args.host)
+    s = server.standin.stats()
+    print(f"OSM stand-in on http://{args.host}:{args.port} ({s['recordings']} Overpass recordings, "
+          f"{s['places']} places); /api for Overpass, /nominatim for Nominatim", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Parking candidate selection benchmark.
+Compares the time to find the parking sites within PR_LIMIT_KM_TO_SCHOOL of a school. The
+notebook path parses every site's Point string and computes its haversine distance with
+DataFrame.apply, on every request. The index path is one ParkingIndex.near call. The table is
+the real P&R and smart-parking sites plus --osm synthetic OSM lots scattered over Canberra,
+standing in for the territory extract. Walk legs are left out, and the check compares the two
+candidate sets.
+
+    python -m benchmarks.parking --osm 5000 --queries 200
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from trusttrack.bundle import DATA_FILES, load_park_ride
+from trusttrack.parking import COLUMNS, ParkingIndex, load_smart_parking
+from trusttrack.routing import PR_LIMIT_KM_TO_SCHOOL
+from trusttrack.utils import find_data, haversine_km, parse_paren_latlon
+
+CENTRE = (-35.28, 149.13)
+
+
+def synthetic_osm(n: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    ll = (np.array(CENTRE) + rng.uniform(-0.15, 0.15, (n, 2))).round(6)  # as the Point strings carry them
+    return pd.DataFrame({"name": [f"OSM lot {i}" for i in range(n)], "source": "osm", "lat": ll[:, 0], "lon": ll[:, 1],
+                         "capacity": rng.integers(5, 400, n).astype(float), "permit": "none",
+                         "fee": np.nan, "max_stay_min": np.nan}, columns=COLUMNS)
+
+
+def notebook_candidates(points_df: pd.DataFrame, dest, limit_km: float) -> pd.DataFrame:
+    """evaluate_park_and_stride's selection: parse Point strings, apply haversine row by row."""
+    def _parse_point(s):
+        lat, lon = parse_paren_latlon(s); return pd.Series({"lat": lat, "lon": lon})
+    df = points_df.copy()
+    pts = df["Point"].apply(_parse_point)
+    df = pd.concat([df, pts], axis=1).dropna(subset=["lat", "lon"]).copy()
+    df["km_to_school"] = df.apply(lambda r: haversine_km(dest[0], dest[1], r.lat, r.lon), axis=1)
+    return df[df.km_to_school <= limit_km]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--osm", type=int, default=5000, help="Synthetic OSM parking lots")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    index = ParkingIndex.from_sources(load_park_ride(find_data(DATA_FILES["park_ride"])),
+                                      load_smart_parking(find_data(DATA_FILES["smart_parking"])),
+                                      synthetic_osm(args.osm, args.seed))
+    build_ms = (time.perf_counter() - t0) * 1000
+    points_df = pd.DataFrame({"Point": [f"( {a:.6f}, {b:.6f} )" for a, b in zip(index.table["lat"], index.table["lon"])],
+                              "Location": index.table["name"]})
+
+    rng = np.random.default_rng(args.seed + 1)
+    dests = np.array(CENTRE) + rng.uniform(-0.1, 0.1, (args.queries, 2))
+    old_ms, new_us, mismatches, n_cands = [], [], 0, 0
+    for lat, lon in dests:
+        t0 = time.perf_counter()
+        old = notebook_candidates(points_df, (lat, lon), PR_LIMIT_KM_TO_SCHOOL)
+        old_ms.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        idx, _ = index.near(lat, lon, PR_LIMIT_KM_TO_SCHOOL)
+        new_us.append((time.perf_counter() - t0) * 1e6)
+        n_cands += len(idx)
+        mismatches += set(old.index) != set(idx.tolist())
+
+    p = lambda xs, q: statistics.quantiles(xs, n=100)[q - 1]
+    print(f"{len(index)} sites ({index.describe()['by_source']}), index built in {build_ms:.0f} ms; "
+          f"{args.queries} schools, {n_cands / args.queries:.0f} candidates within {PR_LIMIT_KM_TO_SCHOOL:g} km")
+    print(f"notebook apply : p50 {p(old_ms, 50):8.2f} ms  p95 {p(old_ms, 95):8.2f} ms")
+    print(f"ParkingIndex   : p50 {p(new_us, 50):8.1f} us  p95 {p(new_us, 95):8.1f} us")
+    print(f"candidate sets differing: {mismatches}/{args.queries}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Hazard report ingest benchmark.
+Concurrent clients submit single reports to a ReportStore for --seconds. This is run with
+group commit (one write and fsync per FSYNC_INTERVAL_MS window) and with an fsync per report,
+as a naive log would do. With --http the same load goes through the real POST /api/reports
+endpoint in-process (ASGI, no sockets), with the app's validation and serialization included.
+Then a route of --route-km through the reported area is queried against the aggregate and
+compared with re-reading and filtering the raw log.
+
+    python -m benchmarks.reports --clients 200 --seconds 5 --http
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from trusttrack.reports import CELL_DEG, ReportStore, _xy
+
+CENTRE = (-35.28, 149.13)
+
+
+def random_reports(rng: np.random.Generator, n: int):
+    ll = np.array(CENTRE) + rng.normal(0, 0.01, (n, 2))
+    cats = rng.choice(["traffic", "crossing", "footpath", "lighting"], n)
+    return [{"lat": float(a), "lon": float(b), "category": str(c)} for (a, b), c in zip(ll, cats)]
+
+
+async def naive_submit(path: str, lock: asyncio.Lock, record: dict) -> None:
+    """One write and fsync per report, serialised, as a plain append-only file would do it."""
+    def write():
+        with open(path, "ab") as f:
+            f.write(json.dumps(record).encode() + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+    async with lock:
+        await asyncio.to_thread(write)
+
+
+async def load(submit, clients: int, seconds: float, rng: np.random.Generator):
+    """Closed loop: each client submits its next report as soon as the last one is acknowledged."""
+    latencies, t_end = [], time.monotonic() + seconds
+    pool = random_reports(rng, 4096)
+
+    async def client(k):
+        i = k
+        while time.monotonic() < t_end:
+            t0 = time.perf_counter()
+            await submit(pool[i % len(pool)])
+            latencies.append((time.perf_counter() - t0) * 1000)
+            i += clients
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(k) for k in range(clients)))
+    return len(latencies) / (time.perf_counter() - t0), latencies
+
+
+def line(name: str, rate: float, ms) -> None:
+    q = statistics.quantiles(ms, n=100)
+    print(f"{name:<22}{rate:10.0f} reports/s   ack p50 {q[49]:7.2f} ms  p99 {q[98]:7.2f} ms")
+
+
+async def run(args) -> None:
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ReportStore(os.path.join(tmp, "group"))
+        await store.start()
+        rate, ms = await load(lambda r: store.submit([dict(r)]), args.clients, args.seconds, rng)
+        line("group commit", rate, ms)
+
+        lock, path = asyncio.Lock(), os.path.join(tmp, "naive.jsonl")
+        rate, ms = await load(lambda r: naive_submit(path, lock, r), args.clients, args.seconds, rng)
+        line("fsync per report", rate, ms)
+
+        if args.http:
+            import httpx
+            from app import app, report_store
+            await report_store.start()
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as c:
+                async def post(r):
+                    resp = await c.post("/api/reports", json=r)
+                    assert resp.status_code == 201, resp.text
+                rate, ms = await load(post, args.clients, args.seconds, rng)
+            line("POST /api/reports", rate, ms)
+            await report_store.stop()
+
+        await asyncio.sleep(1.5)  # let the aggregator and the query index catch up
+        agg = store.aggregate
+        lat = CENTRE[0] + np.linspace(-args.route_km / 2, args.route_km / 2, 50) / 111.32
+        route = np.column_stack([lat, np.full_like(lat, CENTRE[1])])
+        t0 = time.perf_counter()
+        hit = store.near(route, args.radius_m)
+        agg_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        raw = [json.loads(l) for seg in store.log.segments() for l in open(seg[1], "rb")]
+        pts = _xy([r["lat"] for r in raw], [r["lon"] for r in raw])
+        cells = _xy(np.floor(np.array([r["lat"] for r in raw]) / CELL_DEG) * CELL_DEG + CELL_DEG / 2,
+                    np.floor(np.array([r["lon"] for r in raw]) / CELL_DEG) * CELL_DEG + CELL_DEG / 2)
+        x_route = _xy(route[:, 0], route[:, 1])[0, 0]
+        y0, y1 = _xy(route[[0, -1], 0], route[[0, -1], 1])[:, 1]
+        dy = np.maximum(0, np.maximum(y0 - cells[:, 1], cells[:, 1] - y1))
+        near_raw = int((np.hypot(cells[:, 0] - x_route, dy) <= args.radius_m).sum())
+        scan_ms = (time.perf_counter() - t0) * 1000
+        await store.stop()
+        print(f"{agg.reports} reports in {len(agg.entries)} aggregate entries; "
+              f"{args.route_km:g} km route, {args.radius_m:g} m radius:")
+        print(f"  aggregate query {agg_ms:8.2f} ms -> {hit['reports']} reports on {len(hit['segments'])} segments")
+        print(f"  raw log scan    {scan_ms:8.2f} ms -> {near_raw} reports ({len(pts)} scanned)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--clients", type=int, default=200)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--http", action="store_true", help="also load the real endpoint (imports app.py)")
+    ap.add_argument("--route-km", type=float, default=3.0)
+    ap.add_argument("--radius-m", type=float, default=40.0)
+    ap.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Routing engine benchmark.
+Replays an origin/school workload against compute_walk_routes, compute_bus_options and
+apply_bus_safety_and_pick_safest on a synthetic or fixture graph, and reports per-engine
+latency percentiles, throughput and peak traced memory. Fully offline.
+
+    python -m benchmarks.run --graph canberra
+    python -m benchmarks.run --graph grid --edges 100000 --queries 100 --json grid-100k.json
+    python -m benchmarks.run --graph organic --edges 1000000 --queries 20 --engines walk
+    python -m benchmarks.run --graph canberra --record   # refresh benchmarks/workloads/canberra.json
+"""
+
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from trusttrack.routing import compute_walk_routes, compute_bus_options, apply_bus_safety_and_pick_safest
+from trusttrack.utils import find_data
+
+from .graphs import make_graph
+from .workload import WORKLOAD_DIR, generate_workload, load_workload, save_workload, school_bus_stops
+
+ENGINES = ("walk", "bus", "safety")
+JOURNEYS_CSV = "Daily_Public_Transport_Passenger_Journeys_by_Service_Type_20250830.csv"
+MEMORY_QUERIES = 5  # peak memory is measured on a separate, traced pass over this many queries
+
+
+def percentiles(times_ms: List[float]) -> Dict[str, float]:
+    a = np.asarray(times_ms)
+    return {"p50_ms": float(np.percentile(a, 50)), "p95_ms": float(np.percentile(a, 95)),
+            "p99_ms": float(np.percentile(a, 99)), "mean_ms": float(a.mean())}
+
+
+def bench_engine(call: Callable[[Dict[str, Any]], Any], queries: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Latency pass untraced, then peak memory of single calls with tracemalloc on."""
+    call(queries[0])  # warm-up (KD-tree, lazy imports)
+    times = []
+    t_all = time.perf_counter()
+    for q in queries:
+        t0 = time.perf_counter()
+        call(q)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    wall = time.perf_counter() - t_all
+
+    peak = 0
+    for q in queries[:MEMORY_QUERIES]:
+        tracemalloc.start()
+        call(q)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {"queries": len(queries), **percentiles(times), "throughput_qps": len(queries) / wall,
+            "peak_kib": peak / 1024.0}
+
+
+def run(args) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    G = make_graph(args.graph, args.edges, args.seed)
+    build_s = time.perf_counter() - t0
+
+    recorded = WORKLOAD_DIR / f"{args.graph}.json"
+    if args.workload:
+        workload = load_workload(Path(args.workload))
+    elif args.graph == "canberra" and recorded.exists() and not args.record:
+        workload = load_workload(recorded)
+    else:
+        workload = generate_workload(G, n_queries=args.queries, seed=args.seed)
+    if args.record:
+        save_workload(workload, recorded)
+    queries = workload["queries"][:args.queries]
+
+    stops = school_bus_stops(G, workload, seed=args.seed)
+    dj_df = pd.read_csv(find_data(JOURNEYS_CSV))
+    ll = lambda p: (p[0], p[1])
+    bus_cache: Dict[int, pd.DataFrame] = {}
+
+    def walk(q):
+        return compute_walk_routes(G, ll(q["origin"]), ll(q["dest"]))
+
+    def bus(q):
+        return compute_bus_options(G, ll(q["origin"]), ll(q["dest"]), stops, q["school"])
+
+    def safety(q):
+        return apply_bus_safety_and_pick_safest(bus_cache[id(q)], dj_df, date.fromisoformat(q["date"]))
+
+    results: Dict[str, Any] = {}
+    for name in args.engines:
+        if name == "walk":
+            results[name] = bench_engine(walk, queries)
+        elif name == "bus":
+            results[name] = bench_engine(bus, queries)
+        elif name == "safety":
+            for q in queries:  # safety re-scores the bus engine's options; not part of its timing
+                bus_cache[id(q)] = bus(q)["options_df"]
+            results[name] = bench_engine(safety, queries)
+
+    return {
+        "graph": {"kind": args.graph, "name": G.graph.get("name"), "nodes": G.number_of_nodes(),
+                  "edges": G.number_of_edges(), "build_s": round(build_s, 2)},
+        "workload": {"seed": workload.get("seed"), "queries": len(queries), "schools": len(workload["schools"]),
+                     "stops": len(stops)},
+        "engines": results,
+        "env": {"python": platform.python_version(), "machine": platform.machine()},
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    g = report["graph"]
+    print(f"graph {g['name']}: {g['nodes']} nodes, {g['edges']} edges (built in {g['build_s']} s); "
+          f"{report['workload']['queries']} queries, {report['workload']['stops']} stops")
+    print(f"{'engine':<8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'q/s':>10}{'peak KiB':>11}")
+    for name, r in report["engines"].items():
+        print(f"{name:<8}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['throughput_qps']:>10.1f}{r['peak_kib']:>11.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--graph", choices=("grid", "organic", "canberra"), default="canberra")
+    ap.add_argument("--edges", type=int, default=10_000, help="target directed edges for synthetic graphs")
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--engines", type=lambda s: [e for e in s.split(",") if e], default=list(ENGINES),
+                    help=f"comma-separated subset of {','.join(ENGINES)}")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workload", help="replay a recorded workload JSON instead of sampling one")
+    ap.add_argument("--record", action="store_true", help=f"save the sampled workload to {WORKLOAD_DIR.name}/")
+    ap.add_argument("--json", help="also write the report as JSON (to compare builds)")
+    args = ap.parse_args()
+    unknown = set(args.engines) - set(ENGINES)
+    if unknown:
+        ap.error(f"unknown engines: {', '.join(sorted(unknown))}")
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
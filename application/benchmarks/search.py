@@ -0,0 +1,74 @@
+"""
+Goal-directed search benchmark.
+Replays the benchmark workload's walk queries with bidirectional Dijkstra and with A* (haversine
+heuristic for w_fast, ALT landmarks for w_safe), checking the route costs are identical and
+reporting nodes expanded and latency for each.
+
+    python -m benchmarks.search --graph canberra
+    python -m benchmarks.search --graph organic --edges 100000 --queries 100 --landmarks 16
+"""
+
+import argparse
+import statistics
+import time
+from typing import Dict, List
+
+import networkx as nx
+import numpy as np
+
+from trusttrack.landmarks import Landmarks, set_landmarks
+from trusttrack.metrics import counting_weight
+from trusttrack.routing import walk_heuristic
+from trusttrack.utils import nearest_node
+
+from .graphs import make_graph
+from .workload import WORKLOAD_DIR, generate_workload, load_workload
+
+
+def route_cost(G: nx.MultiDiGraph, route: list, weight: str) -> float:
+    return sum(min(d[weight] for d in G[u][v].values()) for u, v in zip(route[:-1], route[1:]))
+
+
+def run_query(G, a, b, weight: str, astar: bool) -> Dict[str, float]:
+    w, touched = counting_weight(weight)
+    t0 = time.perf_counter()
+    if astar:
+        r = nx.astar_path(G, a, b, heuristic=walk_heuristic(G, b, weight), weight=w)
+    else:
+        r = nx.shortest_path(G, a, b, weight=w)
+    return {"ms": (time.perf_counter() - t0) * 1000.0, "expanded": len(touched), "cost": route_cost(G, r, weight)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--graph", choices=("grid", "organic", "canberra"), default="canberra")
+    ap.add_argument("--edges", type=int, default=10_000)
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--landmarks", type=int, default=16)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    G = make_graph(args.graph, args.edges, args.seed)
+    recorded = WORKLOAD_DIR / f"{args.graph}.json"
+    workload = load_workload(recorded) if args.graph == "canberra" and recorded.exists() \
+        else generate_workload(G, n_queries=args.queries, seed=args.seed)
+    pairs = [(nearest_node(G, *q["origin"]), nearest_node(G, *q["dest"])) for q in workload["queries"][:args.queries]]
+
+    t0 = time.perf_counter()
+    set_landmarks(Landmarks.build(G, args.landmarks))
+    print(f"graph {G.graph.get('name')}: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges; "
+          f"{len(pairs)} queries; {args.landmarks} landmarks built in {time.perf_counter() - t0:.2f} s")
+    print(f"{'weight':<8}{'search':<10}{'mean expanded':>15}{'p50 ms':>10}{'p95 ms':>10}{'max |cost diff|':>17}")
+    for weight in ("w_fast", "w_safe"):
+        base: List[Dict[str, float]] = [run_query(G, a, b, weight, astar=False) for a, b in pairs]
+        goal: List[Dict[str, float]] = [run_query(G, a, b, weight, astar=True) for a, b in pairs]
+        diff = max(abs(x["cost"] - y["cost"]) for x, y in zip(base, goal))
+        for name, rows in (("dijkstra", base), ("astar" if weight == "w_fast" else "alt", goal)):
+            ms = [r["ms"] for r in rows]
+            print(f"{weight:<8}{name:<10}{statistics.mean(r['expanded'] for r in rows):>15.0f}"
+                  f"{np.percentile(ms, 50):>10.2f}{np.percentile(ms, 95):>10.2f}"
+                  f"{(diff if name != 'dijkstra' else 0.0):>17.2e}")
+
+
+if __name__ == "__main__":
+    main()
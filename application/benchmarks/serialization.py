@@ -0,0 +1,107 @@
+"""
+Route response encode benchmark.
+Compares the old path (lists -> jsonable_encoder -> stdlib json, i.e. FastAPI's JSONResponse)
+with RouteJSONResponse (NumPy arrays -> orjson) on a realistic make_geojson payload.
+
+    python -m benchmarks.serialization --points 600 --repeat 200
+"""
+
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+from typing import Any, Callable, Dict
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+from trusttrack.routing import make_geojson
+from trusttrack.serialization import dumps, orjson
+
+ORIGIN = (-35.2810, 149.1280)
+SCHOOL = (-35.2734, 149.1396)
+
+
+def _wiggly_path(a, b, n: int, seed: int) -> np.ndarray:
+    """An n-point street-like [lat, lon] polyline from a to b."""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0.0, 1.0, n)
+    lat = a[0] + (b[0] - a[0]) * t + rng.normal(0, 2e-4, n).cumsum() * np.sin(np.pi * t) / np.sqrt(n)
+    lon = a[1] + (b[1] - a[1]) * t + rng.normal(0, 2e-4, n).cumsum() * np.sin(np.pi * t) / np.sqrt(n)
+    return np.ascontiguousarray(np.column_stack([lat, lon]))
+
+
+def build_payload(points: int) -> Dict[str, Any]:
+    """A full /api/route payload as the pipeline produces it (NumPy scalars and arrays)."""
+    walk = {
+        "fastest": {"minutes": np.float64(24.3), "safety": 71, "coords": _wiggly_path(ORIGIN, SCHOOL, points, 1)},
+        "safest":  {"minutes": np.float64(29.8), "safety": 84, "coords": _wiggly_path(ORIGIN, SCHOOL, int(points * 1.3), 2)},
+        "same": False,
+        "risk_minutes_safe": 4.77,
+    }
+    bus = {"start_label": "Braddon 1002", "start_lat": np.float64(-35.277), "start_lon": np.float64(149.133),
+           "w_fast_min": np.float64(6.1), "w_safe_min": np.float64(7.4), "w_safe_score": np.float64(78.2),
+           "bus_min": np.float64(9.4), "total_minutes_fast": np.float64(15.5), "risk_minutes_safe": np.float64(2.36),
+           "crowding_factor": 0.62, "bus_safety_used": 85.8}
+    pr_top = [{"site": f"Park & Ride {i}", "lat": np.float64(-35.27 - i / 100), "lon": np.float64(149.13),
+               "walk_fast_min": np.float64(8.0 + i), "walk_safe_min": np.float64(9.5 + i),
+               "walk_mean_safety": np.float64(80.0), "km_to_school": np.float64(0.8 + i / 3)} for i in range(2)]
+    geo = make_geojson(ORIGIN, SCHOOL, walk, bus, bus, pr_top)
+    return {"origin": {"lat": ORIGIN[0], "lon": ORIGIN[1]},
+            "destination": {"lat": SCHOOL[0], "lon": SCHOOL[1], "name": "Ainslie School"},
+            "walk": walk, "bus": {"fastest": bus, "safest": bus}, "park_and_ride": pr_top,
+            "links": {"google": {"walking": "https://www.google.com/maps/dir/?api=1", "transit": ""}},
+            "geojson": geo}
+
+
+def as_lists(obj: Any) -> Any:
+    """The same payload with arrays as nested lists, as it was before the NumPy path."""
+    if isinstance(obj, dict):
+        return {k: as_lists(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [as_lists(v) for v in obj]
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return obj
+
+
+def encode_before(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def measure(fn: Callable[[Any], bytes], payload: Any, repeat: int) -> Dict[str, float]:
+    fn(payload)  # warm-up
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        body = fn(payload)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    tracemalloc.start()
+    fn(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"median_ms": statistics.median(times), "p95_ms": sorted(times)[int(0.95 * (len(times) - 1))],
+            "peak_alloc_kb": peak / 1024.0, "bytes": len(body)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--points", type=int, default=600, help="points in the fastest walk polyline")
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    payload = build_payload(args.points)
+    before = measure(encode_before, as_lists(payload), args.repeat)
+    after = measure(dumps, payload, args.repeat)
+
+    print(f"encoder: {'orjson' if orjson is not None else 'stdlib json (orjson not installed)'}")
+    print(f"{'path':<34}{'median ms':>10}{'p95 ms':>10}{'peak KiB':>10}{'bytes':>10}")
+    for name, r in (("before: jsonable_encoder + json", before), ("after:  RouteJSONResponse", after)):
+        print(f"{name:<34}{r['median_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['peak_alloc_kb']:>10.1f}{r['bytes']:>10}")
+    print(f"speed-up x{before['median_ms'] / max(after['median_ms'], 1e-9):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Tiled walk graph benchmark.
+Cuts a synthetic graph into tiles, replays a school-morning workload through
+TileStore.graph_bbox under a byte budget, and reports assembly latency, resident tile bytes
+against the whole tile set, and the LRU hit rate. The walk minutes of every query are checked
+against the same query on the untiled graph.
+
+    python -m benchmarks.tiles --graph organic --edges 400000 --queries 60 --budget-mb 3 --tile-deg 0.01
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+from trusttrack.metrics import cache_hit_rate
+from trusttrack.routing import compute_walk_routes
+from trusttrack.tiles import TILE_DEG, TileStore, build_tiles
+
+from .graphs import make_graph
+from .workload import generate_workload
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--graph", choices=("grid", "organic", "canberra"), default="organic")
+    ap.add_argument("--edges", type=int, default=400_000)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--tile-deg", type=float, default=TILE_DEG)
+    ap.add_argument("--budget-mb", type=float, default=8.0)
+    ap.add_argument("--buffer-km", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    G = make_graph(args.graph, args.edges, args.seed)
+    workload = generate_workload(G, args.queries, seed=args.seed)
+    with tempfile.TemporaryDirectory() as root:
+        t0 = time.perf_counter()
+        manifest = build_tiles(G, root, args.tile_deg)
+        build_s = time.perf_counter() - t0
+        total = sum(t["bytes"] for t in manifest["tiles"].values())
+        store = TileStore(root, args.budget_mb)
+
+        assemble_ms, peak, mismatches = [], 0, 0
+        for q in workload["queries"]:
+            t0 = time.perf_counter()
+            H = store.graph_bbox(tuple(q["origin"]), tuple(q["dest"]), args.buffer_km)
+            assemble_ms.append((time.perf_counter() - t0) * 1000)
+            peak = max(peak, store.stats()["resident_bytes"])
+            tiled = compute_walk_routes(H, tuple(q["origin"]), tuple(q["dest"]))
+            full = compute_walk_routes(G, tuple(q["origin"]), tuple(q["dest"]))
+            mismatches += any(tiled[k]["minutes"] != full[k]["minutes"] for k in ("fastest", "safest"))
+
+    q = statistics.quantiles(assemble_ms, n=100)
+    print(f"graph {G.graph.get('name')}: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges -> "
+          f"{len(manifest['tiles'])} tiles of {args.tile_deg} deg in {build_s:.1f} s, {total / 2**20:.1f} MiB")
+    print(f"{args.queries} queries, {args.buffer_km} km buffer: assemble p50 {q[49]:.0f} ms, p95 {q[94]:.0f} ms; "
+          f"resident peak {peak / 2**20:.1f} MiB of {args.budget_mb:g} MiB budget "
+          f"({peak / total:.0%} of all tiles), tile hit rate {cache_hit_rate('tile'):.0%}")
+    print(f"walk minutes differing from the untiled graph: {mismatches}/{args.queries}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Replayable origin/school query workloads.
+Schools are fixed graph nodes and origins are sampled within walking/bus range of them, so a
+seed (or a recorded JSON file) reproduces exactly the same queries across builds.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+WORKLOAD_DIR = Path(__file__).resolve().parent / "workloads"
+DEFAULT_DATE = "2024-08-30"  # a school day present in the journeys CSV
+
+
+def _node_coords(G: nx.MultiDiGraph):
+    nodes = np.fromiter(G.nodes, dtype=np.int64, count=len(G))
+    lat = np.array([G.nodes[n]["y"] for n in nodes])
+    lon = np.array([G.nodes[n]["x"] for n in nodes])
+    return nodes, lat, lon
+
+
+def generate_workload(G: nx.MultiDiGraph, n_queries: int = 200, n_schools: int = 8,
+                      max_km: float = 3.0, seed: int = 0) -> Dict[str, Any]:
+    """Queries from origins up to max_km from one of n_schools schools (school-morning shape)."""
+    rng = np.random.default_rng(seed)
+    nodes, lat, lon = _node_coords(G)
+    school_idx = rng.choice(len(nodes), size=min(n_schools, len(nodes)), replace=False)
+    schools = [{"name": f"Bench School {i + 1}", "lat": float(lat[j]), "lon": float(lon[j])}
+               for i, j in enumerate(school_idx)]
+    in_range = [np.flatnonzero((d >= 0.2) & (d <= max_km))
+                for d in (_km_from(lat, lon, s["lat"], s["lon"]) for s in schools)]
+    queries: List[Dict[str, Any]] = []
+    while len(queries) < n_queries:
+        i = int(rng.integers(len(schools)))
+        if len(in_range[i]) == 0:
+            continue
+        j = int(rng.choice(in_range[i]))
+        s = schools[i]
+        queries.append({"origin": [float(lat[j]), float(lon[j])], "school": s["name"],
+                        "dest": [s["lat"], s["lon"]], "date": DEFAULT_DATE})
+    return {"graph": G.graph.get("name", ""), "seed": seed, "schools": schools, "queries": queries}
+
+
+def _km_from(lat: np.ndarray, lon: np.ndarray, lat0: float, lon0: float) -> np.ndarray:
+    """Vectorised haversine_km from one point; sampling has to stay cheap on 1M-edge graphs."""
+    p1, p2 = np.radians(lat0), np.radians(lat)
+    a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(np.radians(lon - lon0) / 2) ** 2
+    return 6371.0 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def school_bus_stops(G: nx.MultiDiGraph, workload: Dict[str, Any], per_school: int = 30,
+                     seed: int = 0) -> pd.DataFrame:
+    """Synthetic school-bus boarding stops (the columns compute_bus_options reads) around each school."""
+    rng = np.random.default_rng(seed + 1)
+    nodes, lat, lon = _node_coords(G)
+    rows = []
+    for s in workload["schools"]:
+        d = _km_from(lat, lon, s["lat"], s["lon"])
+        ring = np.flatnonzero((d > 1.0) & (d < 6.0))
+        if len(ring) == 0:
+            ring = np.argsort(d)[-per_school:]
+        for k, j in enumerate(rng.choice(ring, size=min(per_school, len(ring)), replace=False)):
+            rows.append({"RouteNumber": 1000 + len(rows), "Description": f"Stop {k + 1}",
+                         "School Name": s["name"], "lat": float(lat[j]), "lon": float(lon[j])})
+    return pd.DataFrame(rows)
+
+
+def save_workload(workload: Dict[str, Any], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(workload, f, indent=1)
+        f.write("\n")
+
+
+def load_workload(path: Path) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
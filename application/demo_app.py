@@ -26,6 +26,8 @@ from trusttrack.routing import (
     compute_walk_routes, compute_bus_options, apply_bus_safety_and_pick_safest,
     compute_pr_options, make_geojson
 )
+from trusttrack.parking import ParkingIndex
+from trusttrack.serialization import RouteJSONResponse, route_response
 
 # Create the main FastAPI app
 app = FastAPI(
@@ -67,6 +69,7 @@ try:
     assert "Point" in pr_df.columns, "Park & Ride CSV must have 'Point' like '(-35.2, 149.1)'"
     pr_df["lat"], pr_df["lon"] = zip(*pr_df["Point"].map(parse_paren_latlon))
     pr_df = pr_df.dropna(subset=["lat","lon"]).copy()
+    parking = ParkingIndex.from_sources(pr_df)
 
     dj_df = pd.read_csv(find_data(DATA_FILES["journeys"]))
     
@@ -80,6 +83,7 @@ except Exception as e:
     print("   Falling back to demo mode...")
     bus_df = None
     pr_df = None
+    parking = None
     dj_df = None
 
 # Available schools
@@ -126,13 +130,13 @@ async def get_schools():
     """Get list of available schools."""
     return {"schools": AVAILABLE_SCHOOLS}
 
-@app.get("/api/route")
+@app.get("/api/route", response_class=RouteJSONResponse, response_model=None)
 async def api_route(
     origin: str = Query(..., description="Place name or lat,lon coordinates"),
     school: Optional[str] = Query(None, description="School name"),
     date_str: Optional[str] = Query(None, description="YYYY-MM-DD date"),
     time_str: Optional[str] = Query(None, description="HH:MM time")
-) -> Dict[str, Any]:
+) -> RouteJSONResponse:
     """
     Plan a route from origin to school using real routing algorithms.
     """
@@ -232,7 +236,7 @@ async def api_route(
             safest = apply_bus_safety_and_pick_safest(bus["options_df"], dj_df, dt)
             
             # Compute park & ride options
-            pr_top = compute_pr_options(G, dest_ll, pr_df)
+            pr_top = compute_pr_options(G, dest_ll, parking)
             
             # Generate GeoJSON
             geo = make_geojson(origin_ll, dest_ll, walk, bus["fastest"], safest, pr_top)
@@ -249,7 +253,7 @@ async def api_route(
             walk_link = gmaps_dir(origin_ll, dest_ll, "walking")
             transit_link = gmaps_dir(origin_ll, dest_ll, "transit")
             
-            return {
+            return route_response({
                 "origin": {"lat": olat, "lon": olon},
                 "destination": {"lat": dlat, "lon": dlon, "name": school_name},
                 "walk": walk,
@@ -266,7 +270,7 @@ async def api_route(
                 },
                 "geojson": geo,
                 "real_routing": True
-            }
+            })
             
         except Exception as e:
             print(f"Real routing failed: {e}")
@@ -556,7 +560,7 @@ async def api_route(
     walk_link = gmaps_dir((olat, olon), (dlat, dlon), "walking")
     transit_link = gmaps_dir((olat, olon), (dlat, dlon), "transit")
     
-    return {
+    return route_response({
         "origin": {"lat": olat, "lon": olon},
         "destination": {"lat": dlat, "lon": dlon, "name": school_name},
         "walk": {
@@ -592,7 +596,7 @@ async def api_route(
         },
         "geojson": create_demo_geojson(),
         "real_routing": False
-    }
+    })
 
 @app.get("/api/health")
 async def health_check():
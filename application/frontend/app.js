@@ -197,7 +197,9 @@ class TrustTrackApp {
             // Build API URL
             const params = new URLSearchParams({
                 origin: origin,
-                school: school
+                school: school,
+                format: 'compact',
+                zoom: Math.max(this.map.getZoom(), 15)
             });
             
             if (date) params.append('date_str', date);
@@ -297,8 +299,11 @@ class TrustTrackApp {
         // Use GeoJSON data for realistic routes
         if (data.geojson && data.geojson.features) {
             data.geojson.features.forEach(feature => {
-                if (feature.geometry.type === 'LineString') {
-                    const coords = feature.geometry.coordinates.map(coord => [coord[1], coord[0]]);
+                const geometryType = feature.geometry.type;
+                if (geometryType === 'LineString' || geometryType === 'EncodedPolyline') {
+                    const coords = geometryType === 'EncodedPolyline'
+                        ? this.decodePolyline(feature.geometry.polyline, feature.geometry.precision)
+                        : feature.geometry.coordinates.map(coord => [coord[1], coord[0]]);
                     const properties = feature.properties;
                     
                     let color = '#3b82f6'; // default blue
@@ -377,6 +382,29 @@ class TrustTrackApp {
         }
     }
 
+    decodePolyline(encoded, precision = 6) {
+        // Google encoded polyline -> [[lat, lon], ...] (compact route format)
+        const factor = Math.pow(10, precision);
+        const coords = [];
+        let index = 0, lat = 0, lon = 0;
+        while (index < encoded.length) {
+            const deltas = [];
+            for (let i = 0; i < 2; i++) {
+                let shift = 0, result = 0, b;
+                do {
+                    b = encoded.charCodeAt(index++) - 63;
+                    result |= (b & 0x1f) << shift;
+                    shift += 5;
+                } while (b >= 0x20);
+                deltas.push((result & 1) ? ~(result >> 1) : (result >> 1));
+            }
+            lat += deltas[0];
+            lon += deltas[1];
+            coords.push([lat / factor, lon / factor]);
+        }
+        return coords;
+    }
+
     updateRouteCards(data) {
         // Update recommended route (bus if available, otherwise safe walk)
         const recommendedCard = document.getElementById('recommendedRoute');
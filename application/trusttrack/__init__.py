@@ -0,0 +1,4 @@
+"""
+Trust Track routing core.
+Graph construction, safety weighting and multi-modal route evaluation shared by the web apps.
+"""
@@ -0,0 +1,35 @@
+"""
+Trust Track - versioned API
+Sub-application mounted by app.py under /api/v1.
+"""
+
+from typing import Dict, Any
+
+from fastapi import FastAPI
+
+from . import routing
+
+app = FastAPI(
+    title="Trust Track API",
+    description="Versioned routing API for Trust Track",
+    version="1.0.0"
+)
+
+
+@app.get("/health")
+async def health() -> Dict[str, Any]:
+    """Health check for the versioned API."""
+    return {"status": "healthy"}
+
+
+@app.get("/config")
+async def config() -> Dict[str, Any]:
+    """Routing model parameters in effect."""
+    return {
+        "k_near_stops": routing.K_NEAR_STOPS,
+        "pr_top_n": routing.PR_TOP_N,
+        "pr_limit_km_to_school": routing.PR_LIMIT_KM_TO_SCHOOL,
+        "bus_speed_kmh": routing.BUS_SPEED_KMH_DEFAULT,
+        "bus_base_safety": routing.BUS_BASE_SAFETY_DEFAULT,
+        "max_walk_to_board_min": routing.MAX_WALK_TO_BOARD_MIN,
+    }
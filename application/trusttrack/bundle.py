@@ -0,0 +1,358 @@
+"""
+Trust Track - versioned data bundles
+Everything a request reads apart from the per-request OSM walk graph is held in one immutable
+snapshot. That covers the bus stop store, the park-and-ride sites and parking index, the
+journeys series behind crowding, a school gazetteer, the drive graph with its P&R drive-time
+table and the walk landmarks. Bundles are built offline into <dir>/<version>/ and activated by atomically
+rewriting <dir>/CURRENT. A running server loads the new snapshot off the event loop and swaps a
+single reference. Requests that already hold the old snapshot finish on it, and components
+whose files did not change are carried over rather than reloaded.
+
+    python -m trusttrack.bundle build --activate       # from data/ and the cached territory graphs
+    python -m trusttrack.bundle list
+    python -m trusttrack.bundle activate 3f9c2a81d0e4
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import osmnx as ox
+import pandas as pd
+from fastapi.concurrency import run_in_threadpool
+
+from .drive import DRIVE_GRAPH_FILE, DriveTimeTable, load_drive_graph
+from .landmarks import LANDMARKS_FILE, Landmarks, set_landmarks
+from .metrics import DATA_RELOADS, DATA_RELOAD_SECONDS
+from .parking import OSM_PARKING_FILE, ParkingIndex, load_osm_parking, load_smart_parking
+from .utils import (
+    data_version, find_data, geocode_in_act, parse_paren_latlon, parse_wkt_point_lonlat_to_latlon, slugify
+)
+
+BUNDLE_DIR = os.environ.get("TRUSTTRACK_BUNDLE_DIR", "./.trusttrack_bundles")
+POLL_SECONDS = float(os.environ.get("TRUSTTRACK_BUNDLE_POLL_S", "30"))  # 0 disables watching CURRENT
+
+DATA_FILES = {
+    "school_bus": "ACT_School_Bus_Services.csv",
+    "park_ride": "Park_And_Ride_Locations.csv",
+    "journeys": "Daily_Public_Transport_Passenger_Journeys_by_Service_Type_20250830.csv",
+    "smart_parking": "Smart_Parking_Lots_20250831.csv",
+}
+# Derived components, optional in a bundle; the CSVs above are not
+GAZETTEER_FILE = "gazetteer.json"
+DRIVE_FILE = "act_drive.graphml"
+DRIVE_MINUTES_FILE = "drive_minutes.npy"
+LANDMARKS_NAME = "act_walk_landmarks.npz"
+OSM_PARKING_NAME = "act_osm_parking.csv"
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_bus_stops(path: str) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    assert "Location" in df.columns, "School Bus CSV must have 'Location' (WKT POINT)"
+    df["lat"], df["lon"] = zip(*df["Location"].map(parse_wkt_point_lonlat_to_latlon))
+    return df.dropna(subset=["lat", "lon"]).copy()
+
+
+def load_park_ride(path: str) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    assert "Point" in df.columns, "Park & Ride CSV must have 'Point' like '(-35.2, 149.1)'"
+    df["lat"], df["lon"] = zip(*df["Point"].map(parse_paren_latlon))
+    return df.dropna(subset=["lat", "lon"]).copy()
+
+
+class DataBundle:
+    """
+    One immutable data snapshot. Nothing mutates it after loading: a reload builds a new
+    DataBundle and shares the unchanged components of this one.
+    """
+
+    def __init__(self, version: str, source: str, hashes: Dict[str, str], bus_df: pd.DataFrame,
+                 pr_df: pd.DataFrame, dj_df: pd.DataFrame, gazetteer: Dict[str, Dict[str, Any]],
+                 drive_table: Optional[DriveTimeTable], landmarks: Optional[Landmarks],
+                 parking: ParkingIndex):
+        self.version, self.source, self.hashes = version, source, hashes
+        self.bus_df, self.pr_df, self.dj_df = bus_df, pr_df, dj_df
+        self.gazetteer = gazetteer
+        self.drive_table, self.landmarks = drive_table, landmarks
+        self.parking = parking
+        self.loaded_at = time.time()
+
+    def school_ll(self, name: str) -> Optional[tuple]:
+        hit = self.gazetteer.get(slugify(name))
+        return (hit["lat"], hit["lon"]) if hit else None
+
+    def describe(self) -> Dict[str, Any]:
+        return {"version": self.version, "source": self.source,
+                "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.loaded_at)),
+                "components": sorted(self.hashes)}
+
+
+def _assemble(version: str, source: str, paths: Dict[str, str], hashes: Dict[str, str],
+              previous: Optional[DataBundle]) -> DataBundle:
+    """
+    Load the components named in paths, reusing previous's objects for any whose file hash is
+    unchanged. The drive table depends on the drive graph, its saved minutes and the P&R sites;
+    the parking index on the P&R sites, the smart-parking lots and the OSM extract if present.
+    """
+    same = lambda *cs: previous is not None and all(c in hashes and previous.hashes.get(c) == hashes[c] for c in cs)
+
+    bus_df = previous.bus_df if same("school_bus") else load_bus_stops(paths["school_bus"])
+    pr_df = previous.pr_df if same("park_ride") else load_park_ride(paths["park_ride"])
+    dj_df = previous.dj_df if same("journeys") else pd.read_csv(paths["journeys"])
+
+    gazetteer: Dict[str, Dict[str, Any]] = {}
+    if same("gazetteer"):
+        gazetteer = previous.gazetteer
+    elif "gazetteer" in paths:
+        gazetteer = json.loads(Path(paths["gazetteer"]).read_text(encoding="utf-8"))
+
+    drive_keys = ("drive_graph", "drive_minutes", "park_ride")
+    drive_table = None
+    if same(*drive_keys) or (same("drive_graph", "park_ride") and "drive_minutes" not in paths):
+        drive_table = previous.drive_table
+    elif "drive_graph" in paths:
+        try:
+            minutes = np.load(paths["drive_minutes"]) if "drive_minutes" in paths else None
+            drive_table = DriveTimeTable(ox.load_graphml(paths["drive_graph"]), pr_df, minutes)
+        except Exception as e:
+            print(f"Error loading drive graph: {e}")
+
+    landmarks = None
+    if same("landmarks"):
+        landmarks = previous.landmarks
+    elif "landmarks" in paths:
+        try:
+            landmarks = Landmarks.load(paths["landmarks"])
+        except Exception as e:
+            print(f"Error loading landmarks: {e}")
+
+    parking_keys = [c for c in ("park_ride", "smart_parking", "osm_parking") if c in paths]
+    if same(*parking_keys) and ("osm_parking" in paths) == ("osm_parking" in previous.hashes):
+        parking = previous.parking
+    else:
+        osm = None
+        if "osm_parking" in paths:
+            try:
+                osm = load_osm_parking(paths["osm_parking"])
+            except Exception as e:
+                print(f"Error loading OSM parking extract: {e}")
+        parking = ParkingIndex.from_sources(pr_df, load_smart_parking(paths["smart_parking"]), osm)
+
+    return DataBundle(version, source, hashes, bus_df, pr_df, dj_df, gazetteer, drive_table, landmarks, parking)
+
+
+def load_bundle(path: str, previous: Optional[DataBundle] = None) -> DataBundle:
+    manifest = json.loads((Path(path) / MANIFEST).read_text(encoding="utf-8"))
+    paths = {c: str(Path(path) / f) for c, f in manifest["files"].items()}
+    return _assemble(manifest["version"], f"bundle:{path}", paths, manifest["sha1"], previous)
+
+
+def load_from_data(previous: Optional[DataBundle] = None) -> DataBundle:
+    """
+    Snapshot straight from the data/ CSVs and the cached territory graphs, used when no bundle
+    is active. The drive graph is built and saved on first use, as before bundles existed.
+    """
+    paths = {c: find_data(f) for c, f in DATA_FILES.items()}
+    try:
+        if not os.path.exists(DRIVE_GRAPH_FILE):
+            load_drive_graph()  # builds and saves it
+        paths["drive_graph"] = DRIVE_GRAPH_FILE
+    except Exception as e:
+        print(f"Error loading drive graph: {e}")
+    if os.path.exists(LANDMARKS_FILE):
+        paths["landmarks"] = LANDMARKS_FILE
+    if os.path.exists(OSM_PARKING_FILE):
+        paths["osm_parking"] = OSM_PARKING_FILE
+    hashes = {c: file_hash(p) for c, p in paths.items()}
+    # every component counts, so a rebuilt drive graph or parking extract is a new version
+    version = hashlib.sha1(json.dumps([data_version(()), hashes], sort_keys=True).encode()).hexdigest()[:12]
+    return _assemble(version, "data", paths, hashes, previous)
+
+
+# Building and activating bundles
+
+def build_bundle(out_dir: str = BUNDLE_DIR, schools: Iterable[str] = ()) -> str:
+    """
+    Write a complete bundle under out_dir/<version>/ and return its version. The bundle is
+    staged in a temporary directory and renamed into place, so a partly written bundle is never
+    visible. Building does not activate it.
+    """
+    root = Path(out_dir)
+    stage = root / f".build-{os.getpid()}"
+    shutil.rmtree(stage, ignore_errors=True)
+    stage.mkdir(parents=True)
+    files: Dict[str, str] = {}
+    for c, f in DATA_FILES.items():
+        shutil.copyfile(find_data(f), stage / f)
+        files[c] = f
+
+    gazetteer = {}
+    for name in schools:
+        try:
+            lat, lon = geocode_in_act(name)
+            gazetteer[slugify(name)] = {"name": name, "lat": lat, "lon": lon}
+        except Exception as e:
+            print(f"  not geocoded: {name}: {e}")
+    (stage / GAZETTEER_FILE).write_text(json.dumps(gazetteer, indent=1, sort_keys=True), encoding="utf-8")
+    files["gazetteer"] = GAZETTEER_FILE
+
+    try:
+        Gc = load_drive_graph()
+        shutil.copyfile(DRIVE_GRAPH_FILE, stage / DRIVE_FILE)
+        table = DriveTimeTable(Gc, load_park_ride(str(stage / DATA_FILES["park_ride"])))
+        np.save(stage / DRIVE_MINUTES_FILE, table.minutes)
+        files.update(drive_graph=DRIVE_FILE, drive_minutes=DRIVE_MINUTES_FILE)
+    except Exception as e:
+        print(f"  bundle has no drive graph: {e}")
+    if os.path.exists(LANDMARKS_FILE):
+        shutil.copyfile(LANDMARKS_FILE, stage / LANDMARKS_NAME)
+        files["landmarks"] = LANDMARKS_NAME
+    if os.path.exists(OSM_PARKING_FILE):
+        shutil.copyfile(OSM_PARKING_FILE, stage / OSM_PARKING_NAME)
+        files["osm_parking"] = OSM_PARKING_NAME
+    else:
+        print("  bundle has no OSM parking extract (python -m trusttrack.parking extract)")
+
+    version = data_version(str(stage / f) for f in files.values())
+    manifest = {"version": version, "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "files": files, "sha1": {c: file_hash(str(stage / f)) for c, f in files.items()}}
+    (stage / MANIFEST).write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    if (root / version).exists():
+        shutil.rmtree(stage)  # identical bundle already built
+    else:
+        os.replace(stage, root / version)
+    return version
+
+
+def activate(version: str, out_dir: str = BUNDLE_DIR) -> None:
+    """Point CURRENT at a built bundle; a single rename, so readers see the old or new name."""
+    root = Path(out_dir)
+    if not (root / version / MANIFEST).exists():
+        raise FileNotFoundError(f"No bundle {version} in {out_dir}")
+    tmp = root / f"{CURRENT}.{os.getpid()}.tmp"
+    tmp.write_text(version + "\n", encoding="utf-8")
+    os.replace(tmp, root / CURRENT)
+
+
+def current_version(out_dir: str = BUNDLE_DIR) -> Optional[str]:
+    try:
+        return (Path(out_dir) / CURRENT).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def list_bundles(out_dir: str = BUNDLE_DIR) -> List[Dict[str, Any]]:
+    out = []
+    for m in sorted(Path(out_dir).glob(f"*/{MANIFEST}")):
+        meta = json.loads(m.read_text(encoding="utf-8"))
+        out.append({"version": meta["version"], "built_at": meta["built_at"], "components": sorted(meta["files"])})
+    return sorted(out, key=lambda b: b["built_at"])
+
+
+# The live snapshot
+
+class BundleStore:
+    """
+    Holds the active DataBundle. Readers take current() once per request and keep that object;
+    load() builds the next snapshot without blocking them and publishes it with one assignment.
+    Loads are serialised so two reloads never race.
+    """
+
+    def __init__(self, root: str = BUNDLE_DIR):
+        self.root = root
+        self._snapshot: Optional[DataBundle] = None
+        self._lock = threading.Lock()
+        self.last_error: Optional[str] = None
+
+    def current(self) -> Optional[DataBundle]:
+        return self._snapshot
+
+    def load(self, force: bool = False) -> DataBundle:
+        """Load the bundle CURRENT names (or data/ when none is active) unless it is already live."""
+        with self._lock:
+            prev = self._snapshot
+            version = current_version(self.root)
+            if prev is not None and not force and version is not None and version == prev.version:
+                DATA_RELOADS.inc(result="unchanged")
+                return prev
+            t0 = time.perf_counter()
+            try:
+                nxt = load_bundle(str(Path(self.root) / version), prev) if version else load_from_data(prev)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                DATA_RELOADS.inc(result="error")
+                raise
+            DATA_RELOAD_SECONDS.observe(time.perf_counter() - t0)
+            DATA_RELOADS.inc(result="loaded")
+            self.last_error = None
+            self._snapshot = nxt
+            set_landmarks(nxt.landmarks)
+            return nxt
+
+    async def reload(self, force: bool = False) -> DataBundle:
+        return await run_in_threadpool(self.load, force)
+
+    async def watch(self, interval: float = POLL_SECONDS) -> None:
+        """Pick up a newly activated bundle within interval seconds, so every worker converges."""
+        while True:
+            await asyncio.sleep(interval)
+            version = current_version(self.root)
+            live = self._snapshot.version if self._snapshot is not None else None
+            if version is not None and version != live:
+                try:
+                    await self.reload()
+                    print(f"Data bundle {version} loaded")
+                except Exception as e:
+                    print(f"Error loading data bundle {version}: {e}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=("build", "activate", "list", "current"))
+    ap.add_argument("version", nargs="?")
+    ap.add_argument("--dir", default=BUNDLE_DIR)
+    ap.add_argument("--schools", nargs="*", help="gazetteer schools (default: all schools in the census CSV)")
+    ap.add_argument("--activate", action="store_true", help="activate the bundle after building it")
+    args = ap.parse_args()
+
+    if args.command == "build":
+        if args.schools is None:
+            from .catchment import census_schools
+            args.schools = census_schools()
+        version = build_bundle(args.dir, args.schools)
+        if args.activate:
+            activate(version, args.dir)
+        print(f"bundle {version} -> {Path(args.dir) / version}" + (" (active)" if args.activate else ""))
+    elif args.command == "activate":
+        if not args.version:
+            ap.error("activate needs a version")
+        activate(args.version, args.dir)
+        print(f"active: {args.version}")
+    elif args.command == "list":
+        live = current_version(args.dir)
+        for b in list_bundles(args.dir):
+            print(f"{'*' if b['version'] == live else ' '} {b['version']}  {b['built_at']}  {', '.join(b['components'])}")
+    else:
+        print(current_version(args.dir) or "none (serving data/)")
+
+
+if __name__ == "__main__":
+    main()
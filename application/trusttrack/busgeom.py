@@ -0,0 +1,94 @@
+"""
+Trust Track - bus route geometry
+Bus route polylines (WKT in lon/lat, as in Bus_Routes.csv) are parsed and projected to metres
+once. After that, snapping an origin and destination onto every route, and sampling the ridden
+segment for the map, are each a few shapely 2 array calls with no per-route or per-sample Python
+loop. Coordinates are projected in whole arrays through Transformers that are built once per
+process.
+"""
+
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+METRIC_CRS = "EPSG:3857"          # the notebook's metric CRS, kept so thresholds mean the same
+BUS_POLYLINE_SAMPLES = 80
+SNAP_THRESHOLDS_M = (600, 1000)   # widen the snap radius until some route passes both ends
+
+
+@lru_cache(maxsize=None)
+def transformer(src: str, dst: str) -> Transformer:
+    """Transformers are expensive to build and thread-safe to share."""
+    return Transformer.from_crs(src, dst, always_xy=True)
+
+
+def lonlat_to_metres(lon, lat) -> Tuple[np.ndarray, np.ndarray]:
+    return transformer("EPSG:4326", METRIC_CRS).transform(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+
+
+def metres_to_latlon(xy: np.ndarray) -> np.ndarray:
+    """(N, 2) metric x/y -> (N, 2) [lat, lon]."""
+    lon, lat = transformer(METRIC_CRS, "EPSG:4326").transform(xy[:, 0], xy[:, 1])
+    return np.column_stack([lat, lon])
+
+
+class BusRouteGeometry:
+    """Every route's line in metres as one shapely array, with its CSV row kept alongside."""
+
+    def __init__(self, routes_df: pd.DataFrame):
+        assert "the_geom" in routes_df.columns, "CSV must contain 'the_geom' WKT geometry column."
+        geoms = shapely.from_wkt(routes_df["the_geom"].astype(str).to_numpy(), on_invalid="ignore")
+        ok = ~(shapely.is_missing(geoms) | shapely.is_empty(geoms))
+        self.rows = routes_df[ok].reset_index(drop=True)
+        to_m = transformer("EPSG:4326", METRIC_CRS)
+        self.lines = shapely.transform(geoms[ok], lambda c: np.column_stack(to_m.transform(c[:, 0], c[:, 1])))
+        shapely.prepare(self.lines)
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def snap(self, origin_ll: Tuple[float, float], dest_ll: Tuple[float, float],
+             within_m: float = np.inf) -> pd.DataFrame:
+        """
+        For every route passing within within_m of both points: distance from origin and
+        destination to the line (m), their positions along it, and the boarding and alighting
+        points on the line ([lat, lon]). Indexed by route position in self.rows.
+        """
+        x, y = lonlat_to_metres([origin_ll[1], dest_ll[1]], [origin_ll[0], dest_ll[0]])
+        o, d = shapely.points(np.column_stack([x, y]))
+        d_o, d_d = shapely.distance(self.lines, o), shapely.distance(self.lines, d)
+        idx = np.flatnonzero((d_o <= within_m) & (d_d <= within_m))
+        lines = self.lines[idx]
+        with np.errstate(invalid="ignore"):  # GEOS can leave a stray FP flag; results are finite
+            s_o = shapely.line_locate_point(lines, o)
+            s_d = shapely.line_locate_point(lines, d)
+        ends = shapely.line_interpolate_point(np.concatenate([lines, lines]), np.concatenate([s_o, s_d]))
+        ll = metres_to_latlon(shapely.get_coordinates(ends).reshape(-1, 2))
+        n = len(idx)
+        return pd.DataFrame({
+            "d_o_m": d_o[idx], "d_d_m": d_d[idx], "s_o_m": s_o, "s_d_m": s_d, "bus_m": np.abs(s_d - s_o),
+            "o_lat": ll[:n, 0], "o_lon": ll[:n, 1], "d_lat": ll[n:, 0], "d_lon": ll[n:, 1],
+        }, index=idx)
+
+    def candidates(self, origin_ll: Tuple[float, float], dest_ll: Tuple[float, float],
+                   thresholds_m: Sequence[float] = SNAP_THRESHOLDS_M) -> Tuple[pd.DataFrame, Optional[float]]:
+        """Snapped routes passing within the smallest threshold that admits any, and that threshold."""
+        snapped = self.snap(origin_ll, dest_ll, max(thresholds_m))  # only these get located
+        for thr in thresholds_m:
+            near = (snapped["d_o_m"] <= thr) & (snapped["d_d_m"] <= thr)
+            if near.any():
+                return snapped[near], thr
+        return snapped.iloc[:0], None
+
+    def segment_coords(self, i: int, origin_ll: Tuple[float, float], dest_ll: Tuple[float, float],
+                       samples: int = BUS_POLYLINE_SAMPLES) -> np.ndarray:
+        """(samples, 2) [lat, lon] along route i between the points nearest origin and destination."""
+        x, y = lonlat_to_metres([origin_ll[1], dest_ll[1]], [origin_ll[0], dest_ll[0]])
+        with np.errstate(invalid="ignore"):
+            s = shapely.line_locate_point(self.lines[i], shapely.points(np.column_stack([x, y])))
+        ts = np.linspace(s.min(), s.max(), samples)
+        return metres_to_latlon(shapely.get_coordinates(shapely.line_interpolate_point(self.lines[i], ts)))
@@ -0,0 +1,349 @@
+"""
+Trust Track - Overpass/Nominatim response cache
+Compressed, content-addressed store behind OSMnx's HTTP cache hooks. Responses are keyed by a
+normalized request URL, deduplicated by the SHA-256 of their JSON, gzip-compressed on disk and
+evicted least-recently-used under a byte budget. A single index.json gives O(1) lookup.
+
+    python -m trusttrack.cache stats
+    python -m trusttrack.cache import ../notebooks/cache ./.osmnx_cache   # adopt raw OSMnx files
+    python -m trusttrack.cache verify --repair
+"""
+
+import argparse
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .metrics import record_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CACHE_DIR = os.environ.get("TRUSTTRACK_CACHE_DIR", "./.trusttrack_cache")
+CACHE_BUDGET_BYTES = int(float(os.environ.get("TRUSTTRACK_CACHE_BUDGET_MB", "512")) * 1024 * 1024)
+CACHE_ONLY = os.environ.get("TRUSTTRACK_CACHE_ONLY", "").lower() in ("1", "true", "yes")
+OSMNX_HOOKS = ("_retrieve_from_cache", "_save_to_cache", "_config_dns")  # osmnx._downloader, 1.9.x
+COMPRESS_LEVEL = 6
+INDEX_FLUSH_EVERY = 32  # reads or puts between index writes; recency is only advisory between flushes
+INDEX_FLUSH_S = 30.0    # and at most this long; a put lost in a crash costs one download again
+
+LEGACY_PREFIX = "url-sha1:"  # entries adopted from raw OSMnx files, keyed by sha1(raw url)
+
+
+class CacheMiss(LookupError):
+    """Raised in cache-only mode when a request is not cached; nothing goes to the network."""
+
+
+def _json_loads(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _json_dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj) if orjson is not None else json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def normalize_url(url: str) -> str:
+    """Scheme/host lower-cased, query parameters sorted, whitespace in values collapsed."""
+    parts = urlsplit(url)
+    params = sorted((k, " ".join(v.split())) for k, v in parse_qsl(parts.query, keep_blank_values=True))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), urlencode(params), ""))
+
+
+def request_key(url: str) -> str:
+    return hashlib.sha1(normalize_url(url).encode("utf-8")).hexdigest()
+
+
+def legacy_key(url: str) -> str:
+    """The key OSMnx itself would have used (sha1 of the raw prepared URL)."""
+    return LEGACY_PREFIX + hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    index.json maps request key -> {"blob", "bytes", "raw_bytes", "url", "created", "used"};
+    blobs live in objects/<sha[:2]>/<sha>.json.gz and may be shared by several keys.
+    """
+
+    def __init__(self, root: str = CACHE_DIR, budget_bytes: int = CACHE_BUDGET_BYTES):
+        self.root = Path(root)
+        self.budget_bytes = budget_bytes
+        self._lock = threading.RLock()
+        self._index: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._refs: Dict[str, int] = {}  # blob digest -> number of keys pointing at it
+        self._disk_bytes = 0
+        self._unflushed = 0  # reads and puts not yet in index.json
+        self._flushed_at = time.monotonic()
+        self._load_index()
+
+    # Index
+
+    @property
+    def index_path(self) -> Path:
+        return self.root / "index.json"
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / f"{digest}.json.gz"
+
+    def _load_index(self) -> None:
+        try:
+            entries = json.loads(self.index_path.read_text(encoding="utf-8"))["entries"]
+        except (FileNotFoundError, ValueError, KeyError):
+            entries = {}
+        for key, e in sorted(entries.items(), key=lambda kv: kv[1].get("used", 0)):
+            self._link(key, e)
+
+    def flush(self) -> None:
+        """Write the index atomically (tmp file + rename)."""
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = self.index_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"version": 1, "entries": self._index}), encoding="utf-8")
+            os.replace(tmp, self.index_path)
+            self._unflushed, self._flushed_at = 0, time.monotonic()
+
+    def _touched(self) -> None:
+        """Count one index change; write the index every INDEX_FLUSH_EVERY changes or INDEX_FLUSH_S."""
+        self._unflushed += 1
+        if self._unflushed >= INDEX_FLUSH_EVERY or time.monotonic() - self._flushed_at >= INDEX_FLUSH_S:
+            self.flush()
+
+    def _link(self, key: str, e: Dict[str, Any]) -> None:
+        self._index[key] = e
+        self._refs[e["blob"]] = self._refs.get(e["blob"], 0) + 1
+        if self._refs[e["blob"]] == 1:
+            self._disk_bytes += e["bytes"]
+
+    def _unref(self, e: Dict[str, Any]) -> None:
+        self._refs[e["blob"]] -= 1
+        if self._refs[e["blob"]] == 0:
+            del self._refs[e["blob"]]
+            self._disk_bytes -= e["bytes"]
+            self._blob_path(e["blob"]).unlink(missing_ok=True)
+
+    def _drop(self, key: str) -> None:
+        e = self._index.pop(key, None)
+        if e is not None:
+            self._unref(e)
+
+    # Get / put
+
+    def _read(self, key: str) -> Optional[Any]:
+        e = self._index.get(key)
+        if e is None:
+            return None
+        try:
+            raw = gzip.decompress(self._blob_path(e["blob"]).read_bytes())
+        except (OSError, EOFError):
+            self._drop(key)
+            return None
+        if hashlib.sha256(raw).hexdigest() != e["blob"]:  # corrupt or tampered blob
+            self._drop(key)
+            return None
+        e["used"] = time.time()
+        self._index.move_to_end(key)
+        self._touched()
+        return _json_loads(raw)
+
+    def get(self, url: str) -> Optional[Any]:
+        """Cached JSON for this request URL, or None."""
+        with self._lock:
+            key = request_key(url)
+            data = self._read(key)
+            if data is None:
+                old = legacy_key(url)
+                data = self._read(old)
+                if data is not None:  # re-key an adopted OSMnx file under its normalized key
+                    self._index[key] = self._index.pop(old)
+                    self._index[key]["url"] = url
+                    self._touched()
+            return data
+
+    def put(self, url: str, response_json: Any, key: Optional[str] = None) -> str:
+        """Store a response; returns its content digest. The blob is on disk when this returns."""
+        with self._lock:
+            digest = self._put(url, response_json, key)
+            self._touched()
+        return digest
+
+    def _put(self, url: str, response_json: Any, key: Optional[str]) -> str:
+        raw = _json_dumps(response_json)
+        digest = hashlib.sha256(raw).hexdigest()
+        with self._lock:
+            blob = self._blob_path(digest)
+            if not blob.exists():
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                tmp = blob.with_suffix(".tmp")
+                tmp.write_bytes(gzip.compress(raw, COMPRESS_LEVEL, mtime=0))
+                os.replace(tmp, blob)
+            now = time.time()
+            key = key or request_key(url)
+            entry = {"blob": digest, "bytes": blob.stat().st_size, "raw_bytes": len(raw),
+                     "url": url, "created": now, "used": now}
+            prev = self._index.pop(key, None)
+            self._link(key, entry)  # link before unref so re-storing identical content keeps the blob
+            if prev is not None:
+                self._unref(prev)
+            self.evict()
+        return digest
+
+    # Budget, integrity, stats
+
+    def disk_bytes(self) -> int:
+        return self._disk_bytes
+
+    def evict(self, budget_bytes: Optional[int] = None) -> List[str]:
+        """Drop least-recently-used entries until the stored blobs fit the budget."""
+        budget = self.budget_bytes if budget_bytes is None else budget_bytes
+        evicted = []
+        with self._lock:
+            while self._index and self.disk_bytes() > budget:
+                key = next(iter(self._index))
+                self._drop(key)
+                evicted.append(key)
+        return evicted
+
+    def verify(self, repair: bool = False) -> List[str]:
+        """Keys whose blob is missing, unreadable or does not hash to its address; drop them if repair."""
+        bad = []
+        with self._lock:
+            for key, e in list(self._index.items()):
+                try:
+                    ok = hashlib.sha256(gzip.decompress(self._blob_path(e["blob"]).read_bytes())).hexdigest() == e["blob"]
+                except (OSError, EOFError):
+                    ok = False
+                if not ok:
+                    bad.append(key)
+            if repair and bad:
+                for key in bad:
+                    self._drop(key)
+                self.flush()
+        return bad
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            blobs = {e["blob"]: e for e in self._index.values()}
+            return {"entries": len(self._index), "blobs": len(blobs), "disk_bytes": self._disk_bytes,
+                    "raw_bytes": sum(e["raw_bytes"] for e in blobs.values()),
+                    "budget_bytes": self.budget_bytes}
+
+    def import_osmnx_files(self, folder: str, remove: bool = False) -> int:
+        """Adopt raw OSMnx cache files (<sha1(url)>.json); they are re-keyed on first lookup."""
+        adopted = []
+        with self._lock:
+            for path in sorted(Path(folder).glob("*.json")):
+                try:
+                    data = _json_loads(path.read_bytes())
+                except ValueError:
+                    continue
+                self._put("", data, LEGACY_PREFIX + path.stem)
+                adopted.append(path)
+            self.flush()  # once, and before any raw file goes
+        if remove:
+            for path in adopted:
+                path.unlink()
+        return len(adopted)
+
+
+# OSMnx integration
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+        atexit.register(lambda: _cache._unflushed and _cache.flush())  # persist recent reads and puts
+    return _cache
+
+
+def install_osmnx_cache(cache_only: bool = CACHE_ONLY) -> ResponseCache:
+    """
+    Route OSMnx's Overpass/Nominatim cache hooks through the ResponseCache. Raw files left in
+    ox.settings.cache_folder are adopted on first lookup. With cache_only, a miss raises
+    CacheMiss instead of downloading, and no DNS lookups are made.
+
+    The hooks are private to OSMnx 1.9.x (requirements pin osmnx>=1.9,<2). On any other OSMnx
+    the stock file cache is left in place with a warning, or, with cache_only, a RuntimeError
+    is raised, since the offline guarantee cannot be kept.
+    """
+    import osmnx as ox
+
+    cache = get_cache()
+    try:
+        from osmnx import _downloader
+        hooks = all(hasattr(_downloader, h) for h in OSMNX_HOOKS)
+    except ImportError:
+        hooks = False
+    if not hooks:
+        msg = f"OSMnx {ox.__version__} lacks the osmnx._downloader cache hooks of 1.9.x; install osmnx>=1.9,<2"
+        if cache_only:
+            raise RuntimeError(msg + " (TRUSTTRACK_CACHE_ONLY needs them)")
+        print(f"Warning: {msg}. Using OSMnx's own cache.")
+        return cache
+
+    def retrieve(url, check_remark=True):
+        if not ox.settings.use_cache:
+            data = None
+        else:
+            data = cache.get(url)
+            if data is None:
+                legacy = Path(ox.settings.cache_folder) / (legacy_key(url)[len(LEGACY_PREFIX):] + ".json")
+                if legacy.is_file():
+                    data = _json_loads(legacy.read_bytes())
+                    cache.put(url, data)
+            if data is not None and check_remark and isinstance(data, dict) and "remark" in data:
+                data = None
+        record_cache("osm_http", data is not None)
+        if data is None and cache_only:
+            raise CacheMiss(f"Not in the offline cache: {url}")
+        return data
+
+    def save(url, response_json, ok):
+        if ox.settings.use_cache and ok and response_json is not None:
+            cache.put(url, response_json)
+
+    _downloader._retrieve_from_cache = retrieve
+    _downloader._save_to_cache = save
+    if cache_only:
+        _downloader._config_dns = lambda url: None
+    return cache
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=("stats", "import", "verify", "evict"))
+    ap.add_argument("folders", nargs="*", help="raw OSMnx cache folders to import")
+    ap.add_argument("--remove", action="store_true", help="delete raw files once imported")
+    ap.add_argument("--repair", action="store_true", help="drop entries that fail verification")
+    ap.add_argument("--budget-mb", type=float, help="evict down to this size")
+    args = ap.parse_args()
+
+    cache = get_cache()
+    if args.command == "import":
+        for folder in args.folders:
+            print(f"{folder}: {cache.import_osmnx_files(folder, remove=args.remove)} responses")
+    elif args.command == "verify":
+        bad = cache.verify(repair=args.repair)
+        print(f"{len(bad)} bad entries" + (" (dropped)" if args.repair and bad else ""))
+        for key in bad:
+            print(f"  {key}")
+    elif args.command == "evict":
+        budget = int(args.budget_mb * 1024 * 1024) if args.budget_mb is not None else None
+        print(f"evicted {len(cache.evict(budget))} entries")
+        cache.flush()
+    print(json.dumps(cache.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Trust Track - school catchment safety rasters
+Batch job: for every school, a grid of cells (100 m by default) around it holding the fastest
+walk time, the safest walk time and the risk-minutes of that safest walk to the gate. Each
+school costs one bounded reverse search per objective, not one route query per cell. Rasters
+are float16 .npy files the API memory-maps and serves as a point grid.
+
+    python -m trusttrack.catchment --workers 4                 # every school in the census CSV
+    python -m trusttrack.catchment --schools "Ainslie School" "Lyneham High School" --cell-m 50
+"""
+
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+import osmnx as ox
+import pandas as pd
+
+from .routing import reverse_search_to
+from .utils import WALK_SPEED, build_graph_bbox, data_version, find_data, geocode_in_act, slugify
+
+CATCHMENT_DIR = os.environ.get("TRUSTTRACK_CATCHMENT_DIR", "./.trusttrack_catchments")
+CENSUS_CSV = "Census_Data_for_all_ACT_Schools_20250830.csv"
+CELL_M = 100.0
+RADIUS_KM = 2.0
+DETOUR_FACTOR = 1.5     # street routes run this much longer than the crow flies
+WALK_IN_RISK = 0.5      # walk-in risk at a node without edges; the model's unknown road class
+RASTER_FORMAT = 2       # 2: risk_min includes the walk in from the cell centre
+LAYERS = ("fast_min", "safe_min", "risk_min")
+
+
+def model_version() -> str:
+    """Rasters depend only on OSM (cached), the safety model and the raster format, not on the CSVs."""
+    return f"{data_version(())}.{RASTER_FORMAT}"
+
+
+def cell_grid(center_ll: Tuple[float, float], radius_km: float, cell_m: float) -> Dict[str, Any]:
+    """Square grid of cell_m cells covering radius_km around the centre; row 0 is the north edge."""
+    dlat = cell_m / 111320.0
+    dlon = cell_m / (111320.0 * math.cos(math.radians(center_ll[0])))
+    n = 2 * int(math.ceil(radius_km * 1000.0 / cell_m))
+    return {"north": center_ll[0] + n / 2 * dlat, "west": center_ll[1] - n / 2 * dlon,
+            "dlat": dlat, "dlon": dlon, "rows": n, "cols": n, "cell_m": cell_m}
+
+
+def cell_centres(grid: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    r, c = np.mgrid[0:grid["rows"], 0:grid["cols"]]
+    return grid["north"] - (r + 0.5) * grid["dlat"], grid["west"] + (c + 0.5) * grid["dlon"]
+
+
+def school_catchment(G: nx.MultiDiGraph, school_ll: Tuple[float, float], radius_km: float = RADIUS_KM,
+                     cell_m: float = CELL_M) -> Tuple[Dict[str, Any], np.ndarray]:
+    """
+    (grid, raster) with raster[LAYERS.index(layer), row, col]. Each cell takes the values of its
+    nearest street node plus the walk from the cell centre to it, which adds risk-minutes at the
+    mean risk of the node's edges; cells with no street node within one cell size, or beyond
+    the search bound, are NaN.
+    """
+    max_min = radius_km * 1000.0 * DETOUR_FACTOR / WALK_SPEED / 60.0
+    target = ox.nearest_nodes(G, X=school_ll[1], Y=school_ll[0])
+    fast = reverse_search_to(G, target, "w_fast", max_min)
+    safe = reverse_search_to(G, target, "w_safe", max_min)
+
+    nodes = list(safe.keys() | fast.keys())
+    node_vals = np.full((len(nodes), 3), np.nan)
+    node_risk = np.full(len(nodes), WALK_IN_RISK)
+    for i, n in enumerate(nodes):
+        risks = [d["risk"] for _, _, d in G.edges(n, data=True)] + [d["risk"] for _, _, d in G.in_edges(n, data=True)]
+        if risks:
+            node_risk[i] = np.mean(risks)
+        if n in fast:
+            node_vals[i, 0] = fast[n][0]
+        if n in safe:
+            node_vals[i, 1], node_vals[i, 2] = safe[n]  # summed w_safe is risk-minutes
+
+    grid = cell_grid(school_ll, radius_km, cell_m)
+    lat, lon = cell_centres(grid)
+    raster = np.full((len(LAYERS), grid["rows"], grid["cols"]), np.nan, dtype=np.float32)
+    if nodes:
+        sub = G.subgraph(nodes)
+        snapped, dist_m = ox.nearest_nodes(sub, X=lon.ravel(), Y=lat.ravel(), return_dist=True)
+        index = {n: i for i, n in enumerate(nodes)}
+        at = [index[n] for n in snapped]
+        vals = node_vals[at]
+        walk_in = np.asarray(dist_m) / WALK_SPEED / 60.0
+        vals[:, 0] += walk_in
+        vals[:, 1] += walk_in
+        vals[:, 2] += walk_in * node_risk[at]
+        vals[np.asarray(dist_m) > cell_m] = np.nan
+        raster[:] = vals.T.reshape(len(LAYERS), grid["rows"], grid["cols"])
+    return grid, raster
+
+
+def save_catchment(out_dir: str, name: str, school_ll: Tuple[float, float], grid: Dict[str, Any],
+                   raster: np.ndarray) -> Path:
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    slug = slugify(name)
+    tmp = out / f"{slug}.npy.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, raster.astype(np.float16))
+    os.replace(tmp, out / f"{slug}.npy")
+    meta = {"school": name, "id": slug, "lat": school_ll[0], "lon": school_ll[1], "grid": grid,
+            "layers": list(LAYERS), "model_version": model_version(),
+            "cells_reached": int(np.isfinite(raster[1]).sum())}
+    tmp = out / f"{slug}.json.tmp"
+    tmp.write_text(json.dumps(meta, indent=1), encoding="utf-8")
+    os.replace(tmp, out / f"{slug}.json")  # last, so a new stamp means both files are in place
+    return out / f"{slug}.npy"
+
+
+def catchment_stamp(out_dir: str, slug: str) -> Optional[int]:
+    """mtime (ns) of a school's metadata, written last by save_catchment; None if there is none."""
+    try:
+        return (Path(out_dir) / f"{slug}.json").stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def load_catchment(out_dir: str, slug: str) -> Optional[Tuple[Dict[str, Any], np.ndarray]]:
+    """(meta, memory-mapped raster) for a school, or None if missing or built for another model."""
+    meta_path = Path(out_dir) / f"{slug}.json"
+    if not meta_path.exists():
+        return None
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    if meta.get("model_version") != model_version():
+        return None
+    return meta, np.load(Path(out_dir) / f"{slug}.npy", mmap_mode="r")
+
+
+def point_grid(meta: Dict[str, Any], raster: np.ndarray, layer: str) -> Dict[str, Any]:
+    """Columnar lat/lon/value arrays of the reached cells of one layer."""
+    band = np.asarray(raster[meta["layers"].index(layer)], dtype=np.float32)
+    rows, cols = np.nonzero(np.isfinite(band))
+    g = meta["grid"]
+    return {"layer": layer, "cell_m": g["cell_m"], "count": int(len(rows)),
+            "lat": np.round(g["north"] - (rows + 0.5) * g["dlat"], 6),
+            "lon": np.round(g["west"] + (cols + 0.5) * g["dlon"], 6),
+            "value": np.round(band[rows, cols], 2)}
+
+
+def _build_one(name: str, out_dir: str, radius_km: float, cell_m: float) -> Tuple[str, int]:
+    school_ll = geocode_in_act(name)
+    G = build_graph_bbox(school_ll, school_ll, buffer_km=radius_km * DETOUR_FACTOR + 0.3)
+    grid, raster = school_catchment(G, school_ll, radius_km, cell_m)
+    save_catchment(out_dir, name, school_ll, grid, raster)
+    return name, int(np.isfinite(raster[1]).sum())
+
+
+def census_schools(path: str = CENSUS_CSV) -> List[str]:
+    return sorted(pd.read_csv(find_data(path))["School Name"].dropna().astype(str).str.strip().unique())
+
+
+def build_catchments(schools: List[str], out_dir: str = CATCHMENT_DIR, radius_km: float = RADIUS_KM,
+                     cell_m: float = CELL_M, workers: int = 1) -> Dict[str, Any]:
+    """Build every school's raster, one process per school; failures are reported, not fatal."""
+    done, failed = {}, {}
+    if workers <= 1:
+        for name in schools:
+            try:
+                done[name] = _build_one(name, out_dir, radius_km, cell_m)[1]
+            except Exception as e:
+                failed[name] = str(e)
+        return {"built": done, "failed": failed}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_build_one, name, out_dir, radius_km, cell_m): name for name in schools}
+        for fut in as_completed(futures):
+            try:
+                done[futures[fut]] = fut.result()[1]
+            except Exception as e:
+                failed[futures[fut]] = str(e)
+    return {"built": done, "failed": failed}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--schools", nargs="*", help="school names (default: all schools in the census CSV)")
+    ap.add_argument("--out", default=CATCHMENT_DIR)
+    ap.add_argument("--radius-km", type=float, default=RADIUS_KM)
+    ap.add_argument("--cell-m", type=float, default=CELL_M)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    schools = args.schools or census_schools()
+    report = build_catchments(schools, args.out, args.radius_km, args.cell_m, args.workers)
+    for name, cells in sorted(report["built"].items()):
+        print(f"  {name}: {cells} cells")
+    for name, err in sorted(report["failed"].items()):
+        print(f"  FAILED {name}: {err}")
+    print(f"{len(report['built'])} built, {len(report['failed'])} failed -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
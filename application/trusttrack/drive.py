@@ -0,0 +1,145 @@
+"""
+Trust Track - shared drive graph
+One territory-wide drive graph loaded at startup, plus a node x park-and-ride travel-time table
+so park-and-stride scoring is a lookup instead of a graph download and two searches per request.
+"""
+
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Tuple, Dict, Any, List, Optional
+
+import networkx as nx
+import numpy as np
+import osmnx as ox
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from .utils import PLACE_NAME, iter_best_edges
+
+DRIVE_GRAPH_FILE = os.environ.get(
+    "TRUSTTRACK_DRIVE_GRAPH", str(Path(ox.settings.cache_folder) / "act_drive.graphml")
+)
+
+# Car model
+PARKING_BUFFER_MIN = 4.0
+CAR_BASE_SAFETY    = 95.0
+
+
+def build_drive_graph(place: str = PLACE_NAME) -> nx.MultiDiGraph:
+    """Download the drive network for the whole territory with speeds and travel times."""
+    Gc = ox.graph_from_place(place, network_type="drive")
+    Gc = ox.add_edge_speeds(Gc)
+    Gc = ox.add_edge_travel_times(Gc)
+    return Gc
+
+
+def load_drive_graph(path: str = DRIVE_GRAPH_FILE, place: str = PLACE_NAME) -> nx.MultiDiGraph:
+    """Load the persisted drive graph, building and saving it on first use."""
+    if os.path.exists(path):
+        return ox.load_graphml(path)
+    Gc = build_drive_graph(place)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    ox.save_graphml(Gc, path)
+    return Gc
+
+
+def car_drive_time_minutes(Gc: nx.MultiDiGraph, o_lat: float, o_lon: float,
+                           d_lat: float, d_lon: float) -> Tuple[float, list]:
+    """Point-to-point drive time and node route, for drawing a single chosen drive."""
+    o = ox.nearest_nodes(Gc, X=o_lon, Y=o_lat); d = ox.nearest_nodes(Gc, X=d_lon, Y=d_lat)
+    r = nx.shortest_path(Gc, o, d, weight="travel_time")
+    tt = float(np.sum([float(data.get("travel_time", 0.0)) for data in iter_best_edges(Gc, r)]))
+    return tt/60.0, r
+
+
+def site_key(lat: float, lon: float) -> Tuple[float, float]:
+    return (round(float(lat), 6), round(float(lon), 6))
+
+
+class DriveTimeTable:
+    """
+    Drive minutes from every node of the drive graph to each park-and-ride site.
+    Built with one reverse Dijkstra per site, so a lookup is a nearest-node query and an array read.
+    A table saved with a data bundle is passed back in as minutes instead of being rebuilt.
+    Other parking sites (smart-parking lots, the OSM extract) are scored by one forward search
+    from the origin per request that needs them.
+    """
+
+    def __init__(self, Gc: nx.MultiDiGraph, sites_df: pd.DataFrame, minutes: Optional[np.ndarray] = None):
+        self.G = Gc
+        self.nodes = np.fromiter(Gc.nodes, dtype=np.int64, count=len(Gc))
+        self.node_index = {int(n): i for i, n in enumerate(self.nodes)}
+        self.sites = sites_df[["lat", "lon"]].reset_index(drop=True)
+        self.site_index = {site_key(r.lat, r.lon): j for j, r in self.sites.iterrows()}
+        self.site_nodes = ox.nearest_nodes(Gc, X=self.sites["lon"].values, Y=self.sites["lat"].values)
+        self._other_nodes: Dict[Tuple[float, float], int] = {}
+        self._other_lock = threading.Lock()  # requests score sites from the threadpool
+        self._csr = self._travel_csr()
+
+        if minutes is not None:
+            if minutes.shape != (len(self.nodes), len(self.sites)):
+                raise ValueError(f"Drive-time table is {minutes.shape}, graph and sites need "
+                                 f"{(len(self.nodes), len(self.sites))}")
+            self.minutes = minutes
+            return
+        self.minutes = np.full((len(self.nodes), len(self.sites)), np.inf, dtype=np.float32)
+        reverse = Gc.reverse(copy=False)
+        for j, sn in enumerate(self.site_nodes):
+            seconds = nx.single_source_dijkstra_path_length(reverse, sn, weight="travel_time")
+            idx = np.fromiter((self.node_index[int(n)] for n in seconds), dtype=np.int64, count=len(seconds))
+            self.minutes[idx, j] = np.fromiter(seconds.values(), dtype=np.float64, count=len(seconds)) / 60.0
+
+    def minutes_from(self, lat: float, lon: float) -> np.ndarray:
+        """Drive minutes from the node nearest (lat, lon) to every site (inf if unreachable)."""
+        node = ox.nearest_nodes(self.G, X=lon, Y=lat)
+        return self.minutes[self.node_index[int(node)]]
+
+    def _travel_csr(self) -> csr_matrix:
+        """Node x node matrix of the quickest parallel edge's travel time, for forward searches."""
+        best: Dict[Tuple[int, int], float] = {}
+        for u, v, d in self.G.edges(data=True):
+            key = (self.node_index[int(u)], self.node_index[int(v)])
+            t = max(float(d.get("travel_time", 0.0)), 1e-9)  # csgraph drops explicit zeros
+            best[key] = min(t, best.get(key, math.inf))
+        uv = np.array(list(best.keys()), dtype=np.int64).reshape(-1, 2)
+        return csr_matrix((np.fromiter(best.values(), dtype=float, count=len(best)), (uv[:, 0], uv[:, 1])),
+                          shape=(len(self.nodes), len(self.nodes)))
+
+    def minutes_to_other(self, lat: float, lon: float, keys: List[Tuple[float, float]]) -> Dict[Tuple[float, float], float]:
+        """Drive minutes from (lat, lon) to sites not in the table, keyed by site_key; one forward search."""
+        with self._other_lock:
+            missing = [k for k in keys if k not in self._other_nodes]
+            if missing:
+                nodes = ox.nearest_nodes(self.G, X=[k[1] for k in missing], Y=[k[0] for k in missing])
+                self._other_nodes.update(zip(missing, (self.node_index[int(n)] for n in np.atleast_1d(nodes))))
+            targets = [self._other_nodes[k] for k in keys]
+        origin = self.node_index[int(ox.nearest_nodes(self.G, X=lon, Y=lat))]
+        seconds = dijkstra(self._csr, directed=True, indices=origin)
+        return {k: float(seconds[t]) / 60.0 for k, t in zip(keys, targets)}
+
+    def score_sites(self, origin_ll: Tuple[float, float], pr_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Add drive time, total time and risk-minutes for the car leg to ranked park-and-stride rows."""
+        row = self.minutes_from(origin_ll[0], origin_ll[1])
+        keys = [site_key(r["lat"], r["lon"]) for r in pr_rows]
+        other = [k for k in keys if k not in self.site_index]
+        other_min = self.minutes_to_other(origin_ll[0], origin_ll[1], other) if other else {}
+        out = []
+        for r, key in zip(pr_rows, keys):
+            j = self.site_index.get(key)
+            m = row[j] if j is not None else other_min.get(key, math.inf)
+            drive_min: Optional[float] = float(m) if np.isfinite(m) else None
+            if drive_min is None:
+                out.append(dict(r, drive_min=None, car_total_fast_min=None, car_risk_minutes_safe=None))
+                continue
+            drive_total = drive_min + PARKING_BUFFER_MIN
+            out.append(dict(
+                r,
+                drive_min=drive_total,
+                car_total_fast_min=drive_total + r["walk_fast_min"],
+                car_risk_minutes_safe=(1 - CAR_BASE_SAFETY/100.0) * drive_total
+                                      + (1 - r["walk_mean_safety"]/100.0) * r["walk_safe_min"],
+            ))
+        return out
@@ -0,0 +1,66 @@
+"""
+Trust Track - safe-walk isochrones
+One bounded reverse Dijkstra over w_safe from a school node gives, for every node within the
+largest time band, the walking time of its safest route to the gate. Bands are drawn as
+concave hulls of the reached nodes or as the buffered set of reached street edges.
+"""
+
+import math
+from typing import Dict, Any, List, Sequence
+
+import networkx as nx
+import numpy as np
+import shapely
+from shapely.geometry import mapping
+
+from .routing import reverse_search_to
+
+ISOCHRONE_BANDS_MIN = (10, 15, 20)
+HULL_RATIO = 0.25         # shapely.concave_hull ratio; 1.0 is the convex hull
+EDGE_BUFFER_M = 25.0      # half-width of the street corridor in edge-set polygons
+
+
+def safe_walk_minutes_to(G: nx.MultiDiGraph, target, max_minutes: float) -> Dict[Any, float]:
+    """Minutes along the safest route from each node to target, for nodes within max_minutes."""
+    return {n: t for n, (t, _) in reverse_search_to(G, target, "w_safe", max_minutes).items()}
+
+
+def _metres_to_deg(lat: float) -> float:
+    return 1.0 / (111320.0 * math.cos(math.radians(lat)))
+
+
+def isochrone_polygons(G: nx.MultiDiGraph, target, minutes: Dict[Any, float],
+                       bands: Sequence[float] = ISOCHRONE_BANDS_MIN, shape: str = "hull") -> Dict[str, Any]:
+    """GeoJSON FeatureCollection with one (Multi)Polygon per band, largest band first for drawing."""
+    nodes = list(minutes)
+    t = np.fromiter((minutes[n] for n in nodes), dtype=float, count=len(nodes))
+    xy = np.array([[G.nodes[n]["x"], G.nodes[n]["y"]] for n in nodes], dtype=float).reshape(-1, 2)
+    pos = dict(zip(nodes, xy))
+    lat = G.nodes[target]["y"]
+    features: List[Dict[str, Any]] = []
+    for band in sorted(bands, reverse=True):
+        inside = t <= band
+        if shape == "edges":
+            reached = [n for n, ok in zip(nodes, inside) if ok]
+            segs, seen = [], set()
+            for u, v in G.subgraph(reached).edges():
+                if (v, u) not in seen:  # one segment per two-way street
+                    seen.add((u, v))
+                    segs.append((pos[u], pos[v]))
+            lines = shapely.multilinestrings(shapely.linestrings(np.asarray(segs))) if segs \
+                else shapely.multipoints(xy[inside])
+            geom = shapely.buffer(lines, EDGE_BUFFER_M * _metres_to_deg(lat))
+            n_edges = len(segs)
+        else:
+            geom = shapely.concave_hull(shapely.multipoints(xy[inside]), ratio=HULL_RATIO)
+            geom = shapely.buffer(geom, EDGE_BUFFER_M * _metres_to_deg(lat) / 2)  # points/lines -> area
+            n_edges = None
+        features.append({"type": "Feature", "geometry": mapping(geom),
+                         "properties": {"minutes": band, "nodes": int(inside.sum()), "edges": n_edges,
+                                        "area_km2": round(_area_km2(geom, lat), 3)}})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def _area_km2(geom, lat: float) -> float:
+    # equirectangular scale around the school; fine at suburb scale
+    return geom.area * (111.32 ** 2) * math.cos(math.radians(lat))
@@ -0,0 +1,151 @@
+"""
+Trust Track - goal-directed search heuristics
+Admissible A* heuristics for the walk router: straight-line distance over the graph's top
+walking speed for w_fast, and ALT (landmark triangle-inequality) bounds for w_safe, whose
+per-metre cost can be zero so no geometric bound helps. Landmark distances are computed once
+on the territory walk graph; because a sub-graph's distances are never shorter, the same table
+stays admissible for the per-request bbox graphs that share its OSM node ids.
+
+    python -m trusttrack.landmarks --landmarks 16     # build from the ACT walk network
+"""
+
+import argparse
+import math
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import networkx as nx
+import numpy as np
+import osmnx as ox
+from scipy.sparse.csgraph import dijkstra
+
+from .utils import PLACE_NAME, WEIGHT_WORKERS, add_edge_weights
+
+LANDMARKS_FILE = os.environ.get(
+    "TRUSTTRACK_LANDMARKS", str(Path(ox.settings.cache_folder) / "act_walk_landmarks.npz")
+)
+N_LANDMARKS = 16
+EARTH_RADIUS_M = 6371009.0  # OSMnx's great-circle radius, so edge lengths are never shorter
+ALT_SLACK = 1e-3            # absorbs float32 storage and csgraph zero-weight rounding
+
+
+def _great_circle_m(lat1, lon1, lat2, lon2) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def max_speed_m_per_unit(G: nx.MultiDiGraph, weight: str = "w_fast") -> float:
+    """Top edge speed in metres per unit of weight (metres/minute for w_fast)."""
+    v = max((d["length"] / d[weight] for _, _, d in G.edges(data=True) if d.get(weight, 0) > 0), default=0.0)
+    if not v:
+        raise ValueError(f"No positive '{weight}' edges to derive a speed from")
+    G.graph[f"max_speed_{weight}"] = v
+    return v
+
+
+def haversine_heuristic(G: nx.MultiDiGraph, target, weight: str = "w_fast") -> Callable[[Any, Any], float]:
+    """h(u) = great-circle metres to target / top speed; a lower bound on any walk's w_fast."""
+    speed = G.graph.get(f"max_speed_{weight}") or max_speed_m_per_unit(G, weight)
+    t_lat, t_lon = G.nodes[target]["y"], G.nodes[target]["x"]
+    scale = (1.0 - 1e-9) / speed
+    nodes = G.nodes
+
+    def h(u, _target):
+        d = nodes[u]
+        return _great_circle_m(d["y"], d["x"], t_lat, t_lon) * scale
+    return h
+
+
+class Landmarks:
+    """
+    ALT tables: dist_from[l, i] = d(landmark l -> node i), dist_to[l, i] = d(node i -> landmark l)
+    for one weight, stored as float32 with inf for unreachable.
+    """
+
+    def __init__(self, node_ids: np.ndarray, dist_from: np.ndarray, dist_to: np.ndarray, weight: str):
+        self.node_ids = node_ids
+        self.index = {int(n): i for i, n in enumerate(node_ids)}
+        self.dist_from, self.dist_to, self.weight = dist_from, dist_to, weight
+
+    @classmethod
+    def build(cls, G: nx.MultiDiGraph, k: int = N_LANDMARKS, weight: str = "w_safe") -> "Landmarks":
+        """Landmarks spread around the graph's edge: the farthest node in each of k compass sectors."""
+        from .matrix import WalkMatrixGraph  # CSR of the graph for C-speed searches
+        M = WalkMatrixGraph(G)
+        W = M._edges(weight)[0]
+        xy = np.array([[G.nodes[n]["x"], G.nodes[n]["y"]] for n in M.nodes])
+        rel = xy - xy.mean(axis=0)
+        sector = ((np.arctan2(rel[:, 1], rel[:, 0]) + np.pi) / (2 * np.pi) * k).astype(int) % k
+        radius = np.hypot(rel[:, 0], rel[:, 1])
+        chosen = [int(np.flatnonzero(sector == s)[np.argmax(radius[sector == s])])
+                  for s in range(k) if np.any(sector == s)]
+        dist_from = dijkstra(W, directed=True, indices=chosen)
+        dist_to = dijkstra(W.T.tocsr(), directed=True, indices=chosen)
+        return cls(np.array(M.nodes, dtype=np.int64), dist_from.astype(np.float32), dist_to.astype(np.float32), weight)
+
+    def save(self, path: str = LANDMARKS_FILE) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, node_ids=self.node_ids, dist_from=self.dist_from, dist_to=self.dist_to,
+                 weight=np.array(self.weight))
+
+    @classmethod
+    def load(cls, path: str = LANDMARKS_FILE) -> Optional["Landmarks"]:
+        if not os.path.exists(path):
+            return None
+        z = np.load(path)
+        return cls(z["node_ids"], z["dist_from"], z["dist_to"], str(z["weight"]))
+
+    def heuristic(self, target) -> Callable[[Any, Any], float]:
+        """h(u) = max over landmarks of the triangle-inequality bounds on d(u, target)."""
+        t = self.index.get(int(target))
+        if t is None:
+            return lambda u, _t: 0.0
+        f_t = self.dist_from[:, t].astype(np.float64)
+        t_t = self.dist_to[:, t].astype(np.float64)
+        index, dist_from, dist_to = self.index, self.dist_from, self.dist_to
+        cache: Dict[Any, float] = {}
+
+        def h(u, _target):
+            v = cache.get(u)
+            if v is None:
+                i = index.get(u)
+                if i is None:
+                    v = 0.0
+                else:
+                    with np.errstate(invalid="ignore"):
+                        b = np.concatenate([f_t - dist_from[:, i], dist_to[:, i] - t_t])
+                    b = b[np.isfinite(b)]
+                    v = max(0.0, float(b.max()) - ALT_SLACK) if len(b) else 0.0
+                cache[u] = v
+            return v
+        return h
+
+
+_landmarks: Optional[Landmarks] = None
+
+
+def set_landmarks(landmarks: Optional[Landmarks]) -> None:
+    global _landmarks
+    _landmarks = landmarks
+
+
+def get_landmarks() -> Optional[Landmarks]:
+    return _landmarks
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--landmarks", type=int, default=N_LANDMARKS)
+    ap.add_argument("--out", default=LANDMARKS_FILE)
+    ap.add_argument("--workers", type=int, default=WEIGHT_WORKERS or os.cpu_count(), help="Edge-weight build processes")
+    args = ap.parse_args()
+    G = add_edge_weights(ox.graph_from_place(PLACE_NAME, network_type="walk", simplify=True), args.workers)
+    lm = Landmarks.build(G, args.landmarks)
+    lm.save(args.out)
+    print(f"{len(lm.dist_from)} landmarks over {len(lm.node_ids)} nodes -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
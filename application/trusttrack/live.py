@@ -0,0 +1,420 @@
+"""
+Trust Track - live bus positions
+Vehicle positions come from a pluggable source. This can be a GTFS-realtime vehicle feed in
+protobuf or JSON, or a simulator that replays the runs in ACT_School_Bus_Services.csv. The
+last RING_DEPTH positions of each vehicle are kept in fixed-size NumPy rings. Each accepted
+update is encoded once and then handed to every WebSocket subscriber whose school/route
+filter matches.
+
+Backpressure: a subscriber holds at most one unsent position per vehicle. A newer position
+replaces an older unsent one, so a slow client costs memory bounded by the fleet size, not by
+how far behind it is. A client whose send stalls past SEND_TIMEOUT_S is disconnected.
+
+    python -m trusttrack.live --speed 60 --seconds 10
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .metrics import LIVE_COALESCED, LIVE_DROPPED, LIVE_SUBSCRIBERS, LIVE_UPDATES
+from .routing import BUS_SPEED_KMH_DEFAULT
+from .serialization import dumps
+from .utils import haversine_km, slugify
+
+try:  # protobuf feeds need the GTFS-realtime bindings; JSON feeds and the simulator do not
+    from google.protobuf.json_format import MessageToDict
+    from google.transit import gtfs_realtime_pb2
+except ImportError:
+    gtfs_realtime_pb2 = None
+
+LIVE_SOURCE = os.environ.get("TRUSTTRACK_LIVE_SOURCE", "off")   # "off", a feed URL, or "sim" (made-up positions)
+SIM_SPEED = float(os.environ.get("TRUSTTRACK_LIVE_SIM_SPEED", "1"))
+FEED_POLL_S = float(os.environ.get("TRUSTTRACK_LIVE_POLL_S", "10"))
+MAX_SUBSCRIBERS = int(os.environ.get("TRUSTTRACK_LIVE_MAX_SUBSCRIBERS", "5000"))
+RING_DEPTH = 16
+SEND_TIMEOUT_S = 5.0
+STALE_AFTER_S = 120.0     # vehicles silent this long drop out of snapshots
+SIM_TICK_S = 1.0
+SIM_DEPOT_KM = (4.0, 9.0)  # the CSV names suburbs, not stops: runs start this far from their first school
+
+POSITION_DTYPE = np.dtype([("ts", "f8"), ("lat", "f4"), ("lon", "f4"), ("bearing", "f4"), ("speed_kmh", "f4")])
+
+# One update: {"id", "route", "schools" (slugs), "lat", "lon", "bearing", "speed_kmh", "ts" (epoch s)};
+# published messages also carry "source", the name of the source that produced them
+Update = Dict[str, Any]
+
+
+class PositionRing:
+    """Last `depth` positions of every vehicle seen, one row of a structured array per vehicle."""
+
+    def __init__(self, depth: int = RING_DEPTH, capacity: int = 256):
+        self.depth = depth
+        self.slots: Dict[str, int] = {}
+        self.buf = np.zeros((capacity, depth), POSITION_DTYPE)
+        self.head = np.full(capacity, -1, dtype=np.int64)   # column of the newest position
+        self.count = np.zeros(capacity, dtype=np.int64)
+
+    def _slot(self, vehicle_id: str) -> int:
+        i = self.slots.get(vehicle_id)
+        if i is None:
+            i = self.slots[vehicle_id] = len(self.slots)
+            if i == len(self.buf):  # double; vehicles are never evicted, the fleet is finite
+                self.buf = np.concatenate([self.buf, np.zeros_like(self.buf)])
+                self.head = np.concatenate([self.head, np.full(i, -1, dtype=np.int64)])
+                self.count = np.concatenate([self.count, np.zeros(i, dtype=np.int64)])
+        return i
+
+    def push(self, u: Update) -> bool:
+        """Store u unless it is not newer than the vehicle's last position."""
+        i = self._slot(u["id"])
+        h = self.head[i]
+        if h >= 0 and u["ts"] <= self.buf[i, h]["ts"]:
+            return False
+        h = (h + 1) % self.depth
+        self.buf[i, h] = (u["ts"], u["lat"], u["lon"], u.get("bearing") or 0.0, u.get("speed_kmh") or 0.0)
+        self.head[i], self.count[i] = h, min(self.count[i] + 1, self.depth)
+        return True
+
+    def track(self, vehicle_id: str) -> np.ndarray:
+        """The vehicle's stored positions, oldest first (empty if unknown)."""
+        i = self.slots.get(vehicle_id)
+        if i is None:
+            return self.buf[:0, 0]
+        n, h = self.count[i], self.head[i]
+        return self.buf[i, (np.arange(h - n + 1, h + 1)) % self.depth]
+
+    @property
+    def nbytes(self) -> int:
+        return self.buf.nbytes + self.head.nbytes + self.count.nbytes
+
+
+class Subscriber:
+    """One client's filter and its unsent positions, at most one per vehicle."""
+
+    def __init__(self, school: Optional[str] = None, route: Optional[str] = None):
+        self.key = (school, route)
+        self.pending: Dict[str, str] = {}
+        self.wake = asyncio.Event()
+        self.sent = 0
+
+    def offer(self, vehicle_id: str, msg: str) -> None:
+        if vehicle_id in self.pending:
+            LIVE_COALESCED.inc()
+        self.pending[vehicle_id] = msg
+        self.wake.set()
+
+    def drain(self) -> Optional[str]:
+        """Pending positions as one JSON array, or None."""
+        if not self.pending:
+            return None
+        batch, self.pending = self.pending, {}
+        self.sent += len(batch)
+        return "[" + ",".join(batch.values()) + "]"
+
+
+class LiveHub:
+    """Ingests position batches into the ring and fans each accepted update out once."""
+
+    def __init__(self, ring: Optional[PositionRing] = None, max_subscribers: int = MAX_SUBSCRIBERS):
+        self.ring = ring or PositionRing()
+        self.max_subscribers = max_subscribers
+        self.last: Dict[str, Tuple[float, str, Tuple[str, ...], str]] = {}  # id -> (ts, route, schools, msg)
+        self._subs: Dict[Tuple[Optional[str], Optional[str]], Set[Subscriber]] = defaultdict(set)
+        self.n_subscribers = 0
+        self.source: Optional[str] = None
+
+    @staticmethod
+    def _keys(route: str, schools: Iterable[str]):
+        for s in (None, *schools):
+            yield s, None
+            yield s, route
+
+    def publish(self, updates: Iterable[Update]) -> int:
+        accepted = 0
+        for u in updates:
+            if not self.ring.push(u):
+                LIVE_UPDATES.inc(result="stale")
+                continue
+            accepted += 1
+            route, schools = str(u["route"]), tuple(u.get("schools", ()))
+            msg = dumps({"id": u["id"], "route": route, "schools": schools,
+                         "lat": round(float(u["lat"]), 6), "lon": round(float(u["lon"]), 6),
+                         "bearing": u.get("bearing"), "speed_kmh": u.get("speed_kmh"), "ts": u["ts"],
+                         "source": self.source}).decode()
+            self.last[u["id"]] = (u["ts"], route, schools, msg)
+            for key in self._keys(route, schools):
+                for sub in self._subs.get(key, ()):
+                    sub.offer(u["id"], msg)
+        LIVE_UPDATES.inc(accepted, result="accepted")
+        return accepted
+
+    def snapshot(self, school: Optional[str] = None, route: Optional[str] = None) -> Dict[str, str]:
+        """Encoded latest position of every vehicle matching the filter and heard from recently."""
+        cutoff = time.time() - STALE_AFTER_S
+        return {vid: msg for vid, (ts, r, schools, msg) in self.last.items()
+                if ts >= cutoff and (route is None or r == route) and (school is None or school in schools)}
+
+    def subscribe(self, school: Optional[str] = None, route: Optional[str] = None) -> Optional[Subscriber]:
+        """A new subscriber primed with the current snapshot, or None when the process is full."""
+        if self.n_subscribers >= self.max_subscribers:
+            LIVE_DROPPED.inc(reason="full")
+            return None
+        sub = Subscriber(school, route)
+        for vid, msg in self.snapshot(school, route).items():
+            sub.offer(vid, msg)
+        self._subs[sub.key].add(sub)
+        self.n_subscribers += 1
+        LIVE_SUBSCRIBERS.set(self.n_subscribers)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        subs = self._subs.get(sub.key)
+        if subs is not None and sub in subs:
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sub.key]
+            self.n_subscribers -= 1
+            LIVE_SUBSCRIBERS.set(self.n_subscribers)
+
+    async def pump(self, sub: Subscriber, send: Callable[[str], Awaitable[None]]) -> str:
+        """
+        Send sub's positions through send until the client goes away or stalls. Returns why it
+        stopped ("slow" or "closed"); the subscriber is always unsubscribed.
+        """
+        try:
+            while True:
+                await sub.wake.wait()
+                sub.wake.clear()
+                batch = sub.drain()
+                if batch is None:
+                    continue
+                try:
+                    await asyncio.wait_for(send(batch), SEND_TIMEOUT_S)
+                except asyncio.TimeoutError:
+                    LIVE_DROPPED.inc(reason="slow")
+                    return "slow"
+        except Exception:
+            return "closed"
+        finally:
+            self.unsubscribe(sub)
+
+    async def run(self, source: "PositionSource", retry_s: float = 5.0) -> None:
+        """Ingest from source for the life of the process, restarting it after errors."""
+        self.source = source.name
+        while True:
+            try:
+                async for batch in source.stream():
+                    self.publish(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Live position source {source.name} failed: {e}")
+            await asyncio.sleep(retry_s)
+
+    def stats(self) -> Dict[str, Any]:
+        cutoff = time.time() - STALE_AFTER_S
+        return {"source": self.source, "vehicles_seen": len(self.last),
+                "vehicles_live": sum(ts >= cutoff for ts, *_ in self.last.values()),
+                "subscribers": self.n_subscribers, "ring_bytes": self.ring.nbytes}
+
+
+# Sources
+
+class PositionSource(ABC):
+    """Yields batches of updates forever (or until the feed ends)."""
+    name = "source"
+
+    @abstractmethod
+    def stream(self) -> AsyncIterator[List[Update]]:
+        ...
+
+
+def _bearing(lat1, lon1, lat2, lon2) -> float:
+    p1, p2, dl = math.radians(lat1), math.radians(lat2), math.radians(lon2 - lon1)
+    y = math.sin(dl) * math.cos(p2)
+    x = math.cos(p1) * math.sin(p2) - math.sin(p1) * math.cos(p2) * math.cos(dl)
+    return (math.degrees(math.atan2(y, x)) + 360.0) % 360.0
+
+
+def _minute_of_day(t: str) -> float:
+    dt = datetime.strptime(t.strip(), "%I:%M:%S %p")
+    return dt.hour * 60 + dt.minute + dt.second / 60.0
+
+
+class SimulatedSource(PositionSource):
+    """
+    Replays the school runs in ACT_School_Bus_Services.csv on a simulated clock. One run is
+    one (RouteNumber, Shift, StartTime) and visits every school listed for it. Morning runs
+    go from a depot to the schools, and afternoon runs go back the same way, at the bus
+    planning speed. The CSV names suburbs rather than stops, so each route's depot is a fixed
+    point 4-9 km out, seeded by the route number.
+    """
+    name = "sim"
+
+    def __init__(self, bus_df: pd.DataFrame, speed: float = SIM_SPEED, tick_s: float = SIM_TICK_S,
+                 bus_speed_kmh: float = BUS_SPEED_KMH_DEFAULT, start_minute: Optional[float] = None):
+        self.speed, self.tick_s = speed, tick_s
+        km_per_min = bus_speed_kmh / 60.0
+        self.runs = []
+        for (route, shift, start), g in bus_df.groupby(["RouteNumber", "Shift", "StartTime"], sort=False):
+            schools = g.drop_duplicates("School Name")
+            pts = self._path(int(route), schools[["lat", "lon"]].to_numpy(float))
+            t0 = _minute_of_day(start)
+            if t0 >= 12 * 60:
+                pts = pts[::-1]
+            km = np.concatenate([[0.0], np.cumsum([haversine_km(*a, *b) for a, b in zip(pts[:-1], pts[1:])])])
+            self.runs.append({"id": f"{route}-{shift}-{int(t0) // 60:02d}{int(t0) % 60:02d}", "route": str(route),
+                              "schools": tuple(slugify(s) for s in schools["School Name"]),
+                              "pts": pts, "km": km, "t0": t0, "t1": t0 + km[-1] / km_per_min})
+        self.km_per_min = km_per_min
+        self.day = (min(r["t0"] for r in self.runs), max(r["t1"] for r in self.runs)) if self.runs else (0.0, 0.0)
+        if start_minute is None:
+            now = datetime.now()
+            start_minute = now.hour * 60 + now.minute + now.second / 60.0
+            if not any(r["t0"] <= start_minute <= r["t1"] for r in self.runs):
+                start_minute = self.day[0]
+        self.start_minute = start_minute
+
+    @staticmethod
+    def _path(route: int, schools_ll: np.ndarray) -> np.ndarray:
+        """Depot, then the schools nearest-first."""
+        rng = np.random.default_rng(route)
+        first = schools_ll[0]
+        theta, km = rng.uniform(0, 2 * np.pi), rng.uniform(*SIM_DEPOT_KM)
+        depot = first + [km * np.cos(theta) / 111.32, km * np.sin(theta) / (111.32 * np.cos(np.radians(first[0])))]
+        path, left = [depot], list(schools_ll)
+        while left:
+            j = min(range(len(left)), key=lambda k: haversine_km(*path[-1], *left[k]))
+            path.append(left.pop(j))
+        return np.array(path)
+
+    def positions(self, minute: float, ts: float) -> List[Update]:
+        out = []
+        for r in self.runs:
+            if not r["t0"] <= minute <= r["t1"]:
+                continue
+            d = (minute - r["t0"]) * self.km_per_min
+            j = int(np.clip(np.searchsorted(r["km"], d, side="right") - 1, 0, len(r["km"]) - 2))
+            a, b = r["pts"][j], r["pts"][j + 1]
+            f = (d - r["km"][j]) / max(r["km"][j + 1] - r["km"][j], 1e-9)
+            lat, lon = a + (b - a) * min(f, 1.0)
+            out.append({"id": r["id"], "route": r["route"], "schools": r["schools"], "lat": lat, "lon": lon,
+                        "bearing": round(_bearing(*a, *b), 1), "speed_kmh": self.km_per_min * 60.0, "ts": ts})
+        return out
+
+    def minute_at(self, elapsed_s: float) -> float:
+        """Simulated minute of day, wrapping from the end of the last run to the first."""
+        start, end = self.day
+        span = max(end - start, 1e-9)
+        return start + (self.start_minute - start + elapsed_s * self.speed / 60.0) % span
+
+    async def stream(self) -> AsyncIterator[List[Update]]:
+        t0 = time.monotonic()
+        while True:
+            yield self.positions(self.minute_at(time.monotonic() - t0), time.time())
+            await asyncio.sleep(self.tick_s)
+
+
+class FeedSource(PositionSource):
+    """
+    Polls a GTFS-realtime vehicle-positions feed. The feed can be protobuf (this needs
+    gtfs-realtime-bindings) or its JSON form. GTFS-rt carries routes, not schools, so schools
+    are looked up from the school-bus CSV by route number.
+    """
+    name = "feed"
+
+    def __init__(self, url: str, route_schools: Dict[str, Tuple[str, ...]], interval_s: float = FEED_POLL_S):
+        self.url, self.route_schools, self.interval_s = url, route_schools, interval_s
+
+    def _fetch(self) -> Dict[str, Any]:
+        with urllib.request.urlopen(self.url, timeout=30) as resp:
+            body = resp.read()
+        if body.lstrip()[:1] == b"{":
+            return json.loads(body)
+        if gtfs_realtime_pb2 is None:
+            raise RuntimeError("protobuf feed needs gtfs-realtime-bindings (or serve the JSON form)")
+        msg = gtfs_realtime_pb2.FeedMessage()
+        msg.ParseFromString(body)
+        return MessageToDict(msg)
+
+    def parse(self, feed: Dict[str, Any]) -> List[Update]:
+        out = []
+        for ent in feed.get("entity", []):
+            v = ent.get("vehicle")
+            pos = (v or {}).get("position")
+            if not pos:
+                continue
+            route = str(v.get("trip", {}).get("routeId", ""))
+            speed = pos.get("speed")  # m/s in GTFS-rt
+            out.append({"id": str(v.get("vehicle", {}).get("id") or ent.get("id")), "route": route,
+                        "schools": self.route_schools.get(route, ()),
+                        "lat": float(pos["latitude"]), "lon": float(pos["longitude"]),
+                        "bearing": pos.get("bearing"), "speed_kmh": None if speed is None else float(speed) * 3.6,
+                        "ts": float(v.get("timestamp") or time.time())})
+        return out
+
+    async def stream(self) -> AsyncIterator[List[Update]]:
+        while True:
+            yield self.parse(await asyncio.to_thread(self._fetch))
+            await asyncio.sleep(self.interval_s)
+
+
+def route_schools(bus_df: pd.DataFrame) -> Dict[str, Tuple[str, ...]]:
+    return {str(r): tuple(sorted({slugify(s) for s in g})) for r, g in bus_df.groupby("RouteNumber")["School Name"]}
+
+
+def make_source(spec: str, bus_df: pd.DataFrame) -> Optional[PositionSource]:
+    """'sim' -> simulator, 'off'/'' -> None, anything else is a feed URL."""
+    spec = (spec or "").strip()
+    if spec in ("", "off"):
+        return None
+    if spec == "sim":
+        return SimulatedSource(bus_df)
+    return FeedSource(spec, route_schools(bus_df))
+
+
+def main():
+    from .bundle import DATA_FILES, load_bus_stops
+    from .utils import find_data
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--speed", type=float, default=60.0, help="Simulated minutes per real minute")
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--school", default=None, help="School slug to filter on")
+    ap.add_argument("--route", default=None)
+    args = ap.parse_args()
+
+    source = SimulatedSource(load_bus_stops(find_data(DATA_FILES["school_bus"])), speed=args.speed)
+    print(f"{len(source.runs)} runs, simulated day {source.day[0] / 60:.2f}-{source.day[1] / 60:.2f} h")
+
+    async def demo():
+        hub = LiveHub()
+        sub = hub.subscribe(args.school, args.route)
+
+        async def show(batch: str):
+            for u in json.loads(batch):
+                print(f"{u['id']:>16} route {u['route']:>5} {u['lat']:.5f},{u['lon']:.5f} {u['bearing']:>5}°")
+
+        ingest = asyncio.ensure_future(hub.run(source))
+        pump = asyncio.ensure_future(hub.pump(sub, show))
+        await asyncio.sleep(args.seconds)
+        ingest.cancel(); pump.cancel()
+        print(hub.stats())
+
+    asyncio.run(demo())
+
+
+if __name__ == "__main__":
+    main()
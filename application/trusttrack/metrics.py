@@ -0,0 +1,265 @@
+"""
+Trust Track - lightweight tracing & metrics
+Timed spans around pipeline stages, search-expansion and cache counters, and a
+Prometheus text exposition for /metrics. No external client library needed.
+"""
+
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Any, Tuple, Optional, Callable, Iterator
+
+# Seconds; covers a 1 ms snap lookup up to a 60 s cold graph download
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Nodes expanded per shortest-path search
+EXPANSION_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 500000)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels: Any) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, doc: str):
+        self.name, self.doc = name, doc
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _labels(**labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(_labels(**labels), 0.0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        for key, v in sorted(self._values.items()):
+            lines.append(f"{self.name}{_fmt_labels(key)} {v:g}")
+        return "\n".join(lines)
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[_labels(**labels)] = float(value)
+
+    def render(self) -> str:
+        return super().render().replace(f"# TYPE {self.name} counter", f"# TYPE {self.name} gauge")
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.doc, self.buckets = name, doc, tuple(buckets)
+        self._series: Dict[Labels, list] = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels(**labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += 1
+            s[-1] += value
+
+    def count(self, **labels: Any) -> int:
+        s = self._series.get(_labels(**labels))
+        return int(sum(s[:-1])) if s else 0
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        for key, s in sorted(self._series.items()):
+            cum = 0
+            for b, c in zip(self.buckets, s):
+                cum += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', f'{b:g}'))} {cum}")
+            cum += s[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', '+Inf'))} {cum}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {s[-1]:.6f}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {cum}")
+        return "\n".join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, doc: str, **kw):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, doc, **kw)
+            return m
+
+    def counter(self, name: str, doc: str) -> Counter:
+        return self._get(Counter, name, doc)
+
+    def gauge(self, name: str, doc: str) -> Gauge:
+        return self._get(Gauge, name, doc)
+
+    def histogram(self, name: str, doc: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, doc, buckets=buckets)
+
+    def render(self) -> str:
+        return "\n".join(m.render() for _, m in sorted(self._metrics.items())) + "\n"
+
+
+REGISTRY = Registry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.histogram("trusttrack_stage_seconds", "Wall time per route pipeline stage.")
+STAGE_ERRORS = REGISTRY.counter("trusttrack_stage_errors_total", "Route pipeline stages that raised.")
+SEARCH_EXPANDED = REGISTRY.histogram("trusttrack_search_nodes_expanded",
+                                     "Graph nodes expanded (settled or relaxed) per shortest-path search.",
+                                     EXPANSION_BUCKETS)
+CACHE_LOOKUPS = REGISTRY.counter("trusttrack_cache_lookups_total", "Cache lookups by cache and result (hit/miss).")
+HTTP_SECONDS = REGISTRY.histogram("trusttrack_http_request_seconds", "HTTP request latency by route and status.")
+SINGLE_FLIGHT = REGISTRY.counter("trusttrack_single_flight_requests_total",
+                                 "Coalesced computations by flight and role (leader ran it, follower shared it).")
+SINGLE_FLIGHT_INFLIGHT = REGISTRY.gauge("trusttrack_single_flight_inflight", "Distinct keys currently computing.")
+TILES_RESIDENT_BYTES = REGISTRY.gauge("trusttrack_walk_tiles_resident_bytes", "Bytes of walk-graph tiles held in the LRU.")
+DATA_RELOADS = REGISTRY.counter("trusttrack_data_reloads_total", "Data snapshot loads by result (loaded/unchanged/error).")
+DATA_RELOAD_SECONDS = REGISTRY.histogram("trusttrack_data_reload_seconds", "Wall time to load a data snapshot.")
+LIVE_UPDATES = REGISTRY.counter("trusttrack_live_updates_total", "Vehicle position updates by result (accepted/stale).")
+LIVE_SUBSCRIBERS = REGISTRY.gauge("trusttrack_live_subscribers", "Connected live-position subscribers.")
+LIVE_COALESCED = REGISTRY.counter("trusttrack_live_coalesced_total",
+                                  "Unsent positions replaced by a newer one for the same vehicle (slow subscribers).")
+LIVE_DROPPED = REGISTRY.counter("trusttrack_live_subscribers_dropped_total", "Subscribers closed by the server, by reason.")
+REPORTS_INGESTED = REGISTRY.counter("trusttrack_reports_ingested_total", "Hazard reports made durable, by category.")
+REPORTS_COMMIT_SECONDS = REGISTRY.histogram("trusttrack_reports_commit_seconds",
+                                            "Write plus fsync time per batch of hazard reports.")
+REPORTS_BATCH = REGISTRY.histogram("trusttrack_reports_batch_size", "Hazard reports per fsync.",
+                                   buckets=(1, 4, 16, 64, 256, 1024, 4096, 16384))
+REPORTS_AGG_LAG = REGISTRY.gauge("trusttrack_reports_aggregate_lag_seconds",
+                                 "Age of the oldest durable report not yet in the aggregate.")
+
+
+# Per-request trace (for ?debug=timings)
+
+class Trace:
+    def __init__(self):
+        self.timings_ms: Dict[str, float] = {}
+        self.nodes_expanded: Dict[str, int] = {}
+        self.searches: Dict[str, int] = {}
+        self.cache: Dict[str, str] = {}
+        self.single_flight: Dict[str, str] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"timings_ms": {k: round(v, 3) for k, v in self.timings_ms.items()},
+                "searches": dict(self.searches), "nodes_expanded": dict(self.nodes_expanded),
+                "cache": dict(self.cache), "single_flight": dict(self.single_flight)}
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trusttrack_trace", default=None)
+
+
+@contextmanager
+def trace() -> Iterator[Trace]:
+    """Collect the spans and counters of one request into a Trace."""
+    t = Trace()
+    token = _current.set(t)
+    try:
+        yield t
+    finally:
+        _current.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+class StageError(RuntimeError):
+    """A pipeline stage failed; carries the stage name for the error response."""
+
+    def __init__(self, stage: str, cause: BaseException):
+        super().__init__(f"{stage}: {cause}")
+        self.stage, self.cause = stage, cause
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a pipeline stage into the stage histogram and the current request trace."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except StageError:
+        raise
+    except Exception as e:
+        STAGE_ERRORS.inc(stage=stage)
+        raise StageError(stage, e) from e
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_SECONDS.observe(dt, stage=stage)
+        t = _current.get()
+        if t is not None:
+            t.timings_ms[stage] = t.timings_ms.get(stage, 0.0) + dt * 1000.0
+
+
+def record_search(kind: str, expanded: int) -> None:
+    SEARCH_EXPANDED.observe(expanded, search=kind)
+    t = _current.get()
+    if t is not None:
+        t.nodes_expanded[kind] = t.nodes_expanded.get(kind, 0) + expanded
+        t.searches[kind] = t.searches.get(kind, 0) + 1
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+    t = _current.get()
+    if t is not None:
+        t.cache[cache] = "hit" if hit else "miss"
+
+
+def record_single_flight(flight: str, shared: bool) -> None:
+    role = "follower" if shared else "leader"
+    SINGLE_FLIGHT.inc(flight=flight, role=role)
+    t = _current.get()
+    if t is not None:
+        t.single_flight[flight] = role
+
+
+def coalesced_share(flight: str) -> Optional[float]:
+    """Fraction of callers that shared another caller's computation."""
+    leaders, followers = SINGLE_FLIGHT.value(flight=flight, role="leader"), SINGLE_FLIGHT.value(flight=flight, role="follower")
+    return followers / (leaders + followers) if leaders + followers else None
+
+
+def cache_hit_rate(cache: str) -> Optional[float]:
+    hits, misses = CACHE_LOOKUPS.value(cache=cache, result="hit"), CACHE_LOOKUPS.value(cache=cache, result="miss")
+    return hits / (hits + misses) if hits + misses else None
+
+
+def counting_weight(attr: str, multigraph: bool = True) -> Tuple[Callable[[Any, Any, Dict], float], set]:
+    """
+    A NetworkX weight function equivalent to weight=attr that also records every node the search
+    touched. NetworkX calls it once per relaxed edge, so the set is the settled nodes plus their
+    frontier - for (bidirectional) Dijkstra the closest observable proxy for nodes expanded.
+    """
+    touched: set = set()
+
+    if multigraph:
+        def weight(u, v, data):
+            touched.add(u); touched.add(v)
+            return min(d.get(attr, 1) for d in data.values())
+    else:
+        def weight(u, v, data):
+            touched.add(u); touched.add(v)
+            return data.get(attr, 1)
+
+    return weight, touched
@@ -0,0 +1,239 @@
+"""
+Trust Track - parking index
+One table of every place a parent could park for a park-and-stride. It merges the
+Park & Ride sites, the smart-parking lots (bay counts, max stay, tariff) and a one-time OSM
+amenity=parking extract of the territory. Each row carries capacity, permit, fee and max stay
+where the source has them. A KD-tree over locally flat km coordinates answers "sites within
+r km of this school" without a network fetch or a pass over the table.
+
+    python -m trusttrack.parking extract               # one-time OSM extract (needs network)
+    python -m trusttrack.parking query -35.2799 149.1273 --km 3
+"""
+
+import argparse
+import math
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import osmnx as ox
+import pandas as pd
+import shapely
+from scipy.spatial import cKDTree
+
+from .busgeom import lonlat_to_metres, metres_to_latlon
+from .utils import PLACE_NAME, parse_paren_latlon
+
+OSM_PARKING_FILE = os.environ.get(
+    "TRUSTTRACK_OSM_PARKING", str(Path(ox.settings.cache_folder) / "act_osm_parking.csv")
+)
+OSM_PARKING_TAGS = {"amenity": "parking"}
+DEDUP_M = 40.0  # an OSM lot this close to a P&R site or smart-parking lot is the same car park
+
+COLUMNS = ["name", "source", "lat", "lon", "capacity", "permit", "fee", "max_stay_min"]
+DTYPES = {"name": object, "source": object, "lat": float, "lon": float, "capacity": float,
+          "permit": object, "fee": float, "max_stay_min": float}
+# permit: none | permit | mixed | disabled | private | restricted (loading zones, EV, drop-off)
+PR_PERMITS = {"No Permit Required": "none", "Permit Only": "permit", "Permit and Non-permit": "mixed"}
+BAY_PERMITS = {"Disabled": "disabled", "LZ": "restricted", "EV": "restricted", "Dropoff": "restricted"}
+OSM_ACCESS = {"private": "private", "no": "private", "customers": "restricted", "delivery": "restricted",
+              "permit": "permit", "permissive": "none", "yes": "none", "public": "none"}
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON_EQ = 111.320
+
+
+def park_ride_sites(pr_df: pd.DataFrame) -> pd.DataFrame:
+    """Park_And_Ride_Locations.csv rows (with lat/lon parsed) as index rows."""
+    return pd.DataFrame({
+        "name": pr_df["Location"].astype(str).to_numpy(), "source": "park_ride",
+        "lat": pr_df["lat"].to_numpy(float), "lon": pr_df["lon"].to_numpy(float), "capacity": np.nan,
+        "permit": pr_df.get("Permit Type", pd.Series(index=pr_df.index, dtype=object)).map(PR_PERMITS)
+                  .fillna("none").to_numpy(),
+        "fee": np.nan, "max_stay_min": np.nan,
+    }, columns=COLUMNS).astype(DTYPES)
+
+
+def load_smart_parking(path: str) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    if "Latitude" not in df.columns or "Longitude" not in df.columns:
+        df["Latitude"], df["Longitude"] = zip(*df["Location"].map(parse_paren_latlon))
+    return df.dropna(subset=["Latitude", "Longitude"]).copy()
+
+
+def smart_parking_sites(df: pd.DataFrame) -> pd.DataFrame:
+    """Smart_Parking_Lots CSV rows (one per bay group) as index rows."""
+    stay = pd.to_numeric(df["MaxStayPeriod"], errors="coerce")
+    return pd.DataFrame({
+        "name": (df["Street"].astype(str) + ", " + df["City"].astype(str) + " (" + df["BayType"].astype(str) + ")").to_numpy(),
+        "source": "smart_parking",
+        "lat": df["Latitude"].to_numpy(float), "lon": df["Longitude"].to_numpy(float),
+        "capacity": pd.to_numeric(df["BayCount"], errors="coerce").to_numpy(float),
+        "permit": df["BayType"].map(BAY_PERMITS).fillna("none").to_numpy(),
+        "fee": (~df["TariffCode"].astype(str).str.startswith("Free")).astype(float).to_numpy(),
+        "max_stay_min": stay.where(stay > 0).to_numpy(float),   # 0 = not signposted
+    }, columns=COLUMNS).astype(DTYPES)
+
+
+def extract_osm_parking(place: str = PLACE_NAME) -> pd.DataFrame:
+    """Every amenity=parking feature in place, as index rows at its centroid. Needs network."""
+    gdf = ox.features_from_place(place, tags=OSM_PARKING_TAGS)
+    gdf = gdf[gdf.geometry.notna()]
+    to_m = lambda c: np.column_stack(lonlat_to_metres(c[:, 0], c[:, 1]))
+    ll = metres_to_latlon(shapely.get_coordinates(shapely.centroid(shapely.transform(gdf.geometry.to_numpy(), to_m))))
+    col = lambda c: gdf[c] if c in gdf.columns else pd.Series(np.nan, index=gdf.index, dtype=object)
+    fee = col("fee").map({"yes": 1.0, "no": 0.0})
+    return pd.DataFrame({
+        "name": col("name").fillna("OSM parking").astype(str).to_numpy(), "source": "osm",
+        "lat": ll[:, 0], "lon": ll[:, 1],
+        "capacity": pd.to_numeric(col("capacity"), errors="coerce").to_numpy(float),
+        "permit": col("access").map(OSM_ACCESS).fillna("none").to_numpy(),
+        "fee": fee.to_numpy(float), "max_stay_min": np.nan,
+    }, columns=COLUMNS).astype(DTYPES)
+
+
+def load_osm_parking(path: str = OSM_PARKING_FILE) -> pd.DataFrame:
+    return pd.read_csv(path, dtype={"name": str, "source": str, "permit": str})[COLUMNS].astype(DTYPES)
+
+
+def _local_km(lat, lon, lat0: float) -> np.ndarray:
+    """Equirectangular km about lat0; within the territory distances are off by well under 1%."""
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    return np.column_stack([lon * KM_PER_DEG_LON_EQ * math.cos(math.radians(lat0)), lat * KM_PER_DEG_LAT])
+
+
+def _haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(np.radians(lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def _stack(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Row-concatenate index tables column by column (pd.concat warns about all-NaN columns)."""
+    return pd.DataFrame({c: np.concatenate([f[c].to_numpy() for f in frames]) for c in COLUMNS}).astype(DTYPES)
+
+
+def merge_sites(curated: pd.DataFrame, osm: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Curated sites (P&R, smart parking) plus the OSM lots that are not within DEDUP_M of one.
+    A curated site with no known capacity takes it from the OSM lot it matched.
+    """
+    curated = curated.reset_index(drop=True)
+    if osm is None or osm.empty or curated.empty:
+        return _stack([curated, osm]) if osm is not None else curated
+    lat0 = float(curated["lat"].mean())
+    d, j = cKDTree(_local_km(curated["lat"], curated["lon"], lat0)).query(
+        _local_km(osm["lat"], osm["lon"], lat0), distance_upper_bound=DEDUP_M / 1000.0)
+    dup = np.isfinite(d)
+    matched = pd.Series(osm["capacity"].to_numpy()[dup], index=j[dup]).groupby(level=0).max()
+    fill = curated["capacity"].isna() & curated.index.isin(matched.index)
+    curated.loc[fill, "capacity"] = matched.reindex(curated.index[fill]).to_numpy()
+    return _stack([curated, osm[~dup]])
+
+
+class ParkingIndex:
+    """The merged parking table with a KD-tree over it; rows are never reordered after build."""
+
+    def __init__(self, table: pd.DataFrame):
+        self.table = table.dropna(subset=["lat", "lon"]).reset_index(drop=True)[COLUMNS]
+        self.lat0 = float(self.table["lat"].mean()) if len(self.table) else -35.3
+        self._lat = self.table["lat"].to_numpy(float)
+        self._lon = self.table["lon"].to_numpy(float)
+        self._masks: Dict[Tuple[Tuple[str, ...], Optional[float]], np.ndarray] = {}
+        self.tree = cKDTree(_local_km(self._lat, self._lon, self.lat0)) if len(self.table) else None
+
+    @classmethod
+    def from_sources(cls, pr_df: pd.DataFrame, smart_df: Optional[pd.DataFrame] = None,
+                     osm_df: Optional[pd.DataFrame] = None) -> "ParkingIndex":
+        curated = [park_ride_sites(pr_df)] + ([smart_parking_sites(smart_df)] if smart_df is not None else [])
+        return cls(merge_sites(_stack(curated), osm_df))
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def _allowed(self, idx: np.ndarray, exclude_permits: Iterable[str], min_stay_min: Optional[float]) -> np.ndarray:
+        key = (tuple(sorted(exclude_permits)), min_stay_min)
+        mask = self._masks.get(key)
+        if mask is None:  # a handful of filters are ever used; each is one pass over the table
+            mask = ~self.table["permit"].isin(key[0]).to_numpy()
+            if min_stay_min is not None:
+                stay = self.table["max_stay_min"].to_numpy(float)
+                mask &= np.isnan(stay) | (stay >= min_stay_min)
+            self._masks[key] = mask
+        return idx[mask[idx]]
+
+    def near(self, lat: float, lon: float, radius_km: float, exclude_permits: Iterable[str] = (),
+             min_stay_min: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Row positions of sites within radius_km (great-circle) and their distances, nearest first."""
+        if self.tree is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        idx = np.asarray(self.tree.query_ball_point(_local_km(lat, lon, self.lat0)[0], radius_km * 1.01), dtype=np.int64)
+        idx = self._allowed(idx, exclude_permits, min_stay_min)
+        km = _haversine_km(lat, lon, self._lat[idx], self._lon[idx])
+        keep = km <= radius_km
+        order = np.argsort(km[keep], kind="stable")
+        return idx[keep][order], km[keep][order]
+
+    def nearest(self, lat: float, lon: float, k: int, exclude_permits: Iterable[str] = (),
+                min_stay_min: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """The k nearest allowed sites, however far, nearest first."""
+        if self.tree is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        n = len(self.table)
+        want = k
+        while True:  # widen until k allowed sites are found or the table runs out
+            _, idx = self.tree.query(_local_km(lat, lon, self.lat0)[0], k=min(want, n))
+            idx = self._allowed(np.atleast_1d(idx).astype(np.int64), exclude_permits, min_stay_min)
+            if len(idx) >= k or want >= n:
+                break
+            want *= 4
+        km = _haversine_km(lat, lon, self._lat[idx], self._lon[idx])
+        order = np.argsort(km, kind="stable")[:k]
+        return idx[order], km[order]
+
+    def rows(self, idx: np.ndarray, km: np.ndarray) -> List[Dict[str, Any]]:
+        out = self.table.iloc[idx].to_dict(orient="records")
+        for r, d in zip(out, km):
+            r["km"] = float(d)
+        return out
+
+    def describe(self) -> Dict[str, Any]:
+        return {"sites": len(self.table), "by_source": self.table["source"].value_counts().to_dict(),
+                "with_capacity": int(self.table["capacity"].notna().sum())}
+
+
+def main():
+    from .bundle import DATA_FILES, load_park_ride
+    from .utils import find_data
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("extract", help="Fetch the territory's OSM parking once and save it")
+    ex.add_argument("--out", default=OSM_PARKING_FILE)
+    ex.add_argument("--place", default=PLACE_NAME)
+    q = sub.add_parser("query", help="Sites near a point from the local index")
+    q.add_argument("lat", type=float)
+    q.add_argument("lon", type=float)
+    q.add_argument("--km", type=float, default=3.0)
+    args = ap.parse_args()
+
+    if args.cmd == "extract":
+        osm = extract_osm_parking(args.place)
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        osm.to_csv(args.out, index=False)
+        print(f"{len(osm)} OSM parking sites ({int(osm['capacity'].notna().sum())} with capacity) -> {args.out}")
+        return
+
+    osm = load_osm_parking() if os.path.exists(OSM_PARKING_FILE) else None
+    index = ParkingIndex.from_sources(load_park_ride(find_data(DATA_FILES["park_ride"])),
+                                      load_smart_parking(find_data(DATA_FILES["smart_parking"])), osm)
+    print(index.describe())
+    idx, km = index.near(args.lat, args.lon, args.km)
+    for r in index.rows(idx, km):
+        cap = "?" if pd.isna(r["capacity"]) else int(r["capacity"])
+        print(f"{r['km']:6.2f} km  {r['source']:<13} {r['permit']:<10} cap {cap:>4}  {r['name']}")
+
+
+if __name__ == "__main__":
+    main()
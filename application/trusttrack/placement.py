@@ -0,0 +1,345 @@
+"""
+Trust Track - school-bus stop placement
+Proposes boarding stops from census demand. Each school's enrolment in the latest census is
+spread over street nodes sampled around it. Walk risk-minutes from those origins to candidate
+stops (a street-node grid plus today's boarding points) come from WalkMatrixGraph, and the
+bus leg's risk to the school is added. A greedy start and a swap local search then pick the
+stop set with the fewest total risk-minutes; an origin whose open stops all cost more than
+walking walks to school instead. Swaps are scored by fast interchange: every (remove, add)
+pair's cost change comes from each origin's best and second-best open cost in a few
+vectorised passes over the sparse origin x stop costs, so nothing is re-evaluated per swap.
+
+    python -m trusttrack.placement                         # as many stops as there are today
+    python -m trusttrack.placement --keep-existing --stops 20 --out new_stops.csv
+"""
+
+import argparse
+import json
+import math
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from .bundle import BUNDLE_DIR, DATA_FILES, GAZETTEER_FILE, current_version, load_bus_stops
+from .catchment import CENSUS_CSV, RADIUS_KM
+from .matrix import WalkMatrixGraph
+from .routing import (BUS_BASE_SAFETY_DEFAULT, BUS_BUFFER_MIN_DEFAULT, BUS_SPEED_KMH_DEFAULT,
+                      MAX_WALK_TO_BOARD_MIN, MIN_BUS_MINUTES_TO_COUNT)
+from .tiles import TileStore
+from .utils import build_graph_bbox, find_data, geocode_in_act, slugify
+
+ORIGINS_PER_SCHOOL = 200
+CANDIDATE_SPACING_M = 300.0
+EXCLUDED_LEVELS = ("preschool", "mature")  # not on the school run
+SEARCH_CHUNK = 64      # candidate stops per matrix call; bounds the dense origins x chunk block
+
+
+def _km(lat, lon, lat0: float) -> np.ndarray:
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    return np.column_stack([lon * 111.32 * math.cos(math.radians(lat0)), lat * 111.32])
+
+
+def school_demand(path: str = CENSUS_CSV, census: Optional[str] = None) -> pd.Series:
+    """Students per school in the latest census (or the one dated census), largest first."""
+    df = pd.read_csv(find_data(path))
+    when = pd.to_datetime(df["Census"], format="%d %B %Y", errors="coerce")
+    pick = when == (pd.Timestamp(census) if census else when.max())
+    level = df["Year Level"].astype(str).str.strip().str.lower()
+    df = df[pick & ~level.isin(EXCLUDED_LEVELS)]
+    students = df.groupby(df["School Name"].astype(str).str.strip())["Students"].sum()
+    return students[students > 0].sort_values(ascending=False)
+
+
+def school_locations(names: Iterable[str], bus_df: Optional[pd.DataFrame] = None,
+                     gazetteer: Optional[Dict[str, Dict[str, Any]]] = None,
+                     geocode: bool = True) -> Tuple[Dict[str, Tuple[float, float]], Dict[str, str]]:
+    """({name: (lat, lon)}, {name: error}) from the bus CSV's school points, the gazetteer, then geocoding."""
+    known: Dict[str, Tuple[float, float]] = {}
+    if bus_df is not None:
+        for name, lat, lon in bus_df[["School Name", "lat", "lon"]].itertuples(index=False):
+            known.setdefault(slugify(str(name)), (float(lat), float(lon)))
+    for slug, hit in (gazetteer or {}).items():
+        known.setdefault(slug, (hit["lat"], hit["lon"]))
+    found, failed = {}, {}
+    for name in names:
+        ll = known.get(slugify(name))
+        if ll is None and geocode:
+            try:
+                ll = geocode_in_act(name)
+            except Exception as e:
+                failed[name] = str(e)
+                continue
+        if ll is None:
+            failed[name] = "no location"
+        else:
+            found[name] = ll
+    return found, failed
+
+
+class StopProblem:
+    """
+    Origins x candidate stops as sparse (origin, stop, cost) entries sorted by origin then cost.
+    Each origin also has an entry in the always-open last column (index n_stops) holding the
+    cost of walking the whole way. cost is walk plus bus risk-minutes; weight is students.
+    """
+
+    def __init__(self, row: np.ndarray, col: np.ndarray, cost: np.ndarray, minutes: np.ndarray,
+                 walk_cost: np.ndarray, weight: np.ndarray, school: np.ndarray, stops: pd.DataFrame):
+        self.n_origins, self.n_stops = len(weight), len(stops)
+        origins = np.arange(self.n_origins)
+        row = np.concatenate([row, origins])
+        cost = np.concatenate([cost, walk_cost])
+        order = np.lexsort((cost, row))
+        self.row, self.cost = row[order], cost[order]
+        self.col = np.concatenate([col, np.full(self.n_origins, self.n_stops)])[order]
+        self.minutes = np.concatenate([minutes, np.full(self.n_origins, np.nan)])[order]
+        self.weight = np.asarray(weight, dtype=float)
+        self.w = self.weight[self.row]
+        self.school = school
+        self.stops = stops.reset_index(drop=True)
+        self.starts = np.searchsorted(self.row, origins)
+        self.by_col = np.argsort(self.col, kind="stable")
+        self.col_starts = np.searchsorted(self.col[self.by_col], np.arange(self.n_stops + 2))
+
+    @property
+    def existing(self) -> List[int]:
+        return np.flatnonzero(self.stops["existing"].to_numpy()).tolist()
+
+    def _open(self, stops: Iterable[int]) -> np.ndarray:
+        is_open = np.zeros(self.n_stops + 1, dtype=bool)
+        is_open[list(stops)] = True
+        is_open[-1] = True
+        return is_open
+
+    def assign(self, is_open: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Per origin: cheapest open column, its cost, and the second-cheapest open cost (inf if none)."""
+        op = is_open[self.col]
+        seen = np.cumsum(op)
+        rank = seen - (seen[self.starts] - op[self.starts])[self.row]
+        first, second = op & (rank == 1), op & (rank == 2)
+        nearest = np.empty(self.n_origins, dtype=np.int64)
+        best1 = np.empty(self.n_origins)
+        best2 = np.full(self.n_origins, np.inf)
+        nearest[self.row[first]] = self.col[first]
+        best1[self.row[first]] = self.cost[first]
+        best2[self.row[second]] = self.cost[second]
+        return nearest, best1, best2
+
+    def total(self, stops: Iterable[int]) -> float:
+        """Students' total risk-minutes with these stops open."""
+        return float(self.weight @ self.assign(self._open(stops))[1])
+
+    def _gain(self, best1: np.ndarray) -> np.ndarray:
+        """Risk-minutes saved by opening each column on its own."""
+        saved = self.w * np.maximum(0.0, best1[self.row] - self.cost)
+        return np.bincount(self.col, saved, minlength=self.n_stops + 1)
+
+    def greedy(self, p: int, fixed: Sequence[int] = ()) -> List[int]:
+        """Open up to p stops besides fixed, each the one saving the most; stops early when none saves."""
+        is_open = self._open(fixed)
+        best1 = self.assign(is_open)[1]
+        chosen: List[int] = []
+        while len(chosen) < p:
+            gain = self._gain(best1)
+            gain[is_open] = 0.0
+            a = int(np.argmax(gain))
+            if gain[a] <= 0.0:
+                break
+            is_open[a] = True
+            chosen.append(a)
+            e = self.by_col[self.col_starts[a]:self.col_starts[a + 1]]
+            np.minimum.at(best1, self.row[e], self.cost[e])
+        return list(fixed) + chosen
+
+    def improve(self, stops: Sequence[int], fixed: Sequence[int] = (), max_swaps: int = 10_000) -> Tuple[List[int], int]:
+        """
+        Steepest-descent swaps (close one open stop, open one closed) until none lowers the
+        total. For origin i with cheapest open cost b1 at stop r and second-cheapest b2,
+        closing r costs w(b2 - b1) and opening a saves w*max(0, b1 - c_ia); for the pairs
+        (r, a) where c_ia < b2 those two terms over-count by w(b2 - max(c_ia, b1)), which is
+        gathered sparsely. Returns (stops, swaps made).
+        """
+        n = self.n_stops + 1
+        is_open = self._open(stops)
+        movable = is_open.copy()
+        movable[list(fixed)] = False
+        movable[-1] = False
+        swaps = 0
+        while swaps < max_swaps:
+            nearest, best1, best2 = self.assign(is_open)
+            gain = self._gain(best1)
+            held = movable[nearest]
+            loss = np.bincount(nearest[held], (self.weight * (best2 - best1))[held], minlength=n)
+
+            b1, b2 = best1[self.row], best2[self.row]
+            e = np.flatnonzero(~is_open[self.col] & held[self.row] & (self.cost < b2))
+            pairs, inv = np.unique(nearest[self.row[e]] * n + self.col[e], return_inverse=True)
+            over = np.bincount(inv, self.w[e] * (b2[e] - np.maximum(self.cost[e], b1[e])), minlength=len(pairs))
+
+            loss_r = np.where(movable, loss, np.inf)
+            gain_a = np.where(is_open, -np.inf, gain)
+            r, a = int(np.argmin(loss_r)), int(np.argmax(gain_a))
+            delta = loss_r[r] - gain_a[a]
+            if len(pairs):
+                k = int(np.argmin(loss[pairs // n] - gain[pairs % n] - over))
+                if loss[pairs[k] // n] - gain[pairs[k] % n] - over[k] < delta:
+                    r, a = int(pairs[k] // n), int(pairs[k] % n)
+                    delta = loss[r] - gain[a] - over[k]
+            if not np.isfinite(delta) or delta >= -1e-9 * max(1.0, float(self.weight @ best1)):
+                break
+            is_open[r], movable[r] = False, False
+            is_open[a], movable[a] = True, True
+            swaps += 1
+        return np.flatnonzero(is_open[:-1]).tolist(), swaps
+
+    def solve(self, p: int, fixed: Sequence[int] = (), max_swaps: int = 10_000) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        start = self.greedy(p, fixed)
+        t1 = time.perf_counter()
+        stops, swaps = self.improve(start, fixed, max_swaps)
+        t2 = time.perf_counter()
+        return {"stops": stops, "greedy_total": self.total(start), "total": self.total(stops), "swaps": swaps,
+                "greedy_s": round(t1 - t0, 3), "search_s": round(t2 - t1, 3)}
+
+    def report(self, stops: Sequence[int]) -> pd.DataFrame:
+        """Open stops with the students boarding there, their mean walk and the schools they ride to."""
+        nearest = self.assign(self._open(stops))[0]
+        e = np.flatnonzero((self.col == nearest[self.row]) & (self.col < self.n_stops))
+        at = self.row[e]
+        w = self.weight[at]
+        students = np.bincount(self.col[e], w, minlength=self.n_stops)
+        walk = np.bincount(self.col[e], w * self.minutes[e], minlength=self.n_stops)
+        schools = pd.Series(self.school[at]).groupby(self.col[e]).nunique()
+        out = self.stops.iloc[list(stops)].copy()
+        out["students"] = np.round(students[stops], 1)
+        out["mean_walk_min"] = np.round(walk[stops] / np.maximum(students[stops], 1e-9), 1)
+        out["schools"] = schools.reindex(list(stops), fill_value=0).to_numpy()
+        return out.sort_values("students", ascending=False)
+
+
+def _bus_risk(stop_xy: np.ndarray, school_xy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(bus minutes, bus risk-minutes) per pair, as bus_minutes_estimate and compute_bus_options score them."""
+    bus_min = np.hypot(*(stop_xy - school_xy).T) / max(1e-6, BUS_SPEED_KMH_DEFAULT) * 60.0 + BUS_BUFFER_MIN_DEFAULT
+    return bus_min, (1 - BUS_BASE_SAFETY_DEFAULT / 100.0) * bus_min
+
+
+def build_problem(M: WalkMatrixGraph, demand: pd.Series, school_ll: Dict[str, Tuple[float, float]],
+                  existing: Sequence[Tuple[float, float]] = (), per_school: int = ORIGINS_PER_SCHOOL,
+                  radius_km: float = RADIUS_KM, spacing_m: float = CANDIDATE_SPACING_M,
+                  max_walk_min: float = MAX_WALK_TO_BOARD_MIN, seed: int = 0) -> StopProblem:
+    """
+    Sample origins on street nodes within radius_km of each located school (students split
+    evenly over them), lay candidate stops on a spacing_m grid of street nodes over the same
+    area plus the existing points, and keep the origin-stop pairs within max_walk_min whose
+    bus leg is long enough to count. One safest-walk search per candidate and per school.
+    """
+    rng = np.random.default_rng(seed)
+    names = [s for s in demand.index if s in school_ll]
+    lat0 = float(np.mean([school_ll[s][0] for s in names]))
+    node_xy = _km([M.G.nodes[n]["y"] for n in M.nodes], [M.G.nodes[n]["x"] for n in M.nodes], lat0)
+    school_xy = _km([school_ll[s][0] for s in names], [school_ll[s][1] for s in names], lat0)
+    school_node = M.snap([school_ll[s] for s in names])
+    near = cKDTree(node_xy).query_ball_point(school_xy, radius_km)
+
+    origin, school, weight = [], [], []
+    for k, (name, nodes) in enumerate(zip(names, near)):
+        if not nodes:
+            continue
+        pick = rng.choice(np.asarray(nodes, dtype=np.int64), size=min(per_school, len(nodes)), replace=False)
+        origin.append(pick)
+        school.append(np.full(len(pick), k))
+        weight.append(np.full(len(pick), demand[name] / len(pick)))
+    origin, school, weight = np.concatenate(origin), np.concatenate(school), np.concatenate(weight)
+
+    # the walk-in fallback; origins that cannot reach their school on foot are dropped
+    walk = M.node_matrix(origin, school_node, "safe")["risk_minutes"][np.arange(len(origin)), school]
+    keep = np.isfinite(walk)
+    origin, school, weight, walk = origin[keep], school[keep], weight[keep], walk[keep]
+
+    area = np.unique(np.concatenate([np.asarray(n, dtype=np.int64) for n in near]))
+    cell = np.floor(node_xy[area] * 1000.0 / spacing_m)
+    off = np.hypot(*(node_xy[area] * 1000.0 / spacing_m - cell - 0.5).T)
+    order = np.lexsort((off, cell[:, 1], cell[:, 0]))
+    _, first = np.unique(cell[order], axis=0, return_index=True)
+    grid = area[order[first]]
+    now = M.snap(existing) if len(existing) else np.empty(0, dtype=np.int64)
+    cand = np.concatenate([now, grid[~np.isin(grid, now)]])
+    cand, at = np.unique(cand, return_index=True)
+    cand = cand[np.argsort(at)]
+    stops = pd.DataFrame({"node": [M.nodes[i] for i in cand],
+                          "lat": [M.G.nodes[M.nodes[i]]["y"] for i in cand],
+                          "lon": [M.G.nodes[M.nodes[i]]["x"] for i in cand],
+                          "existing": np.isin(cand, now)})
+
+    rows, cols, costs, mins = [], [], [], []
+    for c0 in range(0, len(cand), SEARCH_CHUNK):
+        res = M.node_matrix(origin, cand[c0:c0 + SEARCH_CHUNK], "safe")
+        i, j = np.nonzero(res["minutes"] <= max_walk_min)
+        bus_min, bus_risk = _bus_risk(node_xy[cand[c0 + j]], school_xy[school[i]])
+        ok = bus_min >= MIN_BUS_MINUTES_TO_COUNT
+        i, j = i[ok], j[ok]
+        rows.append(i)
+        cols.append(c0 + j)
+        costs.append(res["risk_minutes"][i, j] + bus_risk[ok])
+        mins.append(res["minutes"][i, j])
+    return StopProblem(np.concatenate(rows), np.concatenate(cols), np.concatenate(costs),
+                       np.concatenate(mins), walk, weight, np.asarray(names)[school], stops)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--stops", type=int, help="stops to open (besides kept ones); default: as many as today")
+    ap.add_argument("--keep-existing", action="store_true", help="keep today's boarding points open")
+    ap.add_argument("--census", help="census date, e.g. '14 February 2025' (default: latest)")
+    ap.add_argument("--per-school", type=int, default=ORIGINS_PER_SCHOOL)
+    ap.add_argument("--radius-km", type=float, default=RADIUS_KM)
+    ap.add_argument("--spacing-m", type=float, default=CANDIDATE_SPACING_M)
+    ap.add_argument("--max-walk-min", type=float, default=MAX_WALK_TO_BOARD_MIN)
+    ap.add_argument("--max-swaps", type=int, default=10_000)
+    ap.add_argument("--no-geocode", action="store_true", help="only schools with a known location")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="write the proposed stops to this CSV")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    demand = school_demand(census=args.census)
+    bus_df = load_bus_stops(find_data(DATA_FILES["school_bus"]))
+    version = current_version()
+    gazetteer_path = Path(BUNDLE_DIR) / version / GAZETTEER_FILE if version else None
+    gazetteer = json.loads(gazetteer_path.read_text(encoding="utf-8")) if gazetteer_path and gazetteer_path.exists() else {}
+    located, failed = school_locations(demand.index, bus_df, gazetteer, geocode=not args.no_geocode)
+    for name, err in sorted(failed.items()):
+        print(f"  not located: {name}: {err}")
+    lls = np.array(list(located.values()))
+    sw, ne = tuple(lls.min(axis=0)), tuple(lls.max(axis=0))
+    tiles = TileStore.open()
+    G = tiles.graph_bbox(sw, ne, args.radius_km + 1.0) if tiles else build_graph_bbox(sw, ne, args.radius_km + 1.0)
+    existing = bus_df[["lat", "lon"]].drop_duplicates().to_numpy()
+    print(f"{len(located)} schools, {demand[list(located)].sum():.0f} students; "
+          f"walk graph {G.number_of_nodes()} nodes ({time.perf_counter() - t0:.0f} s)")
+
+    t0 = time.perf_counter()
+    problem = build_problem(WalkMatrixGraph(G), demand, located, existing, args.per_school, args.radius_km,
+                            args.spacing_m, args.max_walk_min, args.seed)
+    print(f"{problem.n_origins} origins x {problem.n_stops} candidate stops, "
+          f"{len(problem.row) - problem.n_origins} walkable pairs ({time.perf_counter() - t0:.0f} s)")
+
+    fixed = problem.existing if args.keep_existing else []
+    p = args.stops if args.stops is not None else len(problem.existing)
+    result = problem.solve(p, fixed, args.max_swaps)
+    print(f"total risk-minutes: walking only {problem.total([]):.0f}, today's points {problem.total(problem.existing):.0f}, "
+          f"greedy {result['greedy_total']:.0f} ({result['greedy_s']} s), "
+          f"after {result['swaps']} swaps {result['total']:.0f} ({result['search_s']} s)")
+    table = problem.report(result["stops"])
+    print(table.head(20).to_string(index=False))
+    if args.out:
+        table.to_csv(args.out, index=False)
+        print(f"{len(table)} stops -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Trust Track - compact route geometry
+Douglas-Peucker simplification and Google encoded polylines (precision 6) for the opt-in
+compact response format, which also drops the walk coordinates duplicated in the GeoJSON.
+"""
+
+import copy
+import math
+from typing import Dict, Any, List, Sequence
+
+import numpy as np
+
+POLYLINE_PRECISION = 6
+DEFAULT_ZOOM = 16
+EARTH_CIRCUMFERENCE_M = 40075016.686
+
+
+def tolerance_for_zoom(zoom: int, lat: float) -> float:
+    """Ground size in metres of one 256px web-mercator tile pixel at this zoom and latitude."""
+    return EARTH_CIRCUMFERENCE_M * math.cos(math.radians(lat)) / (256 * 2 ** zoom)
+
+
+def simplify_coords(coords: Sequence[Sequence[float]], tolerance_m: float) -> np.ndarray:
+    """Douglas-Peucker over [lat, lon] pairs, measured in a local equirectangular metre frame."""
+    ll = np.asarray(coords, dtype=float).reshape(-1, 2)
+    n = len(ll)
+    if n < 3 or tolerance_m <= 0:
+        return ll
+    k = 111320.0
+    xy = np.column_stack([(ll[:, 1] - ll[0, 1]) * k * math.cos(math.radians(ll[0, 0])),
+                          (ll[:, 0] - ll[0, 0]) * k])
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        a, b = xy[i], xy[j]
+        seg = b - a
+        pts = xy[i + 1:j] - a
+        seg_len2 = float(seg @ seg)
+        if seg_len2 == 0.0:
+            d = np.hypot(pts[:, 0], pts[:, 1])
+        else:
+            t = np.clip(pts @ seg / seg_len2, 0.0, 1.0)
+            d = np.hypot(pts[:, 0] - t * seg[0], pts[:, 1] - t * seg[1])
+        m = int(np.argmax(d))
+        if d[m] > tolerance_m:
+            keep[i + 1 + m] = True
+            stack.append((i, i + 1 + m))
+            stack.append((i + 1 + m, j))
+    return ll[keep]
+
+
+def _encode_value(v: int, out: List[str]) -> None:
+    v = ~(v << 1) if v < 0 else (v << 1)
+    while v >= 0x20:
+        out.append(chr((0x20 | (v & 0x1f)) + 63))
+        v >>= 5
+    out.append(chr(v + 63))
+
+
+def encode_polyline(coords: Sequence[Sequence[float]], precision: int = POLYLINE_PRECISION) -> str:
+    """Encode [lat, lon] pairs with the Google polyline algorithm."""
+    factor = 10 ** precision
+    out: List[str] = []
+    prev_lat = prev_lon = 0
+    for ilat, ilon in np.rint(np.asarray(coords, dtype=float).reshape(-1, 2) * factor).astype(np.int64).tolist():
+        _encode_value(ilat - prev_lat, out)
+        _encode_value(ilon - prev_lon, out)
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
+
+def decode_polyline(s: str, precision: int = POLYLINE_PRECISION) -> List[List[float]]:
+    """Inverse of encode_polyline; mirrors the decoder in frontend/app.js."""
+    factor = float(10 ** precision)
+    coords, index, lat, lon = [], 0, 0, 0
+    while index < len(s):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(s[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else (result >> 1))
+        lat += deltas[0]
+        lon += deltas[1]
+        coords.append([lat / factor, lon / factor])
+    return coords
+
+
+def compact_route_payload(payload: Dict[str, Any], zoom: int = DEFAULT_ZOOM) -> Dict[str, Any]:
+    """
+    Compact copy of a /api/route payload: every LineString in the GeoJSON is simplified for the
+    zoom level and encoded, and walk.*.coords is dropped because the GeoJSON already carries it.
+    """
+    out = copy.copy(payload)
+    lat = float(payload["origin"]["lat"])
+    tol = tolerance_for_zoom(zoom, lat)
+
+    features = []
+    for f in payload["geojson"]["features"]:
+        geom = f.get("geometry") or {}
+        if geom.get("type") == "LineString":
+            coords_ll = np.asarray(geom["coordinates"], dtype=float).reshape(-1, 2)[:, ::-1]
+            simple = simplify_coords(coords_ll, tol)
+            f = dict(f, geometry={"type": "EncodedPolyline", "precision": POLYLINE_PRECISION,
+                                  "points": len(simple), "polyline": encode_polyline(simple)})
+        features.append(f)
+    out["geojson"] = dict(payload["geojson"], features=features)
+
+    walk = {}
+    for key, leg in (payload.get("walk") or {}).items():
+        walk[key] = {k: v for k, v in leg.items() if k != "coords"} if isinstance(leg, dict) else leg
+    out["walk"] = walk
+    out["geometry_format"] = {"encoding": f"polyline{POLYLINE_PRECISION}", "zoom": zoom,
+                              "tolerance_m": round(tol, 2)}
+    return out
@@ -0,0 +1,206 @@
+"""
+Trust Track - on-demand request profiling
+A sampling profiler for one request at a time. While the profiled call runs, a daemon thread
+reads that call's Python stack every SAMPLE_INTERVAL_MS through sys._current_frames(). Identical
+stacks are summed together. The result is kept in a bounded on-disk ring of recent profiles,
+as a speedscope file or collapsed stacks for flamegraph.pl / inferno. Nothing here runs unless
+a request asks for it.
+
+    python -m trusttrack.profiling list
+    python -m trusttrack.profiling show <id> --format collapsed > route.folded
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PROFILE_DIR = os.environ.get("TRUSTTRACK_PROFILE_DIR", "./.trusttrack_profiles")
+PROFILE_KEEP = int(os.environ.get("TRUSTTRACK_PROFILE_KEEP", "50"))
+SAMPLE_INTERVAL_MS = float(os.environ.get("TRUSTTRACK_PROFILE_INTERVAL_MS", "2"))
+FORMATS = ("speedscope", "collapsed")
+PROFILE_ID = re.compile(r"^\d{8}T\d{9}-[0-9a-f]{8}$")  # sorts by creation time
+
+APP_ROOT = Path(__file__).resolve().parent.parent
+
+Frame = Tuple[str, str, int]  # function, file, first line
+
+
+def _short_file(path: str) -> str:
+    """Paths relative to the app or to site-packages, so profiles read the same on any machine."""
+    for marker in ("site-packages" + os.sep, str(APP_ROOT) + os.sep):
+        i = path.find(marker)
+        if i >= 0:
+            return path[i + len(marker):]
+    return path
+
+
+class Sampler:
+    """Samples one thread's stack on a timer until closed; use as a context manager in that thread."""
+
+    def __init__(self, thread_id: Optional[int] = None, interval_ms: float = SAMPLE_INTERVAL_MS):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval_ms = interval_ms
+        self.stacks: Counter = Counter()  # stack -> ms
+        self.samples = 0
+        self.duration_ms = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trusttrack-sampler", daemon=True)
+
+    def _run(self) -> None:
+        # The sampler needs the GIL to look, so ticks land late under load; each stack is
+        # weighted by the wall time since the previous one rather than by the nominal interval.
+        interval, frames, clock = self.interval_ms / 1000.0, sys._current_frames, time.perf_counter
+        last = self._t0
+        while not self._stop.wait(interval):
+            f = frames().get(self.thread_id)
+            now = clock()
+            stack = []
+            while f is not None:
+                code = f.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                f = f.f_back
+            if stack and not self._stop.is_set():
+                key = tuple(reversed(stack))
+                self.stacks[key] += (now - last) * 1000.0
+                self.samples += 1
+            last = now
+
+    def __enter__(self) -> "Sampler":
+        self._t0 = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration_ms = (time.perf_counter() - self._t0) * 1000.0
+
+
+# Output formats
+
+def to_collapsed(stacks: Dict[Tuple[Frame, ...], float]) -> str:
+    """Brendan Gregg's folded format: 'root;caller;callee weight' per distinct stack, weights in µs."""
+    label = lambda fr: f"{fr[0]} ({_short_file(fr[1])}:{fr[2]})".replace(";", ":")
+    return "".join(f"{';'.join(label(fr) for fr in stack)} {round(ms * 1000)}\n" for stack, ms in stacks.items())
+
+
+def to_speedscope(stacks: Dict[Tuple[Frame, ...], float], name: str) -> Dict[str, Any]:
+    """A speedscope 'sampled' profile; each distinct stack appears once, weighted by its time."""
+    index: Dict[Frame, int] = {}
+    frames: List[Dict[str, Any]] = []
+    samples, weights = [], []
+    for stack, ms in stacks.items():
+        ids = []
+        for fr in stack:
+            if fr not in index:
+                index[fr] = len(frames)
+                frames.append({"name": fr[0], "file": _short_file(fr[1]), "line": fr[2]})
+            ids.append(index[fr])
+        samples.append(ids)
+        weights.append(round(ms, 3))
+    total = sum(weights)
+    return {"$schema": "https://www.speedscope.app/file-format-schema.json", "exporter": "trusttrack",
+            "name": name, "activeProfileIndex": 0, "shared": {"frames": frames},
+            "profiles": [{"type": "sampled", "name": name, "unit": "milliseconds", "startValue": 0,
+                          "endValue": total, "samples": samples, "weights": weights}]}
+
+
+# The ring
+
+class ProfileStore:
+    """The last `keep` profiles as <id>.json files; older ones are deleted as new ones arrive."""
+
+    def __init__(self, root: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.root, self.keep = Path(root), keep
+        self._lock = threading.Lock()
+
+    def run(self, label: str, fn: Callable[..., Any], *args: Any, meta: Optional[Callable[[], Dict[str, Any]]] = None
+            ) -> Tuple[Any, str]:
+        """fn(*args) under a Sampler in the calling thread; the profile is saved even if fn raises."""
+        now = time.time()
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(now)) + f"{int(now * 1000) % 1000:03d}"
+        pid = f"{stamp}-{uuid.uuid4().hex[:8]}"
+        sampler, error = Sampler(), None
+        try:
+            with sampler:
+                return fn(*args), pid
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.save(pid, sampler, label, error, meta() if meta is not None else {})
+
+    def save(self, pid: str, sampler: Sampler, label: str, error: Optional[str] = None,
+             extra: Optional[Dict[str, Any]] = None) -> str:
+        doc = {"id": pid, "label": label, "created": time.time(), "duration_ms": round(sampler.duration_ms, 3),
+               "interval_ms": sampler.interval_ms, "samples": sampler.samples, "error": error,
+               **(extra or {}),
+               "stacks": [[list(map(list, stack)), round(ms, 3)] for stack, ms in sampler.stacks.items()]}
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = self.root / f".{pid}.tmp"
+            tmp.write_text(json.dumps(doc), encoding="utf-8")
+            os.replace(tmp, self.root / f"{pid}.json")
+            for old in sorted(self.root.glob("*.json"))[:-self.keep or None]:
+                old.unlink(missing_ok=True)
+        return pid
+
+    def load(self, pid: str) -> Optional[Dict[str, Any]]:
+        if not PROFILE_ID.match(pid):
+            return None
+        try:
+            doc = json.loads((self.root / f"{pid}.json").read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        doc["stacks"] = {tuple(tuple(fr) for fr in stack): ms for stack, ms in doc["stacks"]}
+        return doc
+
+    def render(self, pid: str, fmt: str = "speedscope") -> Optional[Any]:
+        doc = self.load(pid)
+        if doc is None:
+            return None
+        if fmt == "collapsed":
+            return to_collapsed(doc["stacks"])
+        return to_speedscope(doc["stacks"], f"{doc['label']} ({doc['id']})")
+
+    def list(self) -> List[Dict[str, Any]]:
+        out = []
+        for p in sorted(self.root.glob("*.json"), reverse=True):
+            try:
+                doc = json.loads(p.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            out.append({k: doc.get(k) for k in ("id", "label", "created", "duration_ms", "samples", "error")})
+        return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=("list", "show"))
+    ap.add_argument("id", nargs="?")
+    ap.add_argument("--format", choices=FORMATS, default="collapsed")
+    ap.add_argument("--dir", default=PROFILE_DIR)
+    args = ap.parse_args()
+
+    store = ProfileStore(args.dir)
+    if args.command == "list":
+        for p in store.list():
+            print(f"{p['id']}  {p['duration_ms']:9.1f} ms  {p['samples']:6d} samples  {p['label']}"
+                  + (f"  [{p['error']}]" if p["error"] else ""))
+        return
+    out = store.render(args.id or "", args.format)
+    if out is None:
+        sys.exit(f"No profile {args.id} in {args.dir}")
+    sys.stdout.write(out if isinstance(out, str) else json.dumps(out))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,496 @@
+"""
+Trust Track - unsafe-stop reports
+Crowd-sourced hazard reports ("report unsafe stop"). Accepted reports are appended to a
+write-ahead log of JSON lines. Writes are group-committed: everything submitted during one
+FSYNC_INTERVAL_MS window goes out in one write and one fsync, and each request is answered
+once its batch is durable. A background task then snaps committed reports to the nearest school
+bus stop and to the nearest walk-graph edge, found through the tiled walk graph's per-tile
+spatial index. Without tiles, reports are grouped into CELL_DEG grid cells instead. The
+per-stop and per-edge counts are the only thing queries read. "Reports near this route" is a
+radius search over those aggregate entries, not a scan of raw reports.
+
+The aggregate is snapshotted (fsynced, then renamed) with the log position it reflects. On start
+the snapshot is loaded and only the log written after it is replayed; an unreadable snapshot is
+dropped and the whole log replayed. A torn last line from a crash is truncated.
+
+    python -m trusttrack.reports stats
+    python -m trusttrack.reports rebuild      # drop the snapshot and replay the whole log
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.spatial import cKDTree
+
+from .metrics import REPORTS_AGG_LAG, REPORTS_BATCH, REPORTS_COMMIT_SECONDS, REPORTS_INGESTED
+from .serialization import dumps
+from .tiles import TileStore, tile_of
+
+REPORTS_DIR = os.environ.get("TRUSTTRACK_REPORTS_DIR", "./.trusttrack_reports")
+FSYNC_INTERVAL_MS = float(os.environ.get("TRUSTTRACK_REPORTS_FSYNC_MS", "20"))
+SEGMENT_BYTES = 64 * 1024 * 1024
+SNAPSHOT_EVERY_S = 60.0
+INDEX_REFRESH_S = 1.0         # queries see the aggregate at most this stale
+STOP_SNAP_M = 60.0
+EDGE_SNAP_M = 40.0
+CELL_DEG = 0.0005             # ~55 m x 45 m fallback cells when there are no walk tiles
+EDGE_TILE_CACHE = 64          # per-tile edge indexes kept
+NEAR_MAX_SAMPLES = 20000      # route samples per near query; longer routes need a larger radius
+CATEGORIES = ("traffic", "crossing", "footpath", "lighting", "behaviour", "other")
+MAX_TEXT = 1000
+SNAPSHOT = "aggregate.json"
+
+M_PER_DEG = 111320.0
+COS_LAT = float(np.cos(np.radians(-35.3)))  # one local projection for the whole ACT; metres are what the radii need
+
+Position = Tuple[int, int]  # (segment number, byte offset)
+
+
+def _xy(lat, lon) -> np.ndarray:
+    """Local metres, good to well under 1% across the territory."""
+    return np.column_stack([np.asarray(lon, dtype=float) * M_PER_DEG * COS_LAT,
+                            np.asarray(lat, dtype=float) * M_PER_DEG])
+
+
+# Write-ahead log
+
+class _Batch:
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+        self.done: Optional[asyncio.Future] = None
+
+
+class ReportLog:
+    """
+    Segments wal-<n>.jsonl under root. submit() returns once the report's batch is fsynced;
+    committed batches are handed to `on_commit(records, end_position)` in log order.
+    """
+
+    def __init__(self, root: Path, interval_ms: float = FSYNC_INTERVAL_MS, segment_bytes: int = SEGMENT_BYTES):
+        self.root = root
+        self.interval = interval_ms / 1000.0
+        self.segment_bytes = segment_bytes
+        self.next_id = 1
+        self.on_commit = None
+        self._batch = _Batch()
+        self._wake: Optional[asyncio.Event] = None
+        self._file = None
+        self._segment = 0
+        self._torn: Optional[int] = None  # offset to cut back to after a write that failed part-way
+
+    def segments(self) -> List[Tuple[int, Path]]:
+        return sorted((int(p.stem.split("-")[1]), p) for p in self.root.glob("wal-*.jsonl"))
+
+    def replay(self, start: Position = (0, 0)) -> Iterator[Tuple[Dict[str, Any], Position]]:
+        """Records after `start`, each with the position just past it; truncates a torn tail."""
+        segs = self.segments()
+        for i, (n, path) in enumerate(segs):
+            if n < start[0]:
+                continue
+            with open(path, "rb+") as f:
+                offset = start[1] if n == start[0] else 0
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        if i == len(segs) - 1:
+                            f.truncate(offset)
+                        break
+                    offset += len(line)
+                    yield json.loads(line), (n, offset)
+
+    def open(self) -> Position:
+        self.root.mkdir(parents=True, exist_ok=True)
+        segs = self.segments()
+        self._segment = segs[-1][0] if segs else 1
+        self._file = self._open_segment()
+        self._wake = asyncio.Event()
+        return self._segment, self._file.tell()
+
+    def _open_segment(self):
+        # unbuffered, so a failed write leaves nothing behind in a buffer to be flushed later
+        return open(self.root / f"wal-{self._segment:06d}.jsonl", "ab", buffering=0)
+
+    def close(self) -> None:
+        self._wake = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def submit(self, records: List[Dict[str, Any]]) -> List[int]:
+        """Assign ids and wait until the records are on disk."""
+        if self._wake is None:
+            raise RuntimeError("Report log is not running")
+        b = self._batch
+        if b.done is None:
+            b.done = asyncio.get_running_loop().create_future()
+            self._wake.set()
+        ids = list(range(self.next_id, self.next_id + len(records)))
+        self.next_id += len(records)
+        for i, r in zip(ids, records):
+            r["id"] = i
+        b.records.extend(records)
+        await asyncio.shield(b.done)
+        return ids
+
+    def _cut(self, offset: int) -> None:
+        self._file.truncate(offset)
+        self._file.seek(offset)
+        os.fsync(self._file.fileno())
+        self._torn = None
+
+    def _write(self, data: bytes) -> Position:
+        """
+        Append and fsync one batch. If that fails, whatever part of it reached the segment is cut
+        off again (now, or before the next write if the cut fails too), so a rejected batch never
+        sits in the log ahead of later ones.
+        """
+        if self._torn is not None:
+            self._cut(self._torn)
+        if self._file.tell() >= self.segment_bytes:
+            self._file.close()
+            self._segment += 1
+            self._file = self._open_segment()
+        start = self._file.tell()
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[self._file.write(view):]
+            os.fsync(self._file.fileno())
+        except OSError:
+            self._torn = start
+            try:
+                self._cut(start)
+            except OSError:
+                pass
+            raise
+        return self._segment, self._file.tell()
+
+    async def run(self) -> None:
+        """Group commit: sleep one interval after the first pending report, then write and fsync the lot."""
+        wake = self._wake
+        while True:
+            await wake.wait()
+            await asyncio.sleep(self.interval)
+            batch, self._batch = self._batch, _Batch()
+            wake.clear()
+            data = b"".join(dumps(r) + b"\n" for r in batch.records)
+            t0 = time.perf_counter()
+            try:
+                pos = await asyncio.to_thread(self._write, data)
+            except OSError as e:
+                batch.done.set_exception(e)
+                continue
+            REPORTS_COMMIT_SECONDS.observe(time.perf_counter() - t0)
+            REPORTS_BATCH.observe(len(batch.records))
+            for r in batch.records:
+                REPORTS_INGESTED.inc(category=r["category"])
+            batch.done.set_result(None)
+            if self.on_commit is not None:
+                self.on_commit(batch.records, pos)
+
+
+# Snapping
+
+class Snapper:
+    """Nearest bus stop and nearest walk edge (or grid cell) for batches of points."""
+
+    def __init__(self, stops: Optional[pd.DataFrame] = None, tiles: Optional[TileStore] = None):
+        self.stop_keys: List[str] = []
+        self.stop_names: Dict[str, str] = {}
+        self.stop_ll = np.empty((0, 2))
+        if stops is not None and len(stops):
+            s = stops.dropna(subset=["lat", "lon"]).drop_duplicates(subset=["lat", "lon"])
+            self.stop_ll = s[["lat", "lon"]].to_numpy(dtype=float)
+            self.stop_keys = [f"{a:.5f},{b:.5f}" for a, b in self.stop_ll]
+            names = (s["Address"] if "Address" in s else s.get("School Name", pd.Series("", index=s.index)))
+            self.stop_names = dict(zip(self.stop_keys, names.fillna("").astype(str)))
+        self._stop_tree = cKDTree(_xy(self.stop_ll[:, 0], self.stop_ll[:, 1])) if len(self.stop_ll) else None
+        self.tiles = tiles
+        self._edge_index: "OrderedDict[Any, Any]" = OrderedDict()
+
+    def stops(self, lat: np.ndarray, lon: np.ndarray) -> List[Optional[str]]:
+        if self._stop_tree is None:
+            return [None] * len(lat)
+        d, i = self._stop_tree.query(_xy(lat, lon), distance_upper_bound=STOP_SNAP_M)
+        return [self.stop_keys[j] if np.isfinite(dd) else None for dd, j in zip(d, i)]
+
+    def _tile_edges(self, key):
+        """(STRtree over the tile's edge segments in metres, u ids, v ids, midpoints) for one tile."""
+        hit = self._edge_index.get(key)
+        if hit is not None:
+            self._edge_index.move_to_end(key)
+            return hit
+        t = self.tiles.tile(key)
+        if t is None or not len(t.edges):
+            hit = None
+        else:
+            nodes, edges = np.asarray(t.nodes), np.asarray(t.edges)
+            xy = _xy(nodes["y"], nodes["x"])
+            segs = shapely.linestrings(np.stack([xy[edges["u"]], xy[edges["v"]]], axis=1))
+            mid = np.column_stack([(nodes["y"][edges["u"]] + nodes["y"][edges["v"]]) / 2,
+                                   (nodes["x"][edges["u"]] + nodes["x"][edges["v"]]) / 2])
+            hit = (shapely.STRtree(segs), nodes["id"][edges["u"]], nodes["id"][edges["v"]], mid)
+        self._edge_index[key] = hit
+        while len(self._edge_index) > EDGE_TILE_CACHE:
+            self._edge_index.popitem(last=False)
+        return hit
+
+    def places(self, lat: np.ndarray, lon: np.ndarray) -> List[Tuple[str, str, float, float]]:
+        """(kind, key, lat, lon) of the edge each point lies on, or its grid cell."""
+        out: List[Optional[Tuple[str, str, float, float]]] = [None] * len(lat)
+        if self.tiles is not None:
+            rows, cols = tile_of(lat, lon, self.tiles.tile_deg, self.tiles.origin)
+            for key in set(zip(rows.tolist(), cols.tolist())):
+                idx = np.flatnonzero((rows == key[0]) & (cols == key[1]))
+                index = self._tile_edges(key)
+                if index is None:
+                    continue
+                tree, u, v, mid = index
+                pts, near = tree.query_nearest(shapely.points(_xy(lat[idx], lon[idx])), max_distance=EDGE_SNAP_M,
+                                               all_matches=False)
+                for p, e in zip(pts, near):
+                    a, b = sorted((int(u[e]), int(v[e])))
+                    out[idx[p]] = ("edge", f"{a}-{b}", float(mid[e, 0]), float(mid[e, 1]))
+        for i in range(len(out)):
+            if out[i] is None:
+                r, c = int(np.floor(lat[i] / CELL_DEG)), int(np.floor(lon[i] / CELL_DEG))
+                out[i] = ("cell", f"{r}_{c}", (r + 0.5) * CELL_DEG, (c + 0.5) * CELL_DEG)
+        return out
+
+
+def snap(records: Sequence[Dict[str, Any]], snapper: Snapper) -> List[Tuple[Optional[str], Tuple, Optional[str]]]:
+    """(stop key, place, stop name) per record; a stop the reporter picked wins over the nearest one."""
+    if not records:
+        return []
+    lat = np.array([r["lat"] for r in records], dtype=float)
+    lon = np.array([r["lon"] for r in records], dtype=float)
+    out = []
+    for r, stop, place in zip(records, snapper.stops(lat, lon), snapper.places(lat, lon)):
+        stop = r.get("stop") if r.get("stop") in snapper.stop_names else stop
+        out.append((stop, place, snapper.stop_names.get(stop)))
+    return out
+
+
+# Aggregate
+
+class Aggregate:
+    """key -> entry {"kind", "lat", "lon", "name", "total", "by_category", "last_ts"}; stops and edges/cells alike."""
+
+    def __init__(self):
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.position: Position = (0, 0)
+        self.reports = 0
+        self._index: Optional[Tuple[cKDTree, List[Dict[str, Any]]]] = None
+        self._index_at = 0.0
+        self._index_wall = None
+        self._dirty = True
+        self._lock = threading.Lock()  # apply() runs on the loop; queries and snapshots run in threads
+
+    def add(self, records: Sequence[Dict[str, Any]], snapper: Snapper) -> None:
+        self.apply(records, snap(records, snapper))
+
+    def apply(self, records: Sequence[Dict[str, Any]], snapped, pos: Optional[Position] = None) -> None:
+        with self._lock:
+            for r, (stop, (kind, key, plat, plon), stop_name) in zip(records, snapped):
+                self._bump(f"{kind}:{key}", kind, plat, plon, None, r)
+                if stop is not None:
+                    slat, slon = map(float, stop.split(","))
+                    self._bump(f"stop:{stop}", "stop", slat, slon, stop_name, r)
+            self.reports += len(records)
+            if pos is not None:
+                self.position = pos
+            self._dirty = True
+
+    def _bump(self, key: str, kind: str, lat: float, lon: float, name: Optional[str], r: Dict[str, Any]) -> None:
+        e = self.entries.get(key)
+        if e is None:
+            e = self.entries[key] = {"kind": kind, "lat": round(lat, 6), "lon": round(lon, 6), "name": name,
+                                     "total": 0, "by_category": {}, "last_ts": 0.0}
+        e["total"] += 1
+        e["by_category"][r["category"]] = e["by_category"].get(r["category"], 0) + 1
+        e["last_ts"] = max(e["last_ts"], r["ts"])
+
+    def _frozen(self) -> Dict[str, Dict[str, Any]]:
+        """A copy of the entries that later applies will not touch; call with the lock held."""
+        return {k: dict(e, by_category=dict(e["by_category"])) for k, e in self.entries.items()}
+
+    def _tree(self) -> Optional[Tuple[cKDTree, List[Dict[str, Any]]]]:
+        with self._lock:
+            now = time.monotonic()
+            if self._dirty and (self._index is None or now - self._index_at >= INDEX_REFRESH_S):
+                found = [dict(e, key=k) for k, e in self._frozen().items()]
+                ll = np.array([(e["lat"], e["lon"]) for e in found]).reshape(-1, 2)
+                self._index = (cKDTree(_xy(ll[:, 0], ll[:, 1])), found) if found else None
+                self._index_at, self._index_wall, self._dirty = now, time.time(), False
+            return self._index, self._index_wall
+
+    def near(self, coords: Sequence[Sequence[float]], radius_m: float) -> Dict[str, Any]:
+        """
+        Entries within radius_m of a point or of any part of a polyline, busiest first. Raises
+        ValueError when the route is longer than NEAR_MAX_SAMPLES radii.
+        """
+        pts = _xy(*np.asarray(coords, dtype=float).reshape(-1, 2).T)
+        if len(pts) > 1:  # densify so consecutive samples are at most one radius apart
+            seg = np.hypot(*np.diff(pts, axis=0).T)
+            at = np.concatenate([[0], np.cumsum(seg)])
+            n = int(np.ceil(at[-1] / max(radius_m, 1.0))) + 1
+            if n > NEAR_MAX_SAMPLES:
+                raise ValueError(f"route is {at[-1] / 1000:.0f} km; at most {NEAR_MAX_SAMPLES} x radius_m is searched")
+            s = np.linspace(0, at[-1], max(2, n))
+            pts = np.column_stack([np.interp(s, at, pts[:, 0]), np.interp(s, at, pts[:, 1])])
+        (index, as_of), hits = self._tree(), set()
+        if index is not None:
+            for group in index[0].query_ball_point(pts, radius_m):
+                hits.update(group)
+        found = sorted((index[1][i] for i in hits), key=lambda e: (-e["total"], e["key"]))
+        by_category: Dict[str, int] = {}
+        for e in found:
+            if e["kind"] != "stop":  # stop entries count the same reports again
+                for c, n in e["by_category"].items():
+                    by_category[c] = by_category.get(c, 0) + n
+        return {"radius_m": radius_m, "reports": sum(by_category.values()), "by_category": by_category,
+                "stops": [e for e in found if e["kind"] == "stop"],
+                "segments": [e for e in found if e["kind"] != "stop"], "as_of": as_of}
+
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"position": list(self.position), "reports": self.reports, "entries": self._frozen()}
+
+    @classmethod
+    def from_json(cls, doc: Dict[str, Any]) -> "Aggregate":
+        agg = cls()
+        agg.position, agg.reports, agg.entries = tuple(doc["position"]), doc["reports"], doc["entries"]
+        return agg
+
+
+class ReportStore:
+    """The log, the aggregate and the task that feeds one from the other."""
+
+    def __init__(self, root: str = REPORTS_DIR, interval_ms: float = FSYNC_INTERVAL_MS):
+        self.root = Path(root)
+        self.log = ReportLog(self.root, interval_ms)
+        self.log.on_commit = self._committed
+        self.aggregate = Aggregate()
+        self.snapper = Snapper()
+        self._queue: "asyncio.Queue[Tuple[List[Dict[str, Any]], Position]]" = None
+        self._tasks: List[asyncio.Task] = []
+        self._snapshot_at = 0.0
+
+    def recover(self, snapper: Snapper) -> int:
+        """Load the snapshot and replay the log after it; returns the number of reports replayed."""
+        self.snapper = snapper
+        path = self.root / SNAPSHOT
+        if path.exists():
+            try:
+                self.aggregate = Aggregate.from_json(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Discarding unreadable report snapshot {path}: {e}; replaying the whole log")
+                self.aggregate = Aggregate()
+        replayed, chunk, last_id = 0, [], 0
+        for r, pos in self.log.replay(self.aggregate.position):
+            chunk.append(r)
+            self.aggregate.position, last_id = pos, r["id"]
+            if len(chunk) == 4096:
+                self.aggregate.add(chunk, snapper)
+                replayed, chunk = replayed + len(chunk), []
+        self.aggregate.add(chunk, snapper)
+        replayed += len(chunk)
+        self.log.next_id = max(last_id, self.aggregate.reports) + 1
+        return replayed
+
+    async def start(self, stops: Optional[pd.DataFrame] = None, tiles: Optional[TileStore] = None) -> int:
+        snapper = Snapper(stops, tiles)
+        replayed = await asyncio.to_thread(self.recover, snapper)
+        self.aggregate.position = self.log.open()
+        self._queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self.log.run()), loop.create_task(self._aggregate())]
+        return replayed
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        self.log.close()
+        await asyncio.to_thread(self.snapshot)
+
+    async def submit(self, reports: List[Dict[str, Any]]) -> List[int]:
+        now = time.time()
+        records = [{"ts": now, "lat": float(r["lat"]), "lon": float(r["lon"]), "category": r["category"],
+                    "stop": r.get("stop"), "school": r.get("school"), "text": (r.get("description") or "")[:MAX_TEXT]}
+                   for r in reports]
+        return await self.log.submit(records)
+
+    def _committed(self, records: List[Dict[str, Any]], pos: Position) -> None:
+        self._queue.put_nowait((records, pos))
+
+    async def _aggregate(self) -> None:
+        while True:
+            records, pos = await self._queue.get()
+            while not self._queue.empty():  # fold whatever else has been committed meanwhile
+                more, pos = self._queue.get_nowait()
+                records = records + more
+            REPORTS_AGG_LAG.set(time.time() - records[0]["ts"])
+            # snapping may run off the loop; entries are only ever changed on it, so queries never see a half update
+            snapped = await asyncio.to_thread(snap, records, self.snapper) if len(records) > 256 \
+                else snap(records, self.snapper)
+            self.aggregate.apply(records, snapped, pos)
+            REPORTS_AGG_LAG.set(0.0)
+            if time.monotonic() - self._snapshot_at > SNAPSHOT_EVERY_S:
+                self._snapshot_at = time.monotonic()
+                await asyncio.to_thread(self.snapshot)
+
+    def snapshot(self) -> None:
+        doc = dumps(self.aggregate.to_json())
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / (SNAPSHOT + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(doc)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.root / SNAPSHOT)
+        fd = os.open(self.root, os.O_RDONLY)
+        try:
+            os.fsync(fd)  # make the rename itself durable
+        finally:
+            os.close(fd)
+
+    def near(self, coords: Sequence[Sequence[float]], radius_m: float) -> Dict[str, Any]:
+        return self.aggregate.near(coords, radius_m)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"reports": self.aggregate.reports, "entries": len(self.aggregate.entries),
+                "log_position": list(self.aggregate.position), "pending_batches": self._queue.qsize() if self._queue else 0,
+                "snapping": "edges" if self.snapper.tiles is not None else "cells", "stops": len(self.snapper.stop_keys)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=("stats", "rebuild"))
+    ap.add_argument("--dir", default=REPORTS_DIR)
+    args = ap.parse_args()
+
+    from .bundle import DATA_FILES, load_bus_stops
+    from .utils import find_data
+    store = ReportStore(args.dir)
+    if args.command == "rebuild":
+        (Path(args.dir) / SNAPSHOT).unlink(missing_ok=True)
+    t0 = time.perf_counter()
+    replayed = store.recover(Snapper(load_bus_stops(find_data(DATA_FILES["school_bus"])), TileStore.open()))
+    print(f"replayed {replayed} reports in {time.perf_counter() - t0:.2f} s")
+    if args.command == "rebuild":
+        store.snapshot()
+    print(json.dumps(store.stats()))
+
+
+if __name__ == "__main__":
+    main()
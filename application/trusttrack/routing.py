@@ -0,0 +1,289 @@
+"""
+Trust Track - routing & recommendation engine
+Walk, school-bus and park-and-stride evaluation over the weighted walking graph.
+"""
+
+import heapq
+import math
+import os
+from datetime import date
+from itertools import count
+from typing import Tuple, Dict, Any, List, Optional
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from .landmarks import get_landmarks, haversine_heuristic
+from .metrics import counting_weight, record_search
+from .parking import ParkingIndex
+from .utils import (
+    haversine_km, validate_graph, nearest_node, iter_best_edges, crowding_factor_from_daily_csv
+)
+
+# Speed/behavior toggles
+FAST_MODE             = True
+K_NEAR_STOPS          = 6 if FAST_MODE else 10
+PR_TOP_N              = 2 if FAST_MODE else 3
+PR_LIMIT_KM_TO_SCHOOL = 3.0 if FAST_MODE else 4.0
+PR_MAX_CANDIDATES     = 6 if FAST_MODE else 10   # nearest sites walked to the gate; the rest are not ranked
+PR_EXCLUDE_PERMITS    = ("disabled", "private", "restricted", "permit")  # "permit": Permit Only P&R
+PR_MIN_STAY_MIN       = 30.0                     # long enough to walk a child in and come back
+
+# Bus model defaults
+BUS_SPEED_KMH_DEFAULT   = 25.0
+BUS_BUFFER_MIN_DEFAULT  = 3.0
+BUS_BASE_SAFETY_DEFAULT = 92.0
+CROWDING_SAFETY_PENALTY = 10.0   # safety points lost on a fully crowded day
+
+# Walk search: "astar" (goal-directed where a heuristic exists) or "dijkstra"
+WALK_SEARCH = os.environ.get("TRUSTTRACK_WALK_SEARCH", "astar")
+
+# Viability filters
+MAX_WALK_TO_BOARD_MIN    = 15.0
+MIN_BUS_MINUTES_TO_COUNT = 6.0
+
+
+# Walk engines
+
+def route_stats(G: nx.MultiDiGraph, route, time_key: str) -> Tuple[float, float]:
+    lengths, safeties, times = [], [], []
+    for data in iter_best_edges(G, route):
+        lengths.append(float(data.get("length", 0.0)))
+        safeties.append(float(data.get("safety", 50.0)))
+        times.append(float(data.get(time_key, 0.0)))
+    total_time = float(np.sum(times)) if times else 0.0
+    mean_safety = float(np.average(safeties, weights=lengths)) if lengths and sum(lengths) > 0 else 0.0
+    return total_time, mean_safety
+
+
+def route_coords(G: nx.MultiDiGraph, route) -> np.ndarray:
+    """Route geometry as an (n, 2) [lat, lon] array, following curved edge geometry where OSMnx kept it."""
+    if not route:
+        return np.empty((0, 2))
+    parts = [np.array([[G.nodes[route[0]]["y"], G.nodes[route[0]]["x"]]])]
+    for u, v, data in zip(route[:-1], route[1:], iter_best_edges(G, route)):
+        geom = data.get("geometry")
+        if geom is not None:
+            parts.append(np.asarray(geom.coords)[1:, ::-1])
+        else:
+            parts.append(np.array([[G.nodes[v]["y"], G.nodes[v]["x"]]]))
+    return np.ascontiguousarray(np.concatenate(parts))
+
+
+def walk_heuristic(G: nx.MultiDiGraph, target, weight: str):
+    """Admissible A* heuristic for this weight, or None when only Dijkstra applies."""
+    if weight == "w_fast":
+        return haversine_heuristic(G, target, weight)
+    lm = G.graph.get("landmarks") or get_landmarks()  # the request's data snapshot, else the live one
+    if lm is not None and lm.weight == weight:
+        return lm.heuristic(target)
+    return None
+
+
+def shortest_path(G: nx.MultiDiGraph, node_a, node_b, weight: str, search: Optional[str] = None) -> list:
+    """
+    Minimum-weight node route, recording the nodes the search expanded. With search="astar",
+    w_fast uses a straight-line heuristic and w_safe uses landmarks when loaded; otherwise, and
+    with search="dijkstra", it is NetworkX's bidirectional Dijkstra. Route costs are identical.
+    """
+    w, expanded = counting_weight(weight, G.is_multigraph())
+    h = walk_heuristic(G, node_b, weight) if (search or WALK_SEARCH) == "astar" else None
+    if h is not None:
+        r = nx.astar_path(G, node_a, node_b, heuristic=h, weight=w)
+        record_search(f"{weight}_astar", len(expanded))
+    else:
+        r = nx.shortest_path(G, node_a, node_b, weight=w)
+        record_search(weight, len(expanded))
+    return r
+
+
+def walk_leg(G: nx.MultiDiGraph, a_latlon: Tuple[float, float], b_latlon: Tuple[float, float],
+             objective: str, time_key: str) -> Tuple[float, float]:
+    node_a = nearest_node(G, a_latlon[0], a_latlon[1])
+    node_b = nearest_node(G, b_latlon[0], b_latlon[1])
+    weight = "w_fast" if objective == "fast" else "w_safe"
+    r = shortest_path(G, node_a, node_b, weight)
+    return route_stats(G, r, time_key)
+
+
+def compute_walk_routes(G: nx.MultiDiGraph, origin_ll: Tuple[float, float],
+                        dest_ll: Tuple[float, float]) -> Dict[str, Any]:
+    """Fastest and safest walking routes between two points."""
+    time_key = validate_graph(G)
+    orig_node = nearest_node(G, origin_ll[0], origin_ll[1])
+    dest_node = nearest_node(G, dest_ll[0], dest_ll[1])
+    r_fast = shortest_path(G, orig_node, dest_node, "w_fast")
+    r_safe = shortest_path(G, orig_node, dest_node, "w_safe")
+    t_fast, s_fast = route_stats(G, r_fast, time_key)
+    t_safe, s_safe = route_stats(G, r_safe, time_key)
+    return {
+        "fastest": {"minutes": round(t_fast, 1), "safety": round(s_fast), "coords": route_coords(G, r_fast)},
+        "safest":  {"minutes": round(t_safe, 1), "safety": round(s_safe), "coords": route_coords(G, r_safe)},
+        "same": r_fast == r_safe,
+        "risk_minutes_safe": round((1 - s_safe / 100.0) * t_safe, 2),
+    }
+
+
+def reverse_search_to(G: nx.MultiDiGraph, target, weight: str, max_minutes: float) -> Dict[Any, Tuple[float, float]]:
+    """
+    One bounded reverse Dijkstra: for every node whose best route to target (min weight, then
+    min time) takes at most max_minutes, its (minutes, weight) along that route. The budget is
+    applied when a node is settled, not when it is relaxed, so a faster but less safe route never
+    stands in for an over-budget best one. Best routes are prefix-closed, so a node is not
+    expanded once its best route is over budget.
+    """
+    time_key = validate_graph(G)
+    best = {target: (0.0, 0.0)}
+    settled: Dict[Any, Tuple[float, float]] = {}
+    done = set()
+    tie = count()
+    heap = [(0.0, 0.0, next(tie), target)]
+    while heap:
+        w, t, _, v = heapq.heappop(heap)
+        if v in done:
+            continue
+        done.add(v)
+        if t > max_minutes:
+            continue
+        settled[v] = (t, w)
+        for u, keys in G.pred[v].items():
+            if u in done:
+                continue
+            d = min(keys.values(), key=lambda d: (d.get(weight, math.inf), d.get(time_key, math.inf)))
+            cand = (w + d.get(weight, 0.0), t + d.get(time_key, 0.0))
+            if cand < best.get(u, (math.inf, math.inf)):
+                best[u] = cand
+                heapq.heappush(heap, (cand[0], cand[1], next(tie), u))
+    record_search(f"{weight}_reverse", len(best))
+    return settled
+
+
+# School-bus engine
+
+def bus_minutes_estimate(a_lat, a_lon, b_lat, b_lon, bus_speed_kmh=BUS_SPEED_KMH_DEFAULT, buffer_min=BUS_BUFFER_MIN_DEFAULT):
+    km = haversine_km(a_lat, a_lon, b_lat, b_lon)
+    return (km / max(1e-6, bus_speed_kmh)) * 60.0 + buffer_min
+
+
+def compute_bus_options(G: nx.MultiDiGraph, origin_ll: Tuple[float, float], dest_ll: Tuple[float, float],
+                        bus_df: pd.DataFrame, school_name: Optional[str] = None,
+                        k_near: int = K_NEAR_STOPS) -> Dict[str, Any]:
+    """Evaluate the school-bus boarding stops nearest the origin; bus_df must carry lat/lon columns."""
+    time_key = validate_graph(G)
+    if school_name and "School Name" in bus_df.columns:
+        filt = bus_df["School Name"].astype(str).str.contains(str(school_name), case=False, na=False, regex=False)
+        df_school = bus_df[filt].copy()
+        if df_school.empty:
+            df_school = bus_df.copy()
+    else:
+        df_school = bus_df.copy()
+    o_lat, o_lon = origin_ll; d_lat, d_lon = dest_ll
+    df_school["dist_o_km"] = df_school.apply(lambda r: haversine_km(o_lat, o_lon, r.lat, r.lon), axis=1)
+    near_o = df_school.nsmallest(k_near, "dist_o_km").reset_index(drop=True)
+
+    rows = []
+    for _, row in near_o.iterrows():
+        w_fast_min, w_fast_score = walk_leg(G, (o_lat, o_lon), (row.lat, row.lon), "fast", time_key)
+        if w_fast_min > MAX_WALK_TO_BOARD_MIN:
+            continue
+        w_safe_min, w_safe_score = walk_leg(G, (o_lat, o_lon), (row.lat, row.lon), "safe", time_key)
+        bus_min = bus_minutes_estimate(row.lat, row.lon, d_lat, d_lon)
+        if bus_min < MIN_BUS_MINUTES_TO_COUNT:
+            continue
+        total_fast = w_fast_min + bus_min
+        risk_minutes = (1 - w_safe_score/100.0) * w_safe_min + (1 - BUS_BASE_SAFETY_DEFAULT/100.0) * bus_min
+        rows.append({
+            "start_label": f"{row.get('Description','')} {row.get('RouteNumber','')}".strip(),
+            "start_lat": row.lat, "start_lon": row.lon,
+            "w_fast_min": w_fast_min, "w_safe_min": w_safe_min,
+            "w_safe_score": w_safe_score,
+            "bus_min": bus_min,
+            "total_minutes_fast": total_fast,
+            "risk_minutes_safe": risk_minutes,
+        })
+    options_df = pd.DataFrame(rows)
+    fastest = options_df.nsmallest(1, "total_minutes_fast").iloc[0].to_dict() if not options_df.empty else None
+    return {"fastest": fastest, "options_df": options_df}
+
+
+def apply_bus_safety_and_pick_safest(options_df: pd.DataFrame, dj_df: pd.DataFrame,
+                                     target_date: date) -> Optional[Dict[str, Any]]:
+    """Re-score bus options with the day's crowding factor and return the lowest-risk one."""
+    if options_df is None or options_df.empty:
+        return None
+    crowding = crowding_factor_from_daily_csv(dj_df, target_date)
+    bus_safety = BUS_BASE_SAFETY_DEFAULT - CROWDING_SAFETY_PENALTY * crowding
+    df = options_df.copy()
+    df["risk_minutes_safe"] = (1 - df["w_safe_score"]/100.0) * df["w_safe_min"] + (1 - bus_safety/100.0) * df["bus_min"]
+    best = df.nsmallest(1, "risk_minutes_safe").iloc[0].to_dict()
+    best["crowding_factor"] = crowding
+    best["bus_safety_used"] = bus_safety
+    return best
+
+
+# Park-&-Stride (walk-only)
+
+def compute_pr_options(G: nx.MultiDiGraph, dest_ll: Tuple[float, float], parking: ParkingIndex,
+                       limit_km: float = PR_LIMIT_KM_TO_SCHOOL, top_n: int = PR_TOP_N,
+                       max_candidates: int = PR_MAX_CANDIDATES) -> List[Dict[str, Any]]:
+    """
+    Rank parking near the school by the safe walk from car park to gate. Candidates are the
+    nearest usable sites within limit_km from the parking index, or the nearest top_n when
+    none are that close.
+    """
+    time_key = validate_graph(G)
+    d_lat, d_lon = dest_ll
+    idx, km = parking.near(d_lat, d_lon, limit_km, PR_EXCLUDE_PERMITS, PR_MIN_STAY_MIN)
+    if not len(idx):
+        idx, km = parking.nearest(d_lat, d_lon, top_n, PR_EXCLUDE_PERMITS, PR_MIN_STAY_MIN)
+    rows = []
+    for r in parking.rows(idx[:max_candidates], km[:max_candidates]):
+        w_fast_min, w_safe_score = walk_leg(G, (r["lat"], r["lon"]), (d_lat, d_lon), "fast", time_key)
+        w_safe_min, _            = walk_leg(G, (r["lat"], r["lon"]), (d_lat, d_lon), "safe", time_key)
+        rows.append({
+            "site": r["name"],
+            "lat": r["lat"], "lon": r["lon"],
+            "walk_fast_min": w_fast_min,
+            "walk_safe_min": w_safe_min,
+            "walk_mean_safety": w_safe_score,
+            "km_to_school": r["km"],
+            "source": r["source"],
+            "permit": r["permit"],
+            "capacity": r["capacity"],
+        })
+    pr_res = pd.DataFrame(rows)
+    if pr_res.empty:
+        return []
+    pr_res = pr_res.sort_values(["walk_safe_min", "walk_mean_safety"], ascending=[True, False]).head(top_n)
+    return [dict(r, capacity=None if pd.isna(r["capacity"]) else int(r["capacity"]))
+            for r in pr_res.reset_index(drop=True).to_dict(orient="records")]
+
+
+# Map output
+
+def make_geojson(origin_ll: Tuple[float, float], dest_ll: Tuple[float, float], walk: Dict[str, Any],
+                 bus_fastest: Optional[Dict[str, Any]], bus_safest: Optional[Dict[str, Any]],
+                 pr_top: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """FeatureCollection of markers and route lines for the frontend map."""
+    def point(lat, lon, **props):
+        return {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": props}
+
+    def line(coords_latlon, **props):
+        lonlat = np.ascontiguousarray(np.asarray(coords_latlon, dtype=float)[:, ::-1])
+        return {"type": "Feature", "geometry": {"type": "LineString", "coordinates": lonlat}, "properties": props}
+
+    features = [
+        point(origin_ll[0], origin_ll[1], role="origin", label="Starting Point"),
+        point(dest_ll[0], dest_ll[1], role="school", label="School"),
+    ]
+    for variant, key in (("fast", "fastest"), ("safe", "safest")):
+        leg = walk.get(key) or {}
+        if leg.get("coords") is not None and len(leg["coords"]):
+            features.append(line(leg["coords"], mode="walk", variant=variant, minutes=leg.get("minutes")))
+    for role, opt in (("bus_start", bus_fastest), ("bus_start_safe", bus_safest)):
+        if opt:
+            features.append(point(opt["start_lat"], opt["start_lon"], role=role, label=opt.get("start_label", "")))
+    for i, r in enumerate(pr_top or []):
+        features.append(point(r["lat"], r["lon"], role="park_and_ride", label=r.get("site", f"Parking #{i+1}")))
+    return {"type": "FeatureCollection", "features": features}
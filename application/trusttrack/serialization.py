@@ -0,0 +1,61 @@
+"""
+Trust Track - fast JSON path for route payloads
+Route payloads are plain dicts holding NumPy scalars and (n, 2) coordinate arrays; orjson
+serializes both natively, so responses skip jsonable_encoder and the stdlib json module.
+"""
+
+import json
+import time
+from typing import Any
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback, same output shape, slower
+    orjson = None
+
+ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+def _default(obj: Any) -> Any:
+    """Handle what orjson/json cannot encode natively (NumPy under the stdlib, pandas NA, sets)."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    try:
+        import pandas as pd
+        if obj is pd.NA or obj is pd.NaT:
+            return None
+    except ImportError:
+        pass
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize a route payload to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class RouteJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (NumPy-aware) instead of jsonable_encoder + json."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def route_response(payload: Any) -> RouteJSONResponse:
+    """Serialize a route payload, reporting its size and encode time in response headers."""
+    t0 = time.perf_counter()
+    response = RouteJSONResponse(payload)
+    serialize_ms = (time.perf_counter() - t0) * 1000.0
+    response.headers["X-Payload-Bytes"] = str(len(response.body))
+    response.headers["X-Serialize-Ms"] = f"{serialize_ms:.2f}"
+    return response
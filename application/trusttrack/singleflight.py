@@ -0,0 +1,43 @@
+"""
+Trust Track - in-flight request coalescing
+Concurrent callers with the same key await one shared computation (run in the threadpool)
+instead of each running it. Nothing is cached: the key is forgotten once the work finishes.
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from .metrics import record_single_flight, SINGLE_FLIGHT_INFLIGHT
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def _done(self, key: Hashable, task: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        SINGLE_FLIGHT_INFLIGHT.set(len(self._inflight), flight=self.name)
+        if not task.cancelled():
+            task.exception()  # retrieved here so an all-callers-gone failure is not logged as unhandled
+
+    async def do(self, key: Hashable, fn: Callable[..., Any], *args: Any) -> Tuple[Any, bool]:
+        """
+        Result of fn(*args) and whether it was shared with an earlier caller. The computation is
+        shielded, so one caller disconnecting does not cancel it for the others. The result is the
+        same object for every caller; treat it as read-only.
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(run_in_threadpool(fn, *args))
+            self._inflight[key] = task
+            SINGLE_FLIGHT_INFLIGHT.set(len(self._inflight), flight=self.name)
+            task.add_done_callback(lambda t, k=key: self._done(k, t))
+        record_single_flight(self.name, shared)
+        return await asyncio.shield(task), shared
+
+    def __len__(self) -> int:
+        return len(self._inflight)
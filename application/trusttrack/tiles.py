@@ -0,0 +1,305 @@
+"""
+Trust Track - tiled walk graph
+The territory walk graph cut into fixed lat/lon tiles and stored as memory-mapped .npy files. An
+edge belongs to the tile of its start node. Its end node, when it lies in another tile, is kept
+in the start tile as a boundary node with coordinates and an owning tile. Tiles are mapped on
+first use and kept in an LRU under a byte budget. A request's walk graph is assembled from the
+tiles its bbox covers instead of being downloaded, and routes cross tile borders through the
+boundary nodes. Memory follows the busy parts of the city, not the whole territory.
+
+Each build goes to its own directory under TILE_DIR and is switched in by rewriting
+<dir>/CURRENT, as bundles are. A server keeps the build it opened, so a rebuild never changes
+files under a running process; builds older than the previous one are removed.
+
+    python -m trusttrack.tiles build                  # from the ACT walk network
+    python -m trusttrack.tiles stats
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+import osmnx as ox
+import shapely
+
+from .metrics import record_cache, TILES_RESIDENT_BYTES
+from .utils import PLACE_NAME, WALK_SPEED, WEIGHT_WORKERS, add_edge_weights, data_version, weight_columns
+
+TILE_DIR = os.environ.get("TRUSTTRACK_TILE_DIR", "./.trusttrack_tiles")
+TILE_BUDGET_MB = float(os.environ.get("TRUSTTRACK_TILE_BUDGET_MB", "256"))
+TILE_DEG = 0.02                  # ~2.2 km N-S x 1.8 km E-W at Canberra's latitude
+ORIGIN = (-36.0, 148.7)          # south-west corner of tile (0, 0); the ACT lies north-east of it
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"
+KEEP_BUILDS = 2                  # the live build and the one before it, for servers not yet restarted
+
+NODE_DTYPE = np.dtype([("id", "<i8"), ("x", "<f8"), ("y", "<f8"), ("tile", "<i4", (2,))])
+# w_fast, w_safe, risk and time follow from length and safety, so they are derived on assembly
+EDGE_DTYPE = np.dtype([("u", "<i4"), ("v", "<i4"), ("length", "<f4"), ("safety", "<f4"),
+                       ("geom_start", "<i4"), ("geom_n", "<i4")])
+
+TileKey = Tuple[int, int]
+
+
+def tile_of(lat, lon, tile_deg: float = TILE_DEG, origin: Tuple[float, float] = ORIGIN):
+    """(row, col) of the tile holding each point; works on scalars and arrays."""
+    return (np.floor((np.asarray(lat) - origin[0]) / tile_deg).astype(int),
+            np.floor((np.asarray(lon) - origin[1]) / tile_deg).astype(int))
+
+
+def _stem(key: TileKey) -> str:
+    return f"{key[0]}_{key[1]}"
+
+
+def _save(path: Path, arr: np.ndarray) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+
+# Building
+
+def build_tiles(G: nx.MultiDiGraph, out_dir: str = TILE_DIR, tile_deg: float = TILE_DEG) -> Dict[str, Any]:
+    """Write one nodes/edges/geom .npy triple per non-empty tile and the manifest; returns the manifest."""
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    ids = np.fromiter(G.nodes, dtype=np.int64, count=len(G))
+    index = {n: i for i, n in enumerate(ids)}
+    x = np.array([G.nodes[n]["x"] for n in ids], dtype=float)
+    y = np.array([G.nodes[n]["y"] for n in ids], dtype=float)
+    rows, cols = tile_of(y, x, tile_deg)
+
+    m = G.number_of_edges()
+    u, v = np.empty(m, np.int64), np.empty(m, np.int64)
+    length, safety = np.empty(m), np.empty(m)
+    geoms: List[Optional[np.ndarray]] = [None] * m
+    for k, (a, b, d) in enumerate(G.edges(data=True)):
+        u[k], v[k] = index[a], index[b]
+        length[k], safety[k] = d["length"], d["safety"]
+        if d.get("geometry") is not None:
+            geoms[k] = np.asarray(d["geometry"].coords, dtype=float)
+
+    tiles: Dict[str, Dict[str, int]] = {}
+    tile_keys, node_tile = np.unique(np.column_stack([rows, cols]), axis=0, return_inverse=True)
+    node_tile = node_tile.ravel()
+    edge_tile = node_tile[u]
+    local = np.full(len(ids), -1, dtype=np.int64)
+    for t, (row, col) in enumerate(tile_keys):
+        owned = np.flatnonzero(node_tile == t)
+        e = np.flatnonzero(edge_tile == t)
+        e = e[np.argsort(np.searchsorted(owned, u[e]), kind="stable")]  # grouped by start node
+        ghosts = np.setdiff1d(np.unique(v[e]), owned)
+        members = np.concatenate([owned, ghosts])
+        local[members] = np.arange(len(members))
+
+        nodes = np.empty(len(members), NODE_DTYPE)
+        nodes["id"], nodes["x"], nodes["y"] = ids[members], x[members], y[members]
+        nodes["tile"][:, 0], nodes["tile"][:, 1] = rows[members], cols[members]
+        edges = np.empty(len(e), EDGE_DTYPE)
+        edges["u"], edges["v"] = local[u[e]], local[v[e]]
+        edges["length"], edges["safety"] = length[e], safety[e]
+        parts, start = [], 0
+        for j, k in enumerate(e):
+            g = geoms[k]
+            edges["geom_start"][j], edges["geom_n"][j] = start, 0 if g is None else len(g)
+            if g is not None:
+                parts.append(g)
+                start += len(g)
+        geom = np.concatenate(parts) if parts else np.empty((0, 2))
+        local[members] = -1
+
+        key = (int(row), int(col))
+        for suffix, arr in (("nodes", nodes), ("edges", edges), ("geom", geom)):
+            _save(out / f"{_stem(key)}.{suffix}.npy", arr)
+        tiles[_stem(key)] = {"nodes": len(owned), "boundary": len(ghosts), "edges": len(e),
+                             "bytes": nodes.nbytes + edges.nbytes + geom.nbytes}
+
+    manifest = {"tile_deg": tile_deg, "origin": list(ORIGIN), "model_version": data_version(()),
+                "nodes": len(ids), "edges": m, "tiles": tiles}
+    tmp = out / (MANIFEST + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    os.replace(tmp, out / MANIFEST)
+    return manifest
+
+
+def activate(name: str, root: str = TILE_DIR) -> None:
+    """Point CURRENT at a finished build; a single rename, so readers see the old or new name."""
+    root = Path(root)
+    if not (root / name / MANIFEST).exists():
+        raise FileNotFoundError(f"No tile build {name} in {root}")
+    tmp = root / f"{CURRENT}.{os.getpid()}.tmp"
+    tmp.write_text(name + "\n", encoding="utf-8")
+    os.replace(tmp, root / CURRENT)
+
+
+def current_build(root: str = TILE_DIR) -> Path:
+    """The build directory CURRENT names, or root itself for tiles built before versioned builds."""
+    try:
+        name = (Path(root) / CURRENT).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        name = ""
+    return Path(root) / name if name else Path(root)
+
+
+def prune_builds(root: str = TILE_DIR, keep: int = KEEP_BUILDS) -> List[str]:
+    """Remove all but the newest keep builds (never the current one); returns the names removed."""
+    live = current_build(root).name
+    builds = sorted((p for p in Path(root).iterdir() if (p / MANIFEST).exists()), key=lambda p: p.name)
+    removed = [p.name for p in builds[:-keep] if p.name != live] if keep > 0 else []
+    for name in removed:
+        shutil.rmtree(Path(root) / name, ignore_errors=True)
+    return removed
+
+
+# Serving
+
+class Tile:
+    """One tile's memory-mapped arrays; node rows past n_owned are boundary nodes of other tiles."""
+
+    def __init__(self, root: Path, key: TileKey, n_owned: int):
+        self.key = key
+        self.nodes = np.load(root / f"{_stem(key)}.nodes.npy", mmap_mode="r")
+        self.edges = np.load(root / f"{_stem(key)}.edges.npy", mmap_mode="r")
+        self.geom = np.load(root / f"{_stem(key)}.geom.npy", mmap_mode="r")
+        self.n_owned = n_owned
+        self.nbytes = self.nodes.nbytes + self.edges.nbytes + self.geom.nbytes
+
+
+class TileStore:
+    """
+    Tiles of one build, mapped lazily and kept in an LRU while their bytes fit the budget. The
+    tile in use always stays, so a single request may briefly go over it. The build is the one
+    CURRENT names when the store is opened; later builds are picked up on restart.
+    """
+
+    def __init__(self, root: str = TILE_DIR, budget_mb: float = TILE_BUDGET_MB):
+        self.root = current_build(root)
+        self.manifest = json.loads((self.root / MANIFEST).read_text(encoding="utf-8"))
+        if self.manifest["model_version"] != data_version(()):
+            raise RuntimeError(f"Tiles in {root} were built for another safety model; rebuild them")
+        self.tile_deg = self.manifest["tile_deg"]
+        self.origin = tuple(self.manifest["origin"])
+        self.budget = int(budget_mb * 1024 * 1024)
+        self._lru: "OrderedDict[TileKey, Tile]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, root: str = TILE_DIR, budget_mb: float = TILE_BUDGET_MB) -> Optional["TileStore"]:
+        return cls(root, budget_mb) if (current_build(root) / MANIFEST).exists() else None
+
+    def tile(self, key: TileKey) -> Optional[Tile]:
+        meta = self.manifest["tiles"].get(_stem(key))
+        if meta is None:
+            return None  # no walkable nodes there
+        with self._lock:
+            t = self._lru.get(key)
+            record_cache("tile", t is not None)
+            if t is not None:
+                self._lru.move_to_end(key)
+                return t
+        t = Tile(self.root, key, meta["nodes"])
+        with self._lock:
+            if key not in self._lru:
+                self._lru[key] = t
+                self._bytes += t.nbytes
+            while self._bytes > self.budget and len(self._lru) > 1:
+                _, old = self._lru.popitem(last=False)
+                self._bytes -= old.nbytes
+            TILES_RESIDENT_BYTES.set(self._bytes)
+            return self._lru.get(key, t)
+
+    def keys_bbox(self, north: float, south: float, east: float, west: float) -> List[TileKey]:
+        (r0, r1), (c0, c1) = tile_of([south, north], [west, east], self.tile_deg, self.origin)
+        return [(r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)
+                if _stem((r, c)) in self.manifest["tiles"]]
+
+    def graph_bbox(self, origin_ll: Tuple[float, float], dest_ll: Tuple[float, float],
+                   buffer_km: float = 6.0) -> nx.MultiDiGraph:
+        """
+        Weighted walk graph over both points plus a buffer, like build_graph_bbox, from the tiles
+        covering it. Boundary edges into tiles outside the bbox end at leaf nodes. Only the
+        largest weakly connected component is kept, as OSMnx does.
+        """
+        lat_pad = buffer_km / 111.0
+        lon_pad = buffer_km / (111.0 * max(0.1, math.cos(math.radians((origin_ll[0] + dest_ll[0]) / 2))))
+        keys = self.keys_bbox(max(origin_ll[0], dest_ll[0]) + lat_pad, min(origin_ll[0], dest_ll[0]) - lat_pad,
+                              max(origin_ll[1], dest_ll[1]) + lon_pad, min(origin_ll[1], dest_ll[1]) - lon_pad)
+        return self.assemble(keys)
+
+    def assemble(self, keys: Iterable[TileKey]) -> nx.MultiDiGraph:
+        G = nx.MultiDiGraph(crs="epsg:4326", max_speed_w_fast=WALK_SPEED * 60)
+        for key in keys:
+            t = self.tile(key)
+            if t is None:
+                continue
+            nodes, edges = np.asarray(t.nodes), np.asarray(t.edges)
+            G.add_nodes_from((int(n), {"x": float(x), "y": float(y)})
+                             for n, x, y in zip(nodes["id"], nodes["x"], nodes["y"]))
+            if not len(edges):
+                continue
+            w = {k: c.tolist() for k, c in weight_columns(edges["length"].astype(float),
+                                                           edges["safety"].astype(float)).items()}
+            curved = np.flatnonzero(edges["geom_n"] > 0)
+            lines: Dict[int, Any] = {}
+            if len(curved):
+                n = edges["geom_n"][curved].astype(np.int64)
+                pick = np.repeat(edges["geom_start"][curved], n) + np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+                lines = dict(zip(curved.tolist(), shapely.linestrings(np.asarray(t.geom)[pick],
+                                                                       indices=np.repeat(np.arange(len(curved)), n))))
+            u_ids, v_ids = nodes["id"][edges["u"]], nodes["id"][edges["v"]]
+            w_len = edges["length"].astype(float).tolist()
+            G.add_edges_from(
+                (int(a), int(b), {"length": w_len[k], "safety": w["safety"][k], "risk": w["risk"][k],
+                                  "time": w["time"][k], "w_fast": w["w_fast"][k],
+                                  "w_safe": w["w_safe"][k], **({"geometry": lines[k]} if k in lines else {})})
+                for k, (a, b) in enumerate(zip(u_ids, v_ids)))
+        if len(G):
+            keep = max(nx.weakly_connected_components(G), key=len)
+            if len(keep) < len(G):
+                G = G.subgraph(keep).copy()
+        return G
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            resident = len(self._lru), self._bytes
+        return {"tiles": len(self.manifest["tiles"]), "resident": resident[0], "resident_bytes": resident[1],
+                "budget_bytes": self.budget, "tile_deg": self.tile_deg}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=("build", "stats"))
+    ap.add_argument("--dir", default=TILE_DIR)
+    ap.add_argument("--tile-deg", type=float, default=TILE_DEG)
+    ap.add_argument("--workers", type=int, default=WEIGHT_WORKERS or os.cpu_count(), help="Edge-weight build processes")
+    args = ap.parse_args()
+
+    if args.command == "build":
+        G = ox.graph_from_place(PLACE_NAME, network_type="walk", simplify=True)
+        name = time.strftime("%Y%m%d-%H%M%S")
+        manifest = build_tiles(add_edge_weights(ox.distance.add_edge_lengths(G), args.workers),
+                               str(Path(args.dir) / name), args.tile_deg)
+        activate(name, args.dir)
+        removed = prune_builds(args.dir)
+        print(f"activated tile build {name}" + (f"; removed {', '.join(removed)}" if removed else ""))
+    else:
+        manifest = json.loads((current_build(args.dir) / MANIFEST).read_text(encoding="utf-8"))
+    sizes = [t["bytes"] for t in manifest["tiles"].values()]
+    boundary = sum(t["boundary"] for t in manifest["tiles"].values())
+    print(f"{len(sizes)} tiles of {manifest['tile_deg']} deg: {manifest['nodes']} nodes, {manifest['edges']} edges, "
+          f"{boundary} boundary nodes; {sum(sizes) / 2**20:.1f} MiB total, largest tile {max(sizes) / 2**10:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
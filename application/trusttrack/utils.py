@@ -0,0 +1,265 @@
+"""
+Trust Track - shared helpers
+Data lookup, coordinate parsing, walk-graph construction and edge safety weighting.
+"""
+
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+import networkx as nx
+import numpy as np
+import osmnx as ox
+import pandas as pd
+
+# OSMnx caching (helps a lot on repeat runs)
+ox.settings.use_cache = True
+ox.settings.cache_folder = "./.osmnx_cache"
+ox.settings.timeout = 30
+# Point OSMnx at other servers, e.g. the load-test stand-in (benchmarks/osm_standin.py)
+ox.settings.overpass_url = os.environ.get("TRUSTTRACK_OVERPASS_URL", ox.settings.overpass_url)
+ox.settings.nominatim_url = os.environ.get("TRUSTTRACK_NOMINATIM_URL", ox.settings.nominatim_url)
+
+from .cache import install_osmnx_cache  # noqa: E402  (needs the settings above)
+install_osmnx_cache()
+
+PLACE_NAME = "Australian Capital Territory, Australia"
+REGION_HINT = "Australia"
+WALK_SPEED = 1.3  # m/s
+
+ROADCLASS_RISK = {
+    "motorway": 1.00, "trunk": 0.95, "primary": 0.90, "secondary": 0.75,
+    "tertiary": 0.60, "residential": 0.35, "service": 0.30,
+    "living_street": 0.20, "footway": 0.10, "path": 0.10, "cycleway": 0.05
+}
+
+SIDEWALK_YES = ("yes", "both", "left", "right")
+
+# Edge-weight build: processes to extract edge tags with (0 = in-process); fork only, for offline builds
+WEIGHT_WORKERS = int(os.environ.get("TRUSTTRACK_WEIGHT_WORKERS", "0"))
+WEIGHT_CHUNK_EDGES = 200_000   # smaller graphs are not worth a pool
+
+APP_ROOT = Path(__file__).resolve().parent.parent
+DATA_DIRS = [Path("data"), APP_ROOT / "data", APP_ROOT.parent / "data", Path("/mnt/data")]
+
+
+# Generic utils
+
+def find_data(fname: str) -> str:
+    """Locate a dataset in ./data, the repository data/ folder or /mnt/data."""
+    if os.path.exists(fname):
+        return fname
+    for d in DATA_DIRS:
+        p = d / os.path.basename(fname)
+        if p.exists():
+            return str(p)
+    raise FileNotFoundError(f"Could not find {fname} in {', '.join(str(d) for d in DATA_DIRS)}.")
+
+
+def data_version(paths: Iterable[str]) -> str:
+    """Short content hash of the data files plus the safety model, for keying derived results."""
+    h = hashlib.sha1(json.dumps({"risk": ROADCLASS_RISK, "walk_speed": WALK_SPEED}, sort_keys=True).encode())
+    for p in sorted(paths):
+        with open(p, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+
+def slugify(name: str) -> str:
+    """'Alfred Deakin High School' -> 'alfred-deakin-high-school'."""
+    return "-".join("".join(c if c.isalnum() else " " for c in name.lower()).split())
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlmb = math.radians(lon2 - lon1)
+    a = (math.sin(dphi/2)**2 + math.cos(p1)*math.cos(p2)*math.sin(dlmb/2)**2)
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+
+
+def parse_wkt_point_lonlat_to_latlon(txt):
+    # 'POINT (149.12 -35.30)' -> (-35.30, 149.12)
+    txt = str(txt).strip()
+    if not txt.upper().startswith("POINT"):
+        return None, None
+    inside = txt[txt.find("(")+1: txt.find(")")]
+    lon_str, lat_str = [t.strip() for t in inside.split()]
+    lon, lat = float(lon_str), float(lat_str)
+    return lat, lon
+
+
+def parse_paren_latlon(txt):
+    # '( -35.30, 149.12 )' -> (-35.30, 149.12)
+    txt = str(txt).strip().replace("(", "").replace(")", "")
+    if "," not in txt:
+        return None, None
+    lat_str, lon_str = [t.strip() for t in txt.split(",", 1)]
+    return float(lat_str), float(lon_str)
+
+
+# Edge safety scoring & graph annotation
+
+def edge_safety(data):
+    """Safety of one edge; safety_from_tags is the same model over whole columns."""
+    hw = data.get("highway", "")
+    if isinstance(hw, list): hw = hw[0]
+    rc = ROADCLASS_RISK.get(hw, 0.5)
+    sidewalk = str(data.get("sidewalk", "")).lower()
+    has_sidewalk = any(x in sidewalk for x in SIDEWALK_YES)
+    cycle = "cycleway" in str(data.get("cycleway", "")).lower()
+    safety = 100 - 25*rc - 20*rc - (15 if not has_sidewalk else 0) + (10 if cycle else 0)
+    return max(0, min(100, safety))
+
+
+def _per_category(values: np.ndarray, fn: Callable[[Any], float]) -> np.ndarray:
+    """fn evaluated once per distinct tag value and broadcast back through the category codes."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return np.array([fn(u) for u in uniques], dtype=float)[codes]
+
+
+def edge_tag_arrays(datas: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """The tags edge_safety reads, pulled out of the edge dicts once (list values made hashable)."""
+    hw = [d.get("highway", "") for d in datas]
+    sw = [d.get("sidewalk", "") for d in datas]
+    cy = [d.get("cycleway", "") for d in datas]
+    return {
+        "highway": np.array([h[0] if isinstance(h, list) else h for h in hw], dtype=object),
+        "sidewalk": np.array([str(v) if isinstance(v, list) else v for v in sw], dtype=object),
+        "cycleway": np.array([str(v) if isinstance(v, list) else v for v in cy], dtype=object),
+        "length": np.array([d["length"] for d in datas], dtype=float),
+    }
+
+
+def safety_from_tags(highway: np.ndarray, sidewalk: np.ndarray, cycleway: np.ndarray) -> np.ndarray:
+    """edge_safety over columns: road-class risk by category code, sidewalk/cycleway tests per distinct value."""
+    rc = _per_category(highway, lambda h: ROADCLASS_RISK.get(h, 0.5))
+    has_sidewalk = _per_category(sidewalk, lambda s: any(x in str(s).lower() for x in SIDEWALK_YES)).astype(bool)
+    cycle = _per_category(cycleway, lambda c: "cycleway" in str(c).lower()).astype(bool)
+    safety = 100 - 25*rc - 20*rc - np.where(has_sidewalk, 0.0, 15.0) + np.where(cycle, 10.0, 0.0)
+    return np.clip(safety, 0, 100)
+
+
+def weight_columns(length: np.ndarray, safety: np.ndarray) -> Dict[str, np.ndarray]:
+    """risk, time and the w_fast / w_safe routing weights from edge length (m) and safety (0-100)."""
+    risk = 1 - safety/100
+    time = length/WALK_SPEED/60
+    return {"safety": safety, "risk": risk, "time": time, "w_fast": time, "w_safe": risk*time}
+
+
+_FORKED_EDGES: List[Dict[str, Any]] = []   # handed to forked workers by inheritance, not pickling
+
+
+def _safety_chunk(bounds: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    tags = edge_tag_arrays(_FORKED_EDGES[bounds[0]:bounds[1]])
+    return safety_from_tags(tags["highway"], tags["sidewalk"], tags["cycleway"]), tags["length"]
+
+
+def edge_weight_columns(datas: List[Dict[str, Any]], workers: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Weight columns for a list of edge dicts. With workers > 1 the tag extraction (the only
+    per-edge Python left) runs in forked chunks; workers read the edges from the parent's memory
+    and send back two float arrays each.
+    """
+    global _FORKED_EDGES
+    n = len(datas)
+    if workers > 1 and n > WEIGHT_CHUNK_EDGES and "fork" in multiprocessing.get_all_start_methods():
+        step = max(WEIGHT_CHUNK_EDGES // 4, -(-n // (workers * 4)))
+        _FORKED_EDGES = datas
+        try:
+            with multiprocessing.get_context("fork").Pool(workers) as pool:
+                parts = pool.map(_safety_chunk, [(a, min(a + step, n)) for a in range(0, n, step)])
+        finally:
+            _FORKED_EDGES = []
+        safety, length = np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+    else:
+        tags = edge_tag_arrays(datas)
+        safety, length = safety_from_tags(tags["highway"], tags["sidewalk"], tags["cycleway"]), tags["length"]
+    return weight_columns(length, safety)
+
+
+def add_edge_weights(G: nx.MultiDiGraph, workers: int = None) -> nx.MultiDiGraph:
+    """Annotate every edge with safety, risk, time and the w_fast / w_safe routing weights."""
+    datas = [d for nbrs in G._adj.values() for kd in nbrs.values() for d in kd.values()]  # G.edges order, no views
+    cols = edge_weight_columns(datas, WEIGHT_WORKERS if workers is None else workers)
+    for d, s, r, t, w in zip(datas, *(cols[k].tolist() for k in ("safety", "risk", "time", "w_safe"))):
+        d["safety"] = s; d["risk"] = r; d["time"] = t; d["w_fast"] = t; d["w_safe"] = w
+    G.graph["max_speed_w_fast"] = WALK_SPEED * 60  # metres per w_fast minute, for the A* heuristic
+    return G
+
+
+def build_graph_bbox(origin_ll: Tuple[float, float], dest_ll: Tuple[float, float],
+                     buffer_km: float = 6.0) -> nx.MultiDiGraph:
+    """Download a weighted walking graph covering both points plus a buffer."""
+    lat_pad = buffer_km / 111.0
+    lon_pad = buffer_km / (111.0 * max(0.1, math.cos(math.radians((origin_ll[0] + dest_ll[0]) / 2))))
+    north = max(origin_ll[0], dest_ll[0]) + lat_pad
+    south = min(origin_ll[0], dest_ll[0]) - lat_pad
+    east = max(origin_ll[1], dest_ll[1]) + lon_pad
+    west = min(origin_ll[1], dest_ll[1]) - lon_pad
+    G = ox.graph_from_bbox(north, south, east, west, network_type="walk", simplify=True)
+    G = ox.distance.add_edge_lengths(G)
+    return add_edge_weights(G)
+
+
+def validate_graph(G: nx.MultiDiGraph) -> str:
+    try:
+        edge_any = next(iter(G.edges(data=True)))[2]
+    except StopIteration:
+        raise RuntimeError("Graph G has no edges.")
+    need = {"length", "safety", "risk"}
+    missing = need - set(edge_any.keys())
+    if missing:
+        raise RuntimeError(f"Edge attributes missing: {missing}.")
+    for w in ("w_fast", "w_safe"):
+        if w not in edge_any:
+            raise RuntimeError(f"Missing edge weight '{w}'.")
+    time_key = "time_min" if "time_min" in edge_any else ("time" if "time" in edge_any else None)
+    if time_key is None:
+        raise RuntimeError("No 'time_min' or 'time' on edges.")
+    return time_key
+
+
+def geocode_in_act(name: str) -> Tuple[float, float]:
+    """(lat, lon) of a named place, searched within the ACT."""
+    lat, lon = ox.geocoder.geocode(f"{name}, {PLACE_NAME}")
+    return float(lat), float(lon)
+
+
+def nearest_node(G: nx.MultiDiGraph, lat: float, lon: float) -> int:
+    return ox.nearest_nodes(G, X=lon, Y=lat)
+
+
+def iter_best_edges(G: nx.MultiDiGraph, route):
+    for u, v in zip(route[:-1], route[1:]):
+        variants = G.get_edge_data(u, v)
+        key, data = min(variants.items(), key=lambda kv: float(kv[1].get("length", 1e12)))
+        yield data
+
+
+# Crowding
+
+def crowding_factor_from_daily_csv(df_daily: pd.DataFrame, dt: date) -> float:
+    df = df_daily.copy()
+    # parse date column
+    df["Date_parsed"] = pd.to_datetime(df["Date"], dayfirst=True, errors="coerce")
+    # numeric totals
+    measure_cols = [c for c in df.columns if c not in ["Date", "Date_parsed"]]
+    for c in measure_cols:
+        df[c] = (df[c].astype(str).str.replace(",", "").str.strip().replace({"": "0"})).astype(float)
+    df["total"] = df[measure_cols].sum(axis=1)
+    # pick the row for requested date (or closest previous if missing)
+    target_ts = pd.Timestamp(dt)
+    sel = df.loc[df["Date_parsed"] == target_ts]
+    if sel.empty:
+        sel = df.sort_values("Date_parsed").iloc[[-1]]  # fallback: latest
+    today_total = float(sel["total"].iloc[0])
+    norm = today_total / max(1.0, df["total"].quantile(0.95))  # scale by 95th percentile
+    # clamp 0.3..1.0
+    return float(np.clip(norm, 0.3, 1.0))